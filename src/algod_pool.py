@@ -0,0 +1,360 @@
+# Pooled, multi-endpoint algod client.
+# PooledAlgodClient is an AlgodClient that keeps persistent (keep-alive) HTTP connections to every
+# configured algod node instead of opening one urllib connection per request. Reads are spread over the
+# healthy nodes by measured latency, writes (transaction submission, compile, dryrun) go to the healthiest
+# node, and a node that fails is taken out of rotation for a cool-down period while the request is retried
+# on the next one. Keepers keep working as long as one node answers.
+# A transaction submission is only retried elsewhere when its node could not be reached (a node that got
+# it may have accepted it), and the confirmation reads that follow it (pending info of its txids, status
+# and status-after-block from the submitting thread) go to the node that accepted it.
+import base64
+import http.client
+import json
+import queue
+import random
+import socket
+import threading
+import time
+from collections import OrderedDict
+from urllib import parse
+
+import msgpack
+from algosdk import constants, encoding, error
+from algosdk.v2client import algod
+
+# Seconds before a request (other than status-after-block) is abandoned
+REQUEST_TIMEOUT = 10
+# status-after-block is a long poll: algod answers after a new block or after about a minute
+LONG_POLL_TIMEOUT = 90
+# Idle keep-alive connections kept per endpoint
+POOL_SIZE = 16
+# Weight of the last sample in the latency moving average
+LATENCY_ALPHA = 0.2
+# Cool-down (seconds) of an endpoint after consecutive failures: doubled up to the last value
+COOL_DOWN = (1, 2, 5, 10, 30)
+
+# Submitted txids whose confirmation reads are pinned to their node (oldest forgotten first)
+PINNED_TXIDS = 65536
+
+LONG_POLL_PREFIX = "/status/wait-for-block-after/"
+PENDING_PREFIX = "/transactions/pending/"
+SUBMIT_PATH = "/transactions"
+WRITE_PATHS = ("/transactions", "/teal/compile", "/teal/dryrun")
+
+
+class EndpointUnreachable(OSError):
+    """The connection to a node could not be opened: nothing was sent to it"""
+
+
+# Ids of the signed transactions of a raw submission body (concatenated msgpack)
+def _txids(data: bytes) -> list[str]:
+    unpacker = msgpack.Unpacker(raw=False)
+    unpacker.feed(data)
+    return [base64.b32encode(encoding.checksum(b"TX" + msgpack.packb(stxn["txn"], use_bin_type=True)))
+            .decode().rstrip("=") for stxn in unpacker]
+
+
+class Endpoint:
+    def __init__(self, address: str, pool_size: int = POOL_SIZE):
+        self.address = address.rstrip("/")
+        url = parse.urlsplit(self.address)
+        self.https = url.scheme == "https"
+        self.host = url.hostname
+        self.port = url.port or (443 if self.https else 80)
+        self.base_path = url.path
+        self._idle: queue.LifoQueue = queue.LifoQueue(pool_size)
+        self._lock = threading.Lock()
+        self.latency: float | None = None
+        self.in_flight = 0
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.down_until = 0.0
+
+    def __repr__(self):
+        return f"Endpoint({self.address!r})"
+
+    @property
+    def healthy(self) -> bool:
+        return time.monotonic() >= self.down_until
+
+    # Expected wait of one more request: latency estimate scaled by the queue in front of it
+    def score(self) -> float:
+        return (self.latency if self.latency is not None else 0.0) * (1 + self.in_flight)
+
+    def _connect(self, timeout) -> http.client.HTTPConnection:
+        cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+        conn = cls(self.host, self.port, timeout=timeout)
+        try:
+            conn.connect()
+        except OSError as err:
+            raise EndpointUnreachable(f"{self.address}: {err}") from err
+        return conn
+
+    def request(self, method: str, path: str, body: bytes, headers: dict, timeout: float):
+        """Sends one request on a pooled connection; returns (status, body)"""
+        try:
+            conn = self._idle.get_nowait()
+            conn.timeout = timeout
+            if conn.sock is not None:
+                conn.sock.settimeout(timeout)
+        except queue.Empty:
+            conn = self._connect(timeout)
+        try:
+            try:
+                conn.request(method, self.base_path + path, body=body, headers=headers)
+                resp = conn.getresponse()
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                # the server closed an idle keep-alive connection: retry once on a new one
+                conn.close()
+                conn = self._connect(timeout)
+                conn.request(method, self.base_path + path, body=body, headers=headers)
+                resp = conn.getresponse()
+            data = resp.read()
+        except BaseException:
+            conn.close()
+            raise
+        if resp.will_close:
+            conn.close()
+        else:
+            try:
+                self._idle.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+        return resp.status, data
+
+    def record(self, elapsed: float | None, ok: bool):
+        with self._lock:
+            if ok:
+                self.consecutive_failures = 0
+                self.down_until = 0.0
+                if elapsed is not None:
+                    self.latency = elapsed if self.latency is None else \
+                        LATENCY_ALPHA * elapsed + (1 - LATENCY_ALPHA) * self.latency
+            else:
+                self.failures += 1
+                self.down_until = time.monotonic() + COOL_DOWN[min(self.consecutive_failures, len(COOL_DOWN) - 1)]
+                self.consecutive_failures += 1
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class PooledAlgodClient(algod.AlgodClient):
+    def __init__(self, algod_token: str, algod_addresses: list[str] | str, headers: dict = None,
+                 pool_size: int = POOL_SIZE, timeout: float = REQUEST_TIMEOUT):
+        if isinstance(algod_addresses, str):
+            algod_addresses = [a.strip() for a in algod_addresses.split(",") if a.strip()]
+        if not algod_addresses:
+            raise ValueError("at least one algod address is required")
+        super().__init__(algod_token, algod_addresses[0], headers)
+        self.endpoints = [Endpoint(address, pool_size) for address in algod_addresses]
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        # txid -> node that accepted it; per thread, the node of its last submission
+        self._pinned: OrderedDict[str, Endpoint] = OrderedDict()
+        self._local = threading.local()
+
+    # ---- endpoint selection ----
+
+    def _pinned_endpoint(self, requrl: str) -> Endpoint | None:
+        """Node that must serve a confirmation read, if any"""
+        if requrl.startswith(PENDING_PREFIX):
+            with self._lock:
+                return self._pinned.get(requrl[len(PENDING_PREFIX):])
+        if requrl == "/status" or requrl.startswith(LONG_POLL_PREFIX):
+            return getattr(self._local, "endpoint", None)
+        return None
+
+    def _pin(self, endpoint: Endpoint, data: bytes):
+        txids = _txids(data)
+        with self._lock:
+            for txid in txids:
+                self._pinned[txid] = endpoint
+            while len(self._pinned) > PINNED_TXIDS:
+                self._pinned.popitem(last=False)
+        self._local.endpoint = endpoint
+
+    def _candidates(self, write: bool, pinned: Endpoint = None) -> list[Endpoint]:
+        """Endpoints in the order they are tried for one request"""
+        with self._lock:
+            healthy = [e for e in self.endpoints if e.healthy]
+            down = sorted((e for e in self.endpoints if not e.healthy), key=lambda e: e.down_until)
+            if write:
+                # the healthiest node: fewest recent failures, then fastest
+                healthy.sort(key=lambda e: (e.consecutive_failures, e.latency if e.latency is not None else 0.0))
+            elif len(healthy) > 1:
+                # reads: best of two random choices, so load spreads while avoiding slow nodes
+                first, second = random.sample(healthy, 2)
+                best = first if first.score() <= second.score() else second
+                healthy.sort(key=Endpoint.score)
+                healthy.remove(best)
+                healthy.insert(0, best)
+            # nodes in cool-down are the last resort
+            candidates = healthy + down
+            if pinned is not None and pinned.healthy:
+                candidates.remove(pinned)
+                candidates.insert(0, pinned)
+            return candidates
+
+    def stats(self) -> list[dict]:
+        return [
+            {
+                "address": e.address,
+                "healthy": e.healthy,
+                "latency_ms": round(e.latency * 1000, 2) if e.latency is not None else None,
+                "requests": e.requests,
+                "failures": e.failures,
+            }
+            for e in self.endpoints
+        ]
+
+    def close(self):
+        for endpoint in self.endpoints:
+            endpoint.close()
+
+    # ---- requests ----
+
+    def algod_request(self, method, requrl, params=None, data=None, headers=None, response_format="json"):
+        header = {"User-Agent": "py-algorand-sdk", "Connection": "keep-alive"}
+        if self.headers:
+            header.update(self.headers)
+        if headers:
+            header.update(headers)
+        if requrl not in constants.no_auth:
+            header.update({constants.algod_auth_header: self.algod_token})
+
+        long_poll = requrl.startswith(LONG_POLL_PREFIX)
+        write = method == "POST" or requrl.startswith(WRITE_PATHS)
+        submit = method == "POST" and requrl == SUBMIT_PATH
+        pinned = self._pinned_endpoint(requrl)
+        if requrl not in constants.unversioned_paths:
+            requrl = algod.api_version_path_prefix + requrl
+        if params:
+            requrl = requrl + "?" + parse.urlencode(params)
+        timeout = LONG_POLL_TIMEOUT if long_poll else self.timeout
+
+        last_error = None
+        for endpoint in self._candidates(write, pinned):
+            with endpoint._lock:
+                endpoint.in_flight += 1
+                endpoint.requests += 1
+            start = time.perf_counter()
+            try:
+                status, body = endpoint.request(method, requrl, data, header, timeout)
+            except (OSError, http.client.HTTPException, socket.timeout) as err:
+                endpoint.record(None, ok=False)
+                if submit and not isinstance(err, EndpointUnreachable):
+                    # the node may have accepted the transactions: resending them elsewhere could only
+                    # report them as already in the ledger
+                    raise error.AlgodHTTPError(f"submission to {endpoint.address} failed, the transactions may "
+                                               f"still be committed: {err}")
+                last_error = err
+                continue
+            finally:
+                with endpoint._lock:
+                    endpoint.in_flight -= 1
+            if status >= 500:
+                endpoint.record(None, ok=False)
+                if submit:
+                    raise error.AlgodHTTPError(self._message(body), status)
+                # node side failure: try the next node
+                last_error = error.AlgodHTTPError(self._message(body), status)
+                continue
+            # long polls measure the chain, not the node
+            endpoint.record(None if long_poll else time.perf_counter() - start, ok=True)
+            if status >= 400:
+                raise error.AlgodHTTPError(self._message(body), status)
+            if submit:
+                self._pin(endpoint, data)
+            if response_format == "json":
+                try:
+                    return json.loads(body)
+                except Exception as e:
+                    raise error.AlgodResponseError("Failed to parse JSON response from algod") from e
+            return body
+        raise error.AlgodHTTPError(f"no algod endpoint available: {last_error}")
+
+    @staticmethod
+    def _message(body: bytes) -> str:
+        text = body.decode("utf-8", errors="replace")
+        try:
+            return json.loads(text)["message"]
+        except Exception:
+            return text
+
+
+# Tail latency benchmark: three local HTTP endpoints answering /v2/status with random latency, queried
+# by the same number of threads through the stock AlgodClient (one node, new connection per request) and
+# PooledAlgodClient (all nodes, keep-alive); then one node is stopped to show the failover.
+def benchmark(requests_per_thread=100, threads=16, base_latency=0.002, slow_latency=0.05, slow_ratio=0.05):
+    import statistics
+    from concurrent.futures import ThreadPoolExecutor
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            if self.server.stopped:
+                self.close_connection = True
+                return
+            time.sleep(slow_latency if random.random() < slow_ratio * self.server.slowness else base_latency)
+            body = json.dumps({"last-round": 1}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    servers = []
+    for slowness in (4, 1, 1):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        server.daemon_threads = True
+        server.slowness = slowness
+        server.stopped = False
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+    addresses = [f"http://127.0.0.1:{s.server_address[1]}" for s in servers]
+    token = "a" * 64
+
+    def measure(client):
+        def worker(_):
+            samples = []
+            for _ in range(requests_per_thread):
+                start = time.perf_counter()
+                client.status()
+                samples.append(time.perf_counter() - start)
+            return samples
+        start = time.perf_counter()
+        with ThreadPoolExecutor(threads) as executor:
+            samples = sorted(s for batch in executor.map(worker, range(threads)) for s in batch)
+        elapsed = time.perf_counter() - start
+        p50 = statistics.median(samples) * 1000
+        p99 = samples[int(len(samples) * 0.99) - 1] * 1000
+        return f"{len(samples) / elapsed:8.0f} req/s  p50 {p50:6.2f} ms  p99 {p99:6.2f} ms"
+
+    print(f"single node, urllib:    {measure(algod.AlgodClient(token, addresses[0]))}")
+    pooled = PooledAlgodClient(token, addresses)
+    print(f"3 nodes, pooled:        {measure(pooled)}")
+    servers[1].stopped = True
+    servers[1].shutdown()
+    servers[1].server_close()
+    print(f"3 nodes, one stopped:   {measure(pooled)}")
+    for stat in pooled.stats():
+        print(f"  {stat}")
+    pooled.close()
+    for server in (servers[0], servers[2]):
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    benchmark()
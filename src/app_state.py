@@ -0,0 +1,179 @@
+# Round-versioned global state cache for BorrowMyNFT apps.
+# Bots read an app's state (state, highest_bid, auction_period, ...) before almost every call, but the
+# state can only change when a block is committed. AppStateCache keeps one typed snapshot per app tagged
+# with the round it was read at, and reads algod again only when the chain has moved past that round
+# (a non-nudging waiter on the shared round watcher, src/rounds.py, registered only while snapshots are
+# cached) or when we sent a transaction to the app (touch, called from LightClient.call and the other send
+# paths through sent()).
+import threading
+from concurrent.futures import Future
+from dataclasses import asdict, dataclass, field
+
+from algosdk import encoding
+from algosdk.v2client import algod
+
+from src import rounds
+from src.light_client import LightClient
+
+
+@dataclass(frozen=True)
+class AppState:
+    app_id: int
+    round: int  # last committed round when the state was read
+    state: int = 0
+    nft_id: int = 0
+    borrower_address: str | None = None
+    lender_address: str | None = None
+    highest_bid: int = 0
+    auction_base: int = 0
+    auction_period: int = 0
+    payback_deadline: int = 0
+    last_interest_update_block: int = 0
+    debt_left: int = 0
+    # global state as returned by LightClient.get_application_state(raw=True)
+    raw: dict[bytes, int | bytes] = field(default_factory=dict, repr=False, compare=False)
+
+    @classmethod
+    def from_raw(cls, app_id: int, last_round: int, raw: dict[bytes, int | bytes]) -> "AppState":
+        values = {}
+        for name in ("state", "nft_id", "highest_bid", "auction_base", "auction_period", "payback_deadline",
+                     "last_interest_update_block", "debt_left"):
+            values[name] = raw.get(name.encode(), 0)
+        for name in ("borrower_address", "lender_address"):
+            address = raw.get(name.encode())
+            values[name] = encoding.encode_address(address) if isinstance(address, bytes) and len(address) == 32 \
+                else None
+        return cls(app_id=app_id, round=last_round, raw=raw, **values)
+
+    def as_dict(self) -> dict:
+        values = asdict(self)
+        del values["raw"]
+        return values
+
+
+class AppStateCache:
+    def __init__(self, client: algod.AlgodClient):
+        self.client = client
+        self.watcher = rounds.watcher_for(client)
+        # app id -> (snapshot, future resolved once a round after the snapshot is committed)
+        self._snapshots: dict[int, tuple[AppState, Future]] = {}
+        self._expiry: tuple[int, Future] | None = None
+        # touch() calls per app
+        self._touches: dict[int, int] = {}
+        # round of the last transaction we got confirmed per app: the watcher may not have seen it yet
+        self._floors: dict[int, int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, app_id: int) -> tuple[AppState, bool]:
+        """(snapshot of the app at the last committed round, whether it was served from the cache)"""
+        with self._lock:
+            cached = self._snapshots.get(app_id)
+            if cached is not None and not cached[1].done():
+                self.hits += 1
+                return cached[0], True
+            self.misses += 1
+            touches = self._touches.get(app_id, 0)
+            floor = self._floors.get(app_id, 0)
+        last_round = self.watcher.last_round
+        if last_round is None:
+            last_round = self.client.status()["last-round"]
+        raw = LightClient(self.client, app_id).get_application_state(raw=True)
+        # read after our transaction was confirmed: the state is at least as recent as its round
+        snapshot = AppState.from_raw(app_id, max(last_round, floor), raw)
+        expiry = self._expiry_of(snapshot.round)
+        with self._lock:
+            # not cached if touch() was called during the read: it may predate our transaction
+            if self._touches.get(app_id, 0) == touches:
+                self._snapshots[app_id] = (snapshot, expiry)
+        return snapshot, False
+
+    def _expiry_of(self, snapshot_round: int) -> Future:
+        # one watcher registration per round shared by every snapshot of that round; if the watcher was
+        # idle its last round may be old, and the snapshot then expires on its first status response
+        with self._lock:
+            if self._expiry is None or self._expiry[0] != snapshot_round:
+                self._expiry = (snapshot_round, self.watcher.future(snapshot_round + 1, nudge=False))
+            return self._expiry[1]
+
+    def get(self, app_id: int) -> AppState:
+        return self.lookup(app_id)[0]
+
+    def touch(self, app_id: int, confirmed_round: int = None):
+        """We sent a transaction to the app (confirmed in `confirmed_round` if known): its next read goes to algod"""
+        with self._lock:
+            self._snapshots.pop(app_id, None)
+            self._touches[app_id] = self._touches.get(app_id, 0) + 1
+            if confirmed_round:
+                self._floors[app_id] = max(self._floors.get(app_id, 0), confirmed_round)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": round(self.hits / total, 3) if total else 0.0}
+
+
+_caches: dict[int, AppStateCache] = {}
+_caches_lock = threading.Lock()
+
+
+# The shared state cache of an algod client (one per node/client, as for rounds.watcher_for)
+def cache_for(client: algod.AlgodClient) -> AppStateCache:
+    with _caches_lock:
+        cache = _caches.get(id(client))
+        if cache is None or cache.client is not client:
+            cache = _caches[id(client)] = AppStateCache(client)
+        return cache
+
+
+# Called after sending a transaction to an app (confirmed or not): touches the app in the client's cache,
+# if the client has one
+def sent(client: algod.AlgodClient, app_id: int, confirmed_round: int = None):
+    with _caches_lock:
+        cache = _caches.get(id(client))
+    if cache is not None and cache.client is client:
+        cache.touch(app_id, confirmed_round)
+
+
+# A bot checks `apps` auctions `checks_per_round` times per round (before every bid it might place) for
+# `rounds_run` rounds on the local algod stand-in: direct reads against the state cache.
+def benchmark(apps=20, checks_per_round=10, rounds_run=20, block_time=0.05):
+    import time
+
+    from algosdk.constants import microalgos_to_algos_ratio as algo
+
+    from src.local_algod import LocalAlgod
+    from src.simulator import SimulatedApp
+
+    node = LocalAlgod()
+    _, owner = node.ledger.new_account(1000 * algo)
+    app_ids = []
+    for _ in range(apps):
+        sim = SimulatedApp(node.ledger)
+        app_ids.append(node.submit([sim.build_create(owner)])[0].created_app_id)
+    node.block_time = block_time
+    node._thread = threading.Thread(target=node._produce_blocks, daemon=True)
+    node._thread.start()
+
+    def run(read):
+        requests, first_round = node.requests, node.ledger.round
+        while node.ledger.round - first_round < rounds_run:
+            for _ in range(checks_per_round):
+                for app_id in app_ids:
+                    assert read(app_id)[b"state"] == 0
+            rounds.watcher_for(node).wait_for(node.ledger.round + 1)
+        return node.requests - requests, node.ledger.round - first_round
+
+    direct, direct_rounds = run(lambda app_id: LightClient(node, app_id).get_application_state(raw=True))
+    cache = cache_for(node)
+    start = time.perf_counter()
+    cached, cached_rounds = run(lambda app_id: cache.get(app_id).raw)
+    print(f"direct reads: {direct} algod requests over {direct_rounds} rounds")
+    print(f"state cache: {cached} algod requests over {cached_rounds} rounds ({time.perf_counter() - start:.1f}s), "
+          f"{cache.stats()}")
+    rounds.watcher_for(node).stop()
+    node.close()
+
+
+if __name__ == "__main__":
+    benchmark()
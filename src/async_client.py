@@ -0,0 +1,301 @@
+# Asyncio client for BorrowMyNFT with pipelined submission.
+# Calls are signed and sent without waiting for the previous one to be confirmed; every pending txid is
+# tracked by one ConfirmationPoller per algod client and event loop, which follows the round stream
+# (src/rounds.py), reads each new block once and resolves the futures of the transactions committed in it.
+# A single process can keep hundreds of independent calls (bids, repayments, keeper actions on many apps)
+# in flight at once for one block_info request per round.
+import asyncio
+import base64
+import functools
+import itertools
+import os
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+import msgpack
+from algosdk import abi, encoding
+from algosdk.atomic_transaction_composer import (
+    ABIResult,
+    AccountTransactionSigner,
+    AtomicTransactionComposer,
+    TransactionSigner,
+    TransactionWithSigner,
+)
+from algosdk.v2client import algod
+
+from src import app_state, rounds
+from src.light_client import CONTRACT_PATH, LightClient, abi_result
+from src.params import SuggestedParamsProvider
+
+# Default bound on submitted but unconfirmed calls per client
+MAX_IN_FLIGHT = 256
+# Worker threads running the (blocking) algod HTTP requests
+MAX_WORKERS = 64
+# block_info requests issued concurrently by the poller (when it has more than one round to catch up on)
+FETCH_CONCURRENCY = 8
+# Fields of a SignedTxnInBlock that belong to the signed transaction
+SIGNATURE_FIELDS = ("sig", "msig", "lsig", "sgnr")
+
+
+class TransactionRejected(Exception):
+    def __init__(self, txid: str, reason: str):
+        super().__init__(f"{txid}: {reason}")
+        self.txid = txid
+        self.reason = reason
+
+
+# txid -> transaction info of the top-level transactions of a msgpack block_info response. The info has the
+# pending_transaction_info fields abi_result and the callers read (confirmed-round, logs, created ids); the
+# signed transaction is given with its msgpack field names and raw values.
+def block_txns(round_num: int, raw: bytes) -> dict[str, dict]:
+    block = msgpack.unpackb(raw, raw=False, strict_map_key=False)["block"]
+    infos = {}
+    for stib in block.get("txns") or []:
+        # a block leaves genesis id (when hgi is set) and genesis hash to its header
+        txn = dict(stib["txn"])
+        if stib.get("hgi"):
+            txn["gen"] = block["gen"]
+        if "gh" in block:
+            txn.setdefault("gh", block["gh"])
+        txn = dict(sorted(txn.items()))
+        txid = base64.b32encode(encoding.checksum(b"TX" + msgpack.packb(txn, use_bin_type=True)))
+        signed = {key: value for key, value in stib.items() if key in SIGNATURE_FIELDS}
+        signed["txn"] = txn
+        data = stib.get("dt") or {}
+        info = {
+            "confirmed-round": round_num,
+            "pool-error": "",
+            "txn": signed,
+            "logs": [base64.b64encode(log).decode() for log in data.get("lg") or []],
+        }
+        if "apid" in stib:
+            info["application-index"] = stib["apid"]
+        if "caid" in stib:
+            info["asset-index"] = stib["caid"]
+        infos[txid.decode().rstrip("=")] = info
+    return infos
+
+
+class ConfirmationPoller:
+    """Resolves one future per tracked txid with its transaction info once it is committed in a block"""
+
+    def __init__(self, client: algod.AlgodClient, executor: ThreadPoolExecutor = None,
+                 concurrency: int = FETCH_CONCURRENCY):
+        self.client = client
+        self.executor = executor or ThreadPoolExecutor(MAX_WORKERS, thread_name_prefix="confirmation-poller")
+        self.concurrency = concurrency
+        # txid -> [future, next round to look for it in, last valid round]
+        self._pending: dict[str, list] = {}
+        # txids of the fetched blocks some pending transaction may still be in
+        self._blocks: dict[int, dict[str, dict]] = {}
+        self._task: asyncio.Task | None = None
+        self.requests = 0
+
+    def track(self, txid: str, first_round: int, last_valid: int = None) -> asyncio.Future:
+        """first_round is the first block the transaction can be in (the round after the one it was sent in)"""
+        entry = self._pending.get(txid)
+        if entry is not None:
+            return entry[0]
+        fut = asyncio.get_running_loop().create_future()
+        self._pending[txid] = [fut, first_round, last_valid]
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return fut
+
+    def in_flight(self) -> int:
+        return len(self._pending)
+
+    async def _run(self):
+        watcher = rounds.watcher_for(self.client)
+        last = watcher.last_round
+        if last is None:
+            last = await watcher.wait(0)
+        # idles (no task, no request) once nothing is tracked
+        while self._pending:
+            wanted = set()
+            for _, next_round, last_valid in self._pending.values():
+                wanted.update(range(next_round, min(last, last_valid if last_valid is not None else last) + 1))
+            await self._fetch(sorted(wanted - self._blocks.keys()))
+            self._resolve(last)
+            if self._pending:
+                last = await watcher.wait(last + 1)
+        self._blocks.clear()
+
+    async def _fetch(self, numbers: list[int]):
+        loop = asyncio.get_running_loop()
+        slots = asyncio.Semaphore(self.concurrency)
+
+        async def fetch(number):
+            async with slots:
+                self.requests += 1
+                request = functools.partial(self.client.block_info, number, response_format="msgpack")
+                return await loop.run_in_executor(self.executor, request)
+
+        raws = await asyncio.gather(*(fetch(number) for number in numbers), return_exceptions=True)
+        for number, raw in zip(numbers, raws):
+            # a block the node does not serve yet, or a failed request, is asked for again next round
+            if isinstance(raw, bytes):
+                self._blocks[number] = block_txns(number, raw)
+
+    def _resolve(self, last_round: int):
+        for txid, entry in list(self._pending.items()):
+            fut, next_round, last_valid = entry
+            end = min(last_round, last_valid) if last_valid is not None else last_round
+            while not fut.done() and next_round <= end and next_round in self._blocks:
+                info = self._blocks[next_round].get(txid)
+                if info is not None:
+                    fut.set_result(info)
+                next_round += 1
+            entry[1] = next_round
+            if fut.done():
+                del self._pending[txid]
+            elif last_valid is not None and next_round > last_valid:
+                fut.set_exception(TransactionRejected(txid, f"not confirmed before round {last_valid}"))
+                del self._pending[txid]
+        keep = min((entry[1] for entry in self._pending.values()), default=last_round + 1)
+        for number in [number for number in self._blocks if number < keep]:
+            del self._blocks[number]
+
+
+_pollers: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+
+# The shared poller of an algod client in the running event loop (futures and tasks belong to one loop)
+def poller_for(client: algod.AlgodClient) -> ConfirmationPoller:
+    pollers = _pollers.setdefault(asyncio.get_running_loop(), {})
+    poller = pollers.get(id(client))
+    if poller is None or poller.client is not client:
+        poller = pollers[id(client)] = ConfirmationPoller(client)
+    return poller
+
+
+class AsyncBorrowClient:
+    """Asyncio counterpart of LightClient.call: any number of calls may be awaited concurrently"""
+
+    def __init__(
+        self,
+        client: algod.AlgodClient,
+        app_id: int,
+        signer: TransactionSigner,
+        sender: str = None,
+        params: SuggestedParamsProvider = None,
+        max_in_flight: int = MAX_IN_FLIGHT,
+        spec_path=CONTRACT_PATH,
+    ):
+        self.client = client
+        self.spec_path = spec_path
+        self.light = LightClient(client, app_id, signer, sender, spec_path=spec_path)
+        self.app_id = app_id
+        self.app_addr = self.light.app_addr
+        self.sender = self.light.sender
+        self.params = params or SuggestedParamsProvider(client)
+        self.max_in_flight = max_in_flight
+        self._slots: asyncio.Semaphore | None = None
+        # identical calls (e.g. two health checks in the same round) would share a txid
+        self._note_prefix = os.urandom(4)
+        self._nonce = itertools.count()
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    def prepare(self, signer: TransactionSigner, sender: str = None) -> "AsyncBorrowClient":
+        """makes a client bound to another signer, sharing params provider and poller"""
+        return AsyncBorrowClient(self.client, self.app_id, signer, sender, self.params, self.max_in_flight,
+                                 self.spec_path)
+
+    @property
+    def poller(self) -> ConfirmationPoller:
+        return poller_for(self.client)
+
+    def _note(self) -> bytes:
+        return self._note_prefix + next(self._nonce).to_bytes(8, "big")
+
+    def compose(self, method: str, after: list[TransactionWithSigner] = None, **kwargs) -> AtomicTransactionComposer:
+        """Builds (without sending) the group of a method call, followed by the optional `after` transactions"""
+        if "suggested_params" not in kwargs:
+            kwargs["suggested_params"] = self.params.for_method(method)
+        kwargs.setdefault("note", self._note())
+        atc = self.light.add_method_call(AtomicTransactionComposer(), method, **kwargs)
+        for txn in after or []:
+            atc.add_transaction(txn)
+        return atc
+
+    async def submit(self, atc: AtomicTransactionComposer) -> list[str]:
+        """Signs and sends a group; returns its txids as soon as algod accepted it"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.poller.executor, atc.submit, self.client)
+
+    async def call(self, method: str | abi.Method, after: list[TransactionWithSigner] = None, **kwargs) -> ABIResult:
+        method = self.light.get_method(method)
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_in_flight)
+        async with self._slots:
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            try:
+                atc = self.compose(method.name, after, **kwargs)
+                index = max(atc.method_dict)
+                txn = atc.txn_list[index].txn
+                watcher = rounds.watcher_for(self.client)
+                sent_after = watcher.last_round
+                if sent_after is None:
+                    sent_after = await watcher.wait(0)
+                tx_ids = await self.submit(atc)
+                try:
+                    info = await self.poller.track(tx_ids[index], sent_after + 1, txn.last_valid_round)
+                except BaseException:
+                    app_state.sent(self.client, self.app_id)
+                    raise
+            finally:
+                self.in_flight -= 1
+        app_state.sent(self.client, self.app_id, info.get("confirmed-round"))
+        return abi_result(method, tx_ids[index], info)
+
+    async def call_many(self, calls: list[tuple[str, dict]]) -> list[ABIResult | Exception]:
+        """Runs independent calls concurrently; failures are returned in place of their result"""
+        return await asyncio.gather(*(self.call(method, **kwargs) for method, kwargs in calls),
+                                    return_exceptions=True)
+
+
+# Throughput benchmark against the in-process algod stand-in (src/local_algod.py): the same number of
+# health calls sent one at a time through LightClient (ATC execute, wait for confirmation) and
+# concurrently through AsyncBorrowClient.
+def benchmark(n_calls=500, sequential_calls=20, latency=0.02, block_time=0.25, max_in_flight=MAX_IN_FLIGHT):
+    from algosdk.constants import microalgos_to_algos_ratio as algo
+
+    from src.local_algod import LocalAlgod
+
+    node = LocalAlgod(block_time=block_time, latency=latency)
+    private_key, owner = node.ledger.new_account(1000 * algo)
+    signer = AccountTransactionSigner(private_key)
+    app_id, app_addr, _ = LightClient(node, signer=signer).create()
+    print(f"Local algod: {latency * 1000:.0f} ms per request, one block every {block_time}s; app {app_id}")
+
+    light = LightClient(node, app_id, signer)
+    params = SuggestedParamsProvider(node)
+    start = time.perf_counter()
+    for i in range(sequential_calls):
+        light.call("health", suggested_params=params.get(), note=b"seq%d" % i)
+    elapsed = time.perf_counter() - start
+    print(f"sequential: {sequential_calls} calls in {elapsed:.2f}s -> {sequential_calls / elapsed:.1f} tx/s")
+
+    async def run():
+        client = AsyncBorrowClient(node, app_id, signer, params=params, max_in_flight=max_in_flight)
+        start = time.perf_counter()
+        results = await client.call_many([("health", {})] * n_calls)
+        elapsed = time.perf_counter() - start
+        failed = [r for r in results if isinstance(r, Exception)]
+        rounds_used = len({r.tx_info["confirmed-round"] for r in results if not isinstance(r, Exception)})
+        print(f"async:      {n_calls} calls in {elapsed:.2f}s -> {(n_calls - len(failed)) / elapsed:.1f} tx/s, "
+              f"peak {client.peak_in_flight} in flight, confirmed over {rounds_used} rounds, "
+              f"{len(failed)} failed, {client.poller.requests} confirmation requests")
+        if failed:
+            print(f"first failure: {failed[0]!r}")
+
+    asyncio.run(run())
+    rounds.watcher_for(node).stop()
+    node.close()
+
+
+if __name__ == "__main__":
+    benchmark()
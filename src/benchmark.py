@@ -0,0 +1,325 @@
+# Opcode cost and fee benchmark of every BorrowMyNFT method and branch.
+# Each case runs on a fresh simulated ledger (src/simulator.py) and records the opcode cost, the number of
+# inner transactions and the minimum app call fee the contract accepts; the size of the assembled programs
+# is recorded too. Results are compared with src/benchmark_baseline.json and any regression fails the run:
+#
+#   python -m src.benchmark            compare with the baseline (exit code 1 on regression)
+#   python -m src.benchmark --update   rewrite the baseline
+import json
+import os
+import sys
+
+from algosdk.constants import microalgos_to_algos_ratio as algo
+
+from src.params import METHOD_FEE_MULTIPLIERS
+from src.simulator import (
+    APP_CALL_BUDGET,
+    APPROVAL_PATH,
+    CLEAR_PATH,
+    CONTRACT_PATH,
+    MAX_INNER_TXNS,
+    MIN_TXN_FEE,
+    CallResult,
+    Ledger,
+    SimulatedApp,
+    SimulationError,
+    assemble,
+    asset_transfer_txn,
+    create_nft_txn,
+    payment_txn,
+)
+
+path = os.path.dirname(os.path.abspath(__file__))
+
+BASELINE_PATH = os.path.join(path, "benchmark_baseline.json")
+
+# Metrics where a higher value is a regression
+METRICS = ("cost", "inner_txns", "min_fee")
+
+MILLI_ALGO = algo // 1000
+AUCTION_PERIOD = 2
+PAYBACK_DEADLINE = 2
+
+
+class Bench:
+    """A deployed BorrowMyNFT on a fresh ledger, with helpers moving the contract through its states.
+    Setup calls use the fees of src/params.py; only the measured call uses the fee under test."""
+
+    def __init__(self, approval_path=APPROVAL_PATH, clear_path=CLEAR_PATH, contract_path=CONTRACT_PATH,
+                 deploy=True):
+        self.ledger = Ledger()
+        _, self.owner = self.ledger.new_account(100 * algo)
+        _, self.borrower = self.ledger.new_account(100 * algo)
+        _, self.lender = self.ledger.new_account(100 * algo)
+        _, self.other_lender = self.ledger.new_account(100 * algo)
+        self.sim = SimulatedApp(self.ledger, approval_path, clear_path, contract_path)
+        self.asset_id = self.ledger.submit([create_nft_txn(self.borrower, "G3 NFT@arc3", "G3", "")])[0] \
+            .created_asset_id
+        if deploy:
+            self.sim.create(self.owner)
+            self.ledger.submit([payment_txn(self.owner, self.sim.app_addr, 100 * MILLI_ALGO)])
+
+    @staticmethod
+    def fee(method: str) -> int:
+        return MIN_TXN_FEE * METHOD_FEE_MULTIPLIERS.get(method, 1)
+
+    def call(self, method: str, sender: str, fee: int = None, **kwargs) -> CallResult:
+        return self.sim.call(method, sender, fee=self.fee(method) if fee is None else fee, **kwargs)
+
+    def provide_access(self, fee=None):
+        return self.call("provide_access_to_nft", self.borrower, fee, nft=self.asset_id,
+                         payment=payment_txn(self.borrower, self.sim.app_addr, 100 * MILLI_ALGO))
+
+    def set_offer(self, fee=None):
+        return self.call("set_offer", self.borrower, fee, foreign_assets=[self.asset_id],
+                         asset_xfer=asset_transfer_txn(self.borrower, self.sim.app_addr, self.asset_id, 1),
+                         auction_base=100, auction_period=AUCTION_PERIOD, payback_deadline=PAYBACK_DEADLINE)
+
+    def list_nft(self):
+        self.provide_access()
+        self.set_offer()
+
+    # provide_access_to_nft + set_offer in one group
+    def list_nft_group(self, fee=None):
+        return self.call("list_nft", self.borrower, fee, nft=self.asset_id,
+                         payment=payment_txn(self.borrower, self.sim.app_addr, 100 * MILLI_ALGO),
+                         auction_base=100, auction_period=AUCTION_PERIOD, payback_deadline=PAYBACK_DEADLINE,
+                         after=[asset_transfer_txn(self.borrower, self.sim.app_addr, self.asset_id, 1)])
+
+    def bid(self, lender, amount, fee=None, previous_lender=None):
+        return self.call("place_bid", lender, fee, accounts=[previous_lender] if previous_lender else None,
+                         payment=payment_txn(lender, self.sim.app_addr, amount))
+
+    def end_auction(self):
+        state = self.sim.global_state()
+        self.ledger.advance(max(0, state["auction_period"] + 1 - self.ledger.round))
+
+    def accept(self, fee=None):
+        return self.call("accept_bid", self.borrower, fee)
+
+    def borrow(self, amount=200 * MILLI_ALGO):
+        self.list_nft()
+        self.bid(self.lender, amount)
+        self.accept()
+
+    # debt the borrower owes if pay_back is evaluated in the next round
+    def debt_due(self):
+        state = self.sim.global_state()
+        blocks = self.ledger.round + 1 - state["last_interest_update_block"]
+        return state["debt_left"] + state["debt_left"] * blocks // 1000000
+
+    def pay_back(self, amount, fee=None):
+        return self.call("pay_back", self.borrower, fee, foreign_assets=[self.asset_id], accounts=[self.lender],
+                         payment=payment_txn(self.borrower, self.sim.app_addr, amount))
+
+
+def case_create(b: Bench, fee):
+    b.sim.create(b.owner, fee=fee)
+    return b.sim.calls[-1]
+
+
+def case_health(b: Bench, fee):
+    return b.call("health", b.owner, fee)
+
+
+def case_read_state(b: Bench, fee):
+    return b.call("read_state", b.owner, fee)
+
+
+def case_provide_access_to_nft(b: Bench, fee):
+    return b.provide_access(fee)
+
+
+def case_set_offer(b: Bench, fee):
+    b.provide_access()
+    return b.set_offer(fee)
+
+
+def case_list_nft(b: Bench, fee):
+    return b.list_nft_group(fee)
+
+
+def case_place_bid_first(b: Bench, fee):
+    b.list_nft()
+    return b.bid(b.lender, 200 * MILLI_ALGO, fee)
+
+
+def case_place_bid_outbid(b: Bench, fee):
+    b.list_nft()
+    b.bid(b.lender, 200 * MILLI_ALGO)
+    return b.bid(b.other_lender, 300 * MILLI_ALGO, fee, previous_lender=b.lender)
+
+
+def case_accept_bid(b: Bench, fee):
+    b.list_nft()
+    b.bid(b.lender, 200 * MILLI_ALGO)
+    b.end_auction()
+    return b.accept(fee)
+
+
+def case_timeout_no_bid(b: Bench, fee):
+    b.list_nft()
+    b.end_auction()
+    return b.call("timeout", b.lender, fee, foreign_assets=[b.asset_id], accounts=[b.borrower])
+
+
+def case_timeout_with_bid(b: Bench, fee):
+    b.list_nft()
+    b.bid(b.lender, 200 * MILLI_ALGO)
+    b.end_auction()
+    return b.call("timeout", b.lender, fee, foreign_assets=[b.asset_id], accounts=[b.borrower])
+
+
+def case_cancel_offer_no_bid(b: Bench, fee):
+    b.list_nft()
+    return b.call("cancel_offer", b.borrower, fee, foreign_assets=[b.asset_id])
+
+
+def case_cancel_offer_with_bid(b: Bench, fee):
+    b.list_nft()
+    b.bid(b.lender, 200 * MILLI_ALGO)
+    return b.call("cancel_offer", b.borrower, fee, foreign_assets=[b.asset_id], accounts=[b.lender])
+
+
+def case_pay_back_partial(b: Bench, fee):
+    b.borrow()
+    return b.pay_back(b.debt_due() // 2, fee)
+
+
+def case_pay_back_exact(b: Bench, fee):
+    b.borrow()
+    return b.pay_back(b.debt_due(), fee)
+
+
+def case_pay_back_overpay(b: Bench, fee):
+    b.borrow()
+    return b.pay_back(b.debt_due() + 50 * MILLI_ALGO, fee)
+
+
+def case_loan_expired(b: Bench, fee):
+    b.borrow()
+    b.ledger.advance(PAYBACK_DEADLINE + 1)
+    b.ledger.submit([asset_transfer_txn(b.lender, b.lender, b.asset_id, 0)])
+    return b.call("loan_expired", b.lender, fee, foreign_assets=[b.asset_id])
+
+
+def case_pay_me(b: Bench, fee):
+    b.borrow()
+    b.pay_back(b.debt_due())
+    return b.call("pay_me", b.owner, fee)
+
+
+def case_delete(b: Bench, fee):
+    return b.sim.delete(b.owner, fee=fee)
+
+
+CASES = {
+    "create": (case_create, False),
+    "health": (case_health, True),
+    "read_state": (case_read_state, True),
+    "provide_access_to_nft": (case_provide_access_to_nft, True),
+    "set_offer": (case_set_offer, True),
+    "list_nft": (case_list_nft, True),
+    "place_bid (first bid)": (case_place_bid_first, True),
+    "place_bid (outbid)": (case_place_bid_outbid, True),
+    "accept_bid": (case_accept_bid, True),
+    "timeout (no bid)": (case_timeout_no_bid, True),
+    "timeout (with bid)": (case_timeout_with_bid, True),
+    "cancel_offer (no bid)": (case_cancel_offer_no_bid, True),
+    "cancel_offer (with bid)": (case_cancel_offer_with_bid, True),
+    "pay_back (partial)": (case_pay_back_partial, True),
+    "pay_back (exact)": (case_pay_back_exact, True),
+    "pay_back (overpay)": (case_pay_back_overpay, True),
+    "loan_expired": (case_loan_expired, True),
+    "pay_me": (case_pay_me, True),
+    "delete": (case_delete, True),
+}
+
+
+# Runs a case with increasing app call fees: the first accepted fee is the minimum fee
+def measure(case, deploy: bool, paths: tuple) -> dict:
+    error = None
+    for multiplier in range(1, MAX_INNER_TXNS + 2):
+        fee = MIN_TXN_FEE * multiplier
+        try:
+            result = case(Bench(*paths, deploy=deploy), fee)
+        except SimulationError as err:
+            error = err
+            continue
+        return {
+            "cost": result.cost,
+            "inner_txns": result.inner_txn_count,
+            "min_fee": fee,
+        }
+    raise SimulationError(f"{case.__name__} never succeeded: {error}")
+
+
+def run(approval_path=APPROVAL_PATH, clear_path=CLEAR_PATH, contract_path=CONTRACT_PATH) -> dict:
+    paths = (approval_path, clear_path, contract_path)
+    bench = Bench(*paths, deploy=False)
+    return {
+        "programs": {
+            "approval": len(assemble(bench.sim.approval)),
+            "clear": len(assemble(bench.sim.clear)),
+        },
+        "methods": {name: measure(case, deploy, paths) for name, (case, deploy) in CASES.items()},
+    }
+
+
+def report(results: dict, baseline: dict | None) -> list[str]:
+    """Prints the results next to the baseline and returns the regressions"""
+    baseline = baseline or {"programs": {}, "methods": {}}
+    regressions = []
+
+    def cell(value, old):
+        if old is None:
+            return f"{value:>8d} (new)   "
+        return f"{value:>8d} ({value - old:+6d})" if value != old else f"{value:>8d}         "
+
+    print(f"{'program':24s}{'bytes':>17s}")
+    for name, size in results["programs"].items():
+        old = baseline["programs"].get(name)
+        print(f"{name:24s}{cell(size, old)}")
+        if old is not None and size > old:
+            regressions.append(f"{name} program size {old} -> {size}")
+
+    print(f"\n{'method':24s}" + "".join(f"{m:>17s}" for m in METRICS) + f"{'budget':>8s}")
+    for name, metrics in results["methods"].items():
+        old_metrics = baseline["methods"].get(name, {})
+        row = "".join(cell(metrics[m], old_metrics.get(m)) for m in METRICS)
+        print(f"{name:24s}{row}{metrics['cost'] / APP_CALL_BUDGET:8.0%}")
+        for m in METRICS:
+            old = old_metrics.get(m)
+            if old is not None and metrics[m] > old:
+                regressions.append(f"{name} {m} {old} -> {metrics[m]}")
+
+    # hand-picked fees of src/params.py against what the contract actually requires
+    for name, metrics in results["methods"].items():
+        configured = Bench.fee(name.split(" ")[0])
+        if configured < metrics["min_fee"]:
+            print(f"WARNING: {name} needs a fee of {metrics['min_fee']}, src/params.py pays {configured}")
+    return regressions
+
+
+def main(argv):
+    results = run()
+    baseline = None
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH) as f:
+            baseline = json.load(f)
+    regressions = report(results, baseline)
+    if "--update" in argv:
+        with open(BASELINE_PATH, "w") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+        print(f"\nBaseline written to {BASELINE_PATH}")
+        return 0
+    if regressions:
+        print("\nREGRESSIONS:\n\t" + "\n\t".join(regressions))
+        return 1
+    print("\nNo regression against the baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,267 @@
+# Bid-race-aware place_bid.
+# When several lenders bid on one NFT in the same round only the first bid satisfies
+# `payment.amount() > highest_bid`; the others fail the assert. Bidder reads the auction state at most
+# once per round (RoundStateCache), checks a bid locally before sending it, and when it loses a race it
+# re-reads the state and resubmits a higher bid following an EscalationPolicy, up to the lender's cap.
+# BidMetrics counts races, retries and accepted bids to measure the effective bid throughput.
+import threading
+import time
+from dataclasses import dataclass, field
+from math import ceil
+
+from algosdk import encoding, error
+from algosdk.atomic_transaction_composer import ABIResult, TransactionSigner, TransactionWithSigner
+from algosdk.future import transaction
+from algosdk.v2client import algod
+
+from src import app_state, rounds
+from src.light_client import LightClient
+from src.params import SuggestedParamsProvider
+
+# Same bounds as BorrowMyNFT
+MAX_N_ALGOS = 200000000000
+AUCTION_STATE = 1
+
+
+class BidRejected(Exception):
+    """The bid cannot win: it was not sent (or not resent), so no fee was spent on it"""
+
+
+class RoundStateCache:
+    """Global state of an app read at most once per round, from the shared AppStateCache of the client"""
+
+    def __init__(self, client: algod.AlgodClient, app_id: int):
+        self.app_id = app_id
+        self.states = app_state.cache_for(client)
+        self._lock = threading.Lock()
+        self.reads = 0
+        self.hits = 0
+
+    def invalidate(self):
+        self.states.touch(self.app_id)
+
+    def get(self) -> dict[bytes, int | bytes]:
+        snapshot, hit = self.states.lookup(self.app_id)
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.reads += 1
+        return snapshot.raw
+
+
+@dataclass
+class EscalationPolicy:
+    # a retried bid raises the current highest bid by at least `step` microAlgos ...
+    step: int = 1000
+    # ... or by this fraction of it, whichever is larger
+    factor: float = 0.0
+    # place_bid groups sent per bid() call, the first one included
+    max_attempts: int = 5
+
+    def next_bid(self, highest_bid: int, auction_base: int) -> int:
+        floor = max(highest_bid, auction_base)
+        return floor + max(self.step, ceil(floor * self.factor))
+
+
+@dataclass
+class BidMetrics:
+    submitted: int = 0  # place_bid groups sent to algod
+    won: int = 0  # bids confirmed
+    races_lost: int = 0  # sent bids rejected because a higher bid got in first
+    escalations: int = 0  # bids raised by the policy (before sending or after a lost race)
+    precheck_rejections: int = 0  # bids dropped locally because they could not win
+    gave_up: int = 0  # bid() calls that ended above the cap, out of attempts or after the auction
+    fees_paid: int = 0  # microAlgos of fees of the confirmed bids
+    started_at: float = field(default_factory=time.monotonic)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def add(self, **counts):
+        with self._lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def summary(self) -> dict:
+        elapsed = time.monotonic() - self.started_at
+        return {
+            "submitted": self.submitted,
+            "won": self.won,
+            "races_lost": self.races_lost,
+            "race_rate": round(self.races_lost / self.submitted, 3) if self.submitted else 0.0,
+            "escalations": self.escalations,
+            "precheck_rejections": self.precheck_rejections,
+            "gave_up": self.gave_up,
+            "fees_paid": self.fees_paid,
+            "effective_bids_per_s": round(self.won / elapsed, 2) if elapsed > 0 else 0.0,
+        }
+
+
+@dataclass
+class BidResult:
+    amount: int
+    attempts: int
+    result: ABIResult
+
+
+class Bidder:
+    def __init__(
+        self,
+        client: algod.AlgodClient,
+        app_id: int,
+        signer: TransactionSigner,
+        sender: str = None,
+        params: SuggestedParamsProvider = None,
+        policy: EscalationPolicy = None,
+        metrics: BidMetrics = None,
+        cache: RoundStateCache = None,
+    ):
+        self.light = LightClient(client, app_id, signer, sender)
+        self.sender = self.light.sender
+        self.params = params or SuggestedParamsProvider(client)
+        self.policy = policy or EscalationPolicy()
+        self.metrics = metrics or BidMetrics()
+        # lenders of the same process share one cache per app
+        self.cache = cache or RoundStateCache(client, app_id)
+
+    # Reason why `amount` cannot win against the given state, None if it can
+    @staticmethod
+    def precheck(state: dict[bytes, int | bytes], amount: int, last_round: int | None) -> str | None:
+        if state.get(b"state") != AUCTION_STATE:
+            return "the NFT is not in auction"
+        if last_round is not None and last_round + 1 > state.get(b"auction_period", 0):
+            return "the auction is over"
+        if amount > MAX_N_ALGOS:
+            return f"bid above {MAX_N_ALGOS} microAlgos"
+        if amount <= state.get(b"highest_bid", 0) or amount <= state.get(b"auction_base", 0):
+            return "outbid"
+        return None
+
+    def bid(self, amount: int, max_bid: int = None) -> BidResult:
+        """Places a bid of `amount` microAlgos; when outbid, raises it up to `max_bid` (default: no raise)"""
+        max_bid = amount if max_bid is None else max_bid
+        attempts = 0
+        while True:
+            state = self.cache.get()
+            reason = self.precheck(state, amount, self._last_round())
+            if reason == "outbid":
+                raised = self.policy.next_bid(state.get(b"highest_bid", 0), state.get(b"auction_base", 0))
+                if raised <= max_bid:
+                    self.metrics.add(escalations=1)
+                    amount, reason = raised, None
+            if reason is not None:
+                self.metrics.add(precheck_rejections=1, gave_up=1)
+                raise BidRejected(reason)
+            if attempts >= self.policy.max_attempts:
+                self.metrics.add(gave_up=1)
+                raise BidRejected(f"still outbid after {attempts} attempts")
+            attempts += 1
+            sent_after = self._last_round()
+            try:
+                result, payment_fee = self._send(amount, state)
+            except (error.AlgodHTTPError, error.ConfirmationTimeoutError) as err:
+                # a lost race fails the highest_bid assert in the pool, or the bid is dropped when the
+                # block is assembled and never confirms
+                if isinstance(err, error.AlgodHTTPError) and "logic eval error" not in str(err):
+                    raise
+                self.metrics.add(submitted=1)
+                if not self._outbid(amount, sent_after):
+                    # any other assert (fee, auction over, ...): raising the bid would not help
+                    raise
+                self.metrics.add(races_lost=1)
+                continue
+            fees = result.tx_info["txn"]["txn"].get("fee", 0) + payment_fee
+            self.metrics.add(submitted=1, won=1, fees_paid=fees)
+            self.cache.invalidate()
+            return BidResult(amount=amount, attempts=attempts, result=result)
+
+    def _last_round(self) -> int:
+        last_round = rounds.watcher_for(self.light.client).last_round
+        return last_round if last_round is not None else self.light.client.status()["last-round"]
+
+    def _outbid(self, amount: int, sent_after: int) -> bool:
+        """Whether a rejected bid of `amount` lost a race: a bid at least as high got in first"""
+        self.cache.invalidate()
+        if self.cache.get().get(b"highest_bid", 0) >= amount:
+            return True
+        # the winning bid may still be in the pool: it is committed in the round after ours was sent
+        rounds.watcher_for(self.light.client).wait_for(sent_after + 1)
+        self.cache.invalidate()
+        return self.cache.get().get(b"highest_bid", 0) >= amount
+
+    def _send(self, amount: int, state: dict[bytes, int | bytes]) -> tuple[ABIResult, int]:
+        """(result of the place_bid call, fee of its payment)"""
+        payment_sp = self.params.get()
+        payment = TransactionWithSigner(
+            txn=transaction.PaymentTxn(self.sender, payment_sp, self.light.app_addr, amount,
+                                       note=b"bid %d" % amount),
+            signer=self.light.signer,
+        )
+        # the previous highest bid is refunded by an inner payment: its lender must be available
+        previous_lender = state.get(b"lender_address") if state.get(b"highest_bid", 0) > 0 else None
+        accounts = [encoding.encode_address(previous_lender)] if previous_lender else None
+        result = self.light.call(
+            "place_bid",
+            suggested_params=self.params.for_method("place_bid"),
+            payment=payment,
+            accounts=accounts,
+        )
+        return result, payment_sp.fee
+
+
+# Contention benchmark against the local algod stand-in: every lender keeps outbidding the others on the
+# same NFT, with its own cap, until the auction price is above every cap but one.
+def benchmark(lenders=8, block_time=0.2, latency=0.005, step=10000):
+    import random
+    from concurrent.futures import ThreadPoolExecutor
+
+    from algosdk.atomic_transaction_composer import AccountTransactionSigner
+    from algosdk.constants import microalgos_to_algos_ratio as algo
+
+    from src.local_algod import LocalAlgod
+    from src.simulator import SimulatedApp, asset_transfer_txn, create_nft_txn, payment_txn
+
+    node = LocalAlgod(block_time=block_time, latency=latency)
+    ledger = node.ledger
+    with node._cond:
+        _, owner = ledger.new_account(100 * algo)
+        _, borrower = ledger.new_account(100 * algo)
+        sim = SimulatedApp(ledger)
+        sim.create(owner)
+        ledger.submit([payment_txn(owner, sim.app_addr, algo // 10)])
+        asset_id = ledger.submit([create_nft_txn(borrower, "G3 NFT@arc3", "G3", "")])[0].created_asset_id
+        sim.call("list_nft", borrower, fee=2000, nft=asset_id,
+                 payment=payment_txn(borrower, sim.app_addr, algo // 10),
+                 auction_base=100000, auction_period=100000, payback_deadline=10,
+                 after=[asset_transfer_txn(borrower, sim.app_addr, asset_id, 1)])
+        keys = [ledger.new_account(1000 * algo) for _ in range(lenders)]
+
+    metrics = BidMetrics()
+    params = SuggestedParamsProvider(node)
+    cache = RoundStateCache(node, sim.app_id)
+    caps = [random.randint(2, 4) * algo for _ in range(lenders)]
+
+    def lender(i):
+        private_key, _ = keys[i]
+        bidder = Bidder(node, sim.app_id, AccountTransactionSigner(private_key), params=params,
+                        policy=EscalationPolicy(step=step), metrics=metrics, cache=cache)
+        while True:
+            try:
+                bidder.bid(0, max_bid=caps[i])
+            except BidRejected:
+                return
+
+    start_round = node.ledger.round
+    with ThreadPoolExecutor(lenders) as executor:
+        list(executor.map(lender, range(lenders)))
+    state = ledger.global_state(sim.app_id)
+    print(f"{lenders} lenders, one block every {block_time}s: highest bid {state[b'highest_bid']} "
+          f"(best cap {max(caps)}), {node.ledger.round - start_round} rounds")
+    print(f"state reads {cache.reads}, cache hits {cache.hits}")
+    for name, value in metrics.summary().items():
+        print(f"  {name}: {value}")
+    rounds.watcher_for(node).stop()
+    node.close()
+
+
+if __name__ == "__main__":
+    benchmark()
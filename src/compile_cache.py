@@ -0,0 +1,197 @@
+# On-disk compile cache for the BorrowMyNFT programs.
+# Entries are keyed by the hash of the contract source and the pyteal/beaker versions and hold the
+# TEAL, the ABI spec and (once an algod compiled them) the program bytecode with its source map, so
+# repeated deploys and client startups skip both the PyTeal compile and the algod /compile round trip.
+import json
+import os
+from base64 import b64decode
+from hashlib import sha256
+from importlib.metadata import PackageNotFoundError, version
+
+from algosdk import abi
+from algosdk.future.transaction import StateSchema
+from algosdk.source_map import SourceMap
+from algosdk.v2client import algod
+from beaker.client import ApplicationClient
+from beaker.decorators import MethodHints
+
+path = os.path.dirname(os.path.abspath(__file__))
+
+CONTRACT_SOURCE = os.path.join(path, "contract.py")
+CACHE_DIR = os.environ.get("BORROW_MY_NFT_CACHE_DIR", os.path.join(path, ".compile_cache"))
+
+# Packages whose version changes the generated TEAL
+COMPILER_PACKAGES = ("pyteal", "beaker-pyteal")
+
+
+def _package_version(name):
+    try:
+        return version(name)
+    except PackageNotFoundError:
+        return "unknown"
+
+
+# Cache key: contract source bytes + compiler versions
+def contract_fingerprint(source_path=CONTRACT_SOURCE):
+    digest = sha256()
+    with open(source_path, "rb") as f:
+        digest.update(f.read())
+    for package in COMPILER_PACKAGES:
+        digest.update(f"{package}=={_package_version(package)}".encode())
+    return digest.hexdigest()
+
+
+def _entry_path(fingerprint, cache_dir):
+    return os.path.join(cache_dir, f"{fingerprint}.json")
+
+
+def _write_entry(entry, cache_dir):
+    os.makedirs(cache_dir, exist_ok=True)
+    target = _entry_path(entry["fingerprint"], cache_dir)
+    # write-then-rename so concurrent processes never read a partial entry
+    tmp = f"{target}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(entry, f)
+    os.replace(tmp, target)
+
+
+# Returns the cached entry for the current contract source, running the PyTeal compile only on a miss
+def load_or_build(source_path=CONTRACT_SOURCE, cache_dir=CACHE_DIR):
+    fingerprint = contract_fingerprint(source_path)
+    try:
+        with open(_entry_path(fingerprint, cache_dir)) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        pass
+
+    from src.contract import BorrowMyNFT
+
+    app = BorrowMyNFT()
+    entry = {
+        "fingerprint": fingerprint,
+        "approval": app.approval_program,
+        "clear": app.clear_program,
+        "spec": app.application_spec(),
+        "binaries": None,
+    }
+    _write_entry(entry, cache_dir)
+    return entry
+
+
+# Compiles the cached TEAL on algod once and stores bytecode and source maps in the entry
+def load_binaries(client: algod.AlgodClient, entry, cache_dir=CACHE_DIR):
+    if entry.get("binaries") is None:
+        approval = client.compile(entry["approval"], source_map=True)
+        clear = client.compile(entry["clear"], source_map=True)
+        entry["binaries"] = {
+            "approval": approval["result"],
+            # nodes that do not build source maps (the local stand-in) leave them out
+            "approval_map": approval.get("sourcemap"),
+            "clear": clear["result"],
+            "clear_map": clear.get("sourcemap"),
+        }
+        _write_entry(entry, cache_dir)
+    return entry["binaries"]
+
+
+class _CachedState:
+    def __init__(self, schema):
+        self._schema = schema
+
+    def schema(self):
+        values = list(self._schema["declared"].values())
+        num_uints = sum(1 for v in values if v["type"] == "uint64")
+        num_byte_slices = len(values) - num_uints
+        for v in self._schema["reserved"].values():
+            if v["type"] == "uint64":
+                num_uints += v["max_keys"]
+            else:
+                num_byte_slices += v["max_keys"]
+        return StateSchema(num_uints=num_uints, num_byte_slices=num_byte_slices)
+
+    def dictify(self):
+        return self._schema
+
+
+class CachedApplication:
+    """Stand-in for BorrowMyNFT built from a cache entry, accepted by beaker's ApplicationClient.
+
+    Methods are exposed as abi.Method attributes (app.place_bid, app.pay_back, ...) so callers can keep
+    using app_client.call(app.<method>, ...).
+    """
+
+    def __init__(self, entry):
+        spec = entry["spec"]
+        self.approval_program = entry["approval"]
+        self.clear_program = entry["clear"]
+        self.precompiles = {}
+        # BorrowMyNFT has bare create and delete handlers (not ABI methods, so not in the spec): beaker sends
+        # plain application create/delete transactions when these are None
+        self.on_create = None
+        self.on_update = None
+        self.on_opt_in = None
+        self.on_close_out = None
+        self.on_clear_state = None
+        self.on_delete = None
+        self.contract = abi.Contract.undictify(spec["contract"])
+        self.hints = {
+            method.name: MethodHints(read_only=spec["hints"].get(method.name, {}).get("read_only", False))
+            for method in self.contract.methods
+        }
+        self.app_state = _CachedState(spec["schema"]["global"])
+        self.acct_state = _CachedState(spec["schema"]["local"])
+        self._spec = spec
+        self._methods = {method.name: method for method in self.contract.methods}
+
+    def __getattr__(self, name):
+        methods = self.__dict__.get("_methods", {})
+        if name in methods:
+            return methods[name]
+        raise AttributeError(name)
+
+    def application_spec(self):
+        return self._spec
+
+
+# ApplicationClient for BorrowMyNFT whose programs come from the compile cache
+def cached_application_client(client: algod.AlgodClient, cache_dir=CACHE_DIR, **kwargs) -> ApplicationClient:
+    entry = load_or_build(cache_dir=cache_dir)
+    app_client = ApplicationClient(client, CachedApplication(entry), **kwargs)
+    binaries = load_binaries(client, entry, cache_dir)
+    app_client.approval_binary = b64decode(binaries["approval"])
+    app_client.approval_src_map = SourceMap(binaries["approval_map"]) if binaries["approval_map"] else None
+    app_client.clear_binary = b64decode(binaries["clear"])
+    app_client.clear_src_map = SourceMap(binaries["clear_map"]) if binaries["clear_map"] else None
+    return app_client
+
+
+# Self-check on the local algod stand-in: an app deployed through the cached client can be deleted by it
+def check(cache_dir=CACHE_DIR):
+    import tempfile
+
+    from algosdk.atomic_transaction_composer import AccountTransactionSigner
+    from algosdk.constants import microalgos_to_algos_ratio as algo
+
+    from src.local_algod import LocalAlgod
+    from src.params import SuggestedParamsProvider
+
+    node = LocalAlgod()
+    private_key, _ = node.ledger.new_account(100 * algo)
+    # the stand-in bytecode is not stored in the shared cache
+    with tempfile.TemporaryDirectory() as tmp:
+        entry = load_or_build(cache_dir=cache_dir)
+        _write_entry(entry, tmp)
+        app_client = cached_application_client(node, cache_dir=tmp, signer=AccountTransactionSigner(private_key))
+    app_id, _, _ = app_client.create()
+    app_client.fund(algo // 10)
+    app_client.delete(suggested_params=SuggestedParamsProvider(node).for_method("delete"))
+    assert app_id not in node.ledger.apps, "app not deleted"
+    node.close()
+    print(f"create and delete of app {app_id} through the cached client: ok")
+
+
+# Warm the cache (PyTeal compile only, no algod needed) and check it
+if __name__ == "__main__":
+    cached = load_or_build()
+    print(f"Cache entry {cached['fingerprint']} in {CACHE_DIR}")
+    check()
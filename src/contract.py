@@ -100,7 +100,8 @@ class BorrowMyNFT(Application):
             Bytes("Contract is up and running!")
         )
     # Reset state is used to reset state variables to their default values
-    @internal
+    # (TealType.none makes it a private subroutine: a bare @internal is also exposed as a public ABI method)
+    @internal(TealType.none)
     def reset_state(self):
         return Seq(
             self.state.set(Int(0)),
@@ -116,7 +117,6 @@ class BorrowMyNFT(Application):
         )
 
     #pay_me_internal is used by both pay_me and delete. pay_me_internal pays the contract owner by emptying the contract balance. 
-    @internal
     def pay_me_internal(self):
         return Seq(
             Assert(
@@ -130,6 +130,39 @@ class BorrowMyNFT(Application):
                 TxnField.fee: Int(0)
             })
         )
+    #return_nft closes a loan: the NFT goes to receiver (closing the contract holding), then the state is reset.
+    #If amount is given, it is paid to the lender in the same inner group (checked to be > 0 at run time unless
+    #amount_is_positive). Shared by timeout, cancel_offer, pay_back (full repayment) and loan_expired
+    def return_nft(self, receiver: Expr, amount: Expr = None, amount_is_positive: bool = False):
+        pay_lender = Seq()
+        if amount is not None:
+            pay_lender = Seq(
+                InnerTxnBuilder.Next(),
+                InnerTxnBuilder.SetFields(
+                    {
+                        TxnField.type_enum: TxnType.Payment,
+                        TxnField.amount: amount,
+                        TxnField.receiver: self.lender_address.get(),
+                        TxnField.fee: Int(0)
+                    })
+            )
+            if not amount_is_positive:
+                pay_lender = If(amount > Int(0)).Then(pay_lender)
+        return Seq(
+            InnerTxnBuilder.Begin(),
+            InnerTxnBuilder.SetFields(
+                {
+                    TxnField.type_enum: TxnType.AssetTransfer,
+                    TxnField.xfer_asset: self.nft_id.get(),
+                    TxnField.asset_receiver: receiver,
+                    TxnField.asset_close_to: receiver,
+                    TxnField.fee: Int(0)
+                }),
+            pay_lender,
+            InnerTxnBuilder.Submit(),
+            self.reset_state()
+        )
+
     #pay_me is a wrapper around pay_me_internal. 
     @external(authorize=Authorize.only(Global.creator_address()))
     def pay_me(self):
@@ -164,37 +197,20 @@ class BorrowMyNFT(Application):
             self.initialize_account_state(),
         )
 
-    # 2 transactions are checked:
-    # one to transfer the NFT, 
-    # and the one calling set_offer
-    # Borrowers can call set_offer to auction their NFTs
-    @external
-    def set_offer(
-            self,
-            asset_xfer: abi.AssetTransferTransaction,
-            auction_base: abi.Uint64,
-            auction_period: abi.Uint64,
-            payback_deadline: abi.Uint64
-    ):
-        asset_holding = AssetHolding.balance(
-            Global.current_application_address(), asset_xfer.get().xfer_asset()
-        )
-        asset_manager = AssetParam.manager(Int(0))
-        asset_clawback = AssetParam.clawback(Int(0))
-        asset_freeze = AssetParam.freeze(Int(0))
+    #open_auction checks the NFT parameters and the auction inputs, then records the offer (state 1).
+    #asset is the reference used to read the asset parameters (foreign assets index or id), nft_id the NFT id.
+    #Shared by set_offer and list_nft
+    def open_auction(self, asset: Expr, nft_id: Expr, auction_base: abi.Uint64, auction_period: abi.Uint64,
+                     payback_deadline: abi.Uint64):
+        asset_manager = AssetParam.manager(asset)
+        asset_clawback = AssetParam.clawback(asset)
+        asset_freeze = AssetParam.freeze(asset)
         return Seq(
-            asset_holding,
             asset_manager,
             asset_clawback,
             asset_freeze,
             Assert(
-                Global.group_size() == Int(2),
-                # check asset transfer is correct
-                asset_xfer.get().asset_receiver() == self.address,
-                asset_xfer.get().asset_amount() == Int(1),
-                asset_xfer.get().sender() == Txn.sender(),
                 # check NFT has no dangerous fields set
-                Txn.assets[0] == asset_xfer.get().xfer_asset(),      
                 asset_manager.value()==Global.zero_address(),  
                 asset_clawback.value()==Global.zero_address(), 
                 asset_freeze.value()==Global.zero_address(), 
@@ -211,32 +227,100 @@ class BorrowMyNFT(Application):
             ),
             #updatig contract state
             self.state.set(Int(1)),
-            self.nft_id.set(asset_xfer.get().xfer_asset()),
+            self.nft_id.set(nft_id),
             self.auction_base.set(auction_base.get()),
             self.auction_period.set(Global.round()+auction_period.get()),
             self.payback_deadline.set(payback_deadline.get()),
             self.borrower_address.set(Txn.sender())
+        )
+
+    # 2 transactions are checked:
+    # one to transfer the NFT, 
+    # and the one calling set_offer
+    # Borrowers can call set_offer to auction their NFTs
+    @external
+    def set_offer(
+            self,
+            asset_xfer: abi.AssetTransferTransaction,
+            auction_base: abi.Uint64,
+            auction_period: abi.Uint64,
+            payback_deadline: abi.Uint64
+    ):
+        asset_holding = AssetHolding.balance(
+            Global.current_application_address(), asset_xfer.get().xfer_asset()
+        )
+        return Seq(
+            asset_holding,
+            Assert(
+                Global.group_size() == Int(2),
+                # check asset transfer is correct
+                asset_xfer.get().asset_receiver() == self.address,
+                asset_xfer.get().asset_amount() == Int(1),
+                asset_xfer.get().sender() == Txn.sender(),
+                Txn.assets[0] == asset_xfer.get().xfer_asset(),      
+            ),
+            self.open_auction(Int(0), asset_xfer.get().xfer_asset(), auction_base, auction_period, payback_deadline)
         ) 
 
+    # list_nft does provide_access_to_nft and set_offer in a single atomic group of 3 transactions:
+    # the payment for the contract minimum balance, the list_nft call (the contract opts in to the NFT)
+    # and, right after it, the NFT transfer to the contract
+    @external
+    def list_nft(
+            self,
+            payment: abi.PaymentTransaction,
+            nft: abi.Asset,
+            auction_base: abi.Uint64,
+            auction_period: abi.Uint64,
+            payback_deadline: abi.Uint64
+    ):
+        nft_xfer = Gtxn[Txn.group_index() + Int(1)]
+        return Seq(
+            Assert(
+                Global.group_size() == Int(3),
+                Txn.fee() >= self.FEE * Int(2),
+                payment.get().receiver() == self.address,
+                payment.get().amount() >= self.MIN_BAL,
+                # check the NFT transfer following this call
+                nft_xfer.type_enum() == TxnType.AssetTransfer,
+                nft_xfer.xfer_asset() == nft.asset_id(),
+                nft_xfer.asset_receiver() == self.address,
+                nft_xfer.asset_amount() == Int(1),
+                nft_xfer.sender() == Txn.sender(),
+            ),
+            InnerTxnBuilder.Execute(
+                {
+                    TxnField.type_enum: TxnType.AssetTransfer,
+                    TxnField.xfer_asset: nft.asset_id(),
+                    TxnField.asset_receiver: self.address,
+                    TxnField.fee: Int(0),
+                    TxnField.asset_amount: Int(0),
+                }
+            ),
+            self.open_auction(nft.asset_id(), nft.asset_id(), auction_base, auction_period, payback_deadline)
+        )
+
     #Place bid isused by the lender to bis for the NFT
     @external
     def place_bid(self, payment: abi.PaymentTransaction):
+        highest_bid = ScratchVar(TealType.uint64)
         return Seq(
+            highest_bid.store(self.highest_bid.get()),
             Assert(
             	Global.group_size() == Int(2),	
                 Txn.fee() >= Global.min_txn_fee() * Int(3),	
                 self.state.get() == Int(1),	
                 payment.get().receiver() == self.address,	
-                payment.get().amount() > self.highest_bid.get(),	
+                payment.get().amount() > highest_bid.load(),	
                 payment.get().amount() > self.auction_base.get(),	
                 payment.get().amount() <= self.MAX_N_ALGOS,	
                 Global.round() <= self.auction_period.get()	
             ),
-            If(self.highest_bid.get() > Int(0)).Then(Seq(
+            If(highest_bid.load() > Int(0)).Then(Seq(
                 InnerTxnBuilder.Execute(
                     {
                         TxnField.type_enum: TxnType.Payment,
-                        TxnField.amount: self.highest_bid.get(),
+                        TxnField.amount: highest_bid.load(),
                         TxnField.receiver: self.lender_address.get(),
                         TxnField.fee: Int(0)
                     })
@@ -248,22 +332,24 @@ class BorrowMyNFT(Application):
     #Accept bid is used by the borrower to take the loan
     @external
     def accept_bid(self):
+        highest_bid = ScratchVar(TealType.uint64)
         return Seq(
+            highest_bid.store(self.highest_bid.get()),
             Assert(
                 Txn.fee() >= Global.min_txn_fee() * Int(2),
                 Txn.sender() == self.borrower_address.get(),
-                self.highest_bid.get() > Int(0),
+                highest_bid.load() > Int(0),
                 self.state.get() == Int(1),
             ),
             self.state.set(Int(2)),
-            self.debt_left.set(self.highest_bid.get()),
+            self.debt_left.set(highest_bid.load()),
             self.last_interest_update_block.set(Global.round()),
             self.payback_deadline.set(Add(Global.round(), self.payback_deadline.get())),
             InnerTxnBuilder.Execute(
                 {
                     TxnField.type_enum: TxnType.Payment,
-                    TxnField.amount: Minus(self.highest_bid.get(), Div(self.highest_bid.get(), self.INTEREST_RATE_CONTRACT_DEN)),
-                    TxnField.receiver: self.borrower_address.get(),
+                    TxnField.amount: Minus(highest_bid.load(), Div(highest_bid.load(), self.INTEREST_RATE_CONTRACT_DEN)),
+                    TxnField.receiver: Txn.sender(),
                     TxnField.fee: Int(0)
                 })
         )
@@ -277,28 +363,7 @@ class BorrowMyNFT(Application):
                 self.state.get() == Int(1),	
                 Global.round() > self.auction_period.get()
             ),
-            InnerTxnBuilder.Begin(),
-            InnerTxnBuilder.SetFields(
-                {
-                    TxnField.type_enum: TxnType.AssetTransfer,
-                    TxnField.xfer_asset: self.nft_id.get(),
-                    TxnField.asset_amount: Int(1),
-                    TxnField.asset_receiver: self.borrower_address.get(),
-                    TxnField.asset_close_to: self.borrower_address.get(),
-                    TxnField.fee: Int(0)
-                }),
-            If(self.highest_bid > Int(0)).Then(Seq(
-                InnerTxnBuilder.Next(),
-                InnerTxnBuilder.SetFields(
-                    {
-                        TxnField.type_enum: TxnType.Payment,
-                        TxnField.amount: self.highest_bid.get(),
-                        TxnField.receiver: self.lender_address.get(),
-                        TxnField.fee: Int(0)
-                    })
-            )),
-            InnerTxnBuilder.Submit(),
-            self.reset_state()
+            self.return_nft(self.borrower_address.get(), self.highest_bid.get())
         )
     #If the bids are low, the borower may decide to keep the NFT instead of accepting the loan
     @external
@@ -309,107 +374,53 @@ class BorrowMyNFT(Application):
                 self.state.get() == Int(1),
                 Txn.fee() >= Global.min_txn_fee() * Int(3),
             ),
-            InnerTxnBuilder.Begin(),
-            InnerTxnBuilder.SetFields(
-                {
-                    TxnField.type_enum: TxnType.AssetTransfer,
-                    TxnField.xfer_asset: self.nft_id.get(),
-                    TxnField.asset_receiver: self.borrower_address.get(),
-                    TxnField.asset_close_to: self.borrower_address.get(),
-                    TxnField.fee: Int(0),
-                }
-            ),
-            If(Gt(self.highest_bid, Int(0))).Then(Seq(
-                InnerTxnBuilder.Next(),
-                InnerTxnBuilder.SetFields(
-                    {
-                        TxnField.type_enum: TxnType.Payment,
-                        TxnField.amount: self.highest_bid.get(),
-                        TxnField.receiver: self.lender_address.get(),
-                        TxnField.fee: Int(0)
-                    }),
-            )),
-            InnerTxnBuilder.Submit(),
-            self.reset_state()
+            self.return_nft(Txn.sender(), self.highest_bid.get())
         )
 
     #After accepting the loan, the borrower uses pay_back to pay the loan back. The loan can be repayed in multiple payments
     @external
     def pay_back(self, payment: abi.PaymentTransaction):
+        # debt_left and payment amount are read once and kept in scratch slots
+        debt_left = ScratchVar(TealType.uint64)
+        amount = ScratchVar(TealType.uint64)
         # interest=debt_left*INTEREST_RATE_NUM*blocks/INTEREST_RATE_DEN. Notice: INTEREST_RATE_NUM=1
-        interest = Div(Mul(self.debt_left.get(), Minus(Global.round(), self.last_interest_update_block.get())),
-                       self.INTEREST_RATE_DEN)
+        interest = ScratchVar(TealType.uint64)
         return Seq(
+            debt_left.store(self.debt_left.get()),
+            amount.store(payment.get().amount()),
+            interest.store(Div(Mul(debt_left.load(), Minus(Global.round(), self.last_interest_update_block.get())),
+                               self.INTEREST_RATE_DEN)),
             Assert(
                 Global.group_size() == Int(2),	
                 Txn.fee() >= Global.min_txn_fee() * Int(5),	
                 self.state.get() == Int(2),	
                 payment.get().receiver() == self.address,	
-                payment.get().amount() >= interest
+                amount.load() >= interest.load()
             ),
-            self.debt_left.set(self.debt_left.get() + interest),
-            self.last_interest_update_block.set(Global.round()),
-            #the borrower sent too many algos
-            If(payment.get().amount() > self.debt_left.get()).Then(Seq(
-                InnerTxnBuilder.Begin(),
-                InnerTxnBuilder.SetFields(
-                    {
-                        TxnField.type_enum: TxnType.Payment,
-                        TxnField.amount: payment.get().amount() - self.debt_left.get(),
-                        TxnField.receiver: Txn.sender(),
-                        TxnField.fee: Int(0)
-                    }),
-                InnerTxnBuilder.Next(),
-                InnerTxnBuilder.SetFields(
-                    {
-                        TxnField.type_enum: TxnType.Payment,
-                        TxnField.amount: self.debt_left.get(),
-                        TxnField.receiver: self.lender_address.get(),
-                        TxnField.fee: Int(0)
-                    }),
-                InnerTxnBuilder.Next(),
-                InnerTxnBuilder.SetFields(
-                    {
-                        TxnField.type_enum: TxnType.AssetTransfer,
-                        TxnField.xfer_asset: self.nft_id.get(),
-                        TxnField.asset_amount: Int(1),
-                        TxnField.asset_receiver: self.borrower_address.get(),
-                        TxnField.asset_close_to: self.borrower_address.get(),
-                        TxnField.fee: Int(0)
-                    }),
-                InnerTxnBuilder.Submit(),
-                self.reset_state()
-            #the borrower sent the perfect amount of algos    
-            )).ElseIf(payment.get().amount() == self.debt_left.get()).Then(Seq(
-                InnerTxnBuilder.Begin(),
-                InnerTxnBuilder.SetFields(
-                    {
-                        TxnField.type_enum: TxnType.Payment,
-                        TxnField.amount: self.debt_left.get(),
-                        TxnField.receiver: self.lender_address.get(),
-                        TxnField.fee: Int(0)
-                    }),
-                InnerTxnBuilder.Next(),
-                InnerTxnBuilder.SetFields(
-                    {
-                        TxnField.type_enum: TxnType.AssetTransfer,
-                        TxnField.xfer_asset: self.nft_id.get(),
-                        TxnField.asset_amount: Int(1),
-                        TxnField.asset_receiver: self.borrower_address.get(),
-                        TxnField.asset_close_to: self.borrower_address.get(),
-                        TxnField.fee: Int(0)
-                    }),
-                InnerTxnBuilder.Submit(),
-                self.reset_state()
+            debt_left.store(debt_left.load() + interest.load()),
+            If(amount.load() >= debt_left.load()).Then(Seq(
+                #the borrower sent too many algos: the excess is refunded first
+                If(amount.load() > debt_left.load()).Then(
+                    InnerTxnBuilder.Execute(
+                        {
+                            TxnField.type_enum: TxnType.Payment,
+                            TxnField.amount: amount.load() - debt_left.load(),
+                            TxnField.receiver: Txn.sender(),
+                            TxnField.fee: Int(0)
+                        })
+                ),
+                #the debt is fully repaid: the lender gets it and the borrower gets the NFT back
+                self.return_nft(self.borrower_address.get(), debt_left.load(), amount_is_positive=True)
             #the borrower paid back a portion of the loan    
             )).Else(Seq(
                 InnerTxnBuilder.Execute({
                     TxnField.type_enum: TxnType.Payment,
-                    TxnField.amount: payment.get().amount(),
+                    TxnField.amount: amount.load(),
                     TxnField.receiver: self.lender_address.get(),
                     TxnField.fee: Int(0)
                 }),
-                self.debt_left.set(self.debt_left.get() - payment.get().amount())
+                self.debt_left.set(debt_left.load() - amount.load()),
+                self.last_interest_update_block.set(Global.round())
             ))
         )
     #if the payback period expires, the lender can obtain the NFT
@@ -422,16 +433,7 @@ class BorrowMyNFT(Application):
                 self.state.get() == Int(2),
                 Global.round() >= self.payback_deadline.get()
             ),
-            InnerTxnBuilder.Execute(
-                {
-                    TxnField.type_enum: TxnType.AssetTransfer,
-                    TxnField.xfer_asset: self.nft_id.get(),
-                    TxnField.asset_amount: Int(1),
-                    TxnField.asset_receiver: self.lender_address.get(),
-                    TxnField.asset_close_to: self.lender_address.get(),
-                    TxnField.fee: Int(0)
-                }),
-            self.reset_state()
+            self.return_nft(Txn.sender())
         )
 
       
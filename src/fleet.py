@@ -0,0 +1,169 @@
+# Batched state reader for fleets of BorrowMyNFT apps (one app per NFT).
+# A dashboard over N apps used to issue N sequential get_application_state calls and base64-decode every
+# key and value. read_fleet fetches the apps through a bounded worker pool, keeps at most a window of
+# requests queued, and decodes only the uint fields it needs (keys are matched in their base64 form) into
+# columnar NumPy arrays. stream_fleet yields the same columns chunk by chunk as the responses arrive.
+from base64 import b64encode
+from collections.abc import Iterator
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+
+import numpy as np
+from algosdk import error
+from algosdk.v2client import algod
+
+# Concurrent application_info requests
+MAX_WORKERS = 32
+# Apps per streamed chunk
+CHUNK_SIZE = 256
+
+COLUMNS = ("state", "nft_id", "highest_bid", "auction_base", "auction_period", "payback_deadline",
+           "last_interest_update_block", "debt_left")
+# base64 global state key -> column index
+_KEYS = {b64encode(name.encode()).decode(): i for i, name in enumerate(COLUMNS)}
+
+
+@dataclass
+class FleetState:
+    app_id: np.ndarray  # uint64
+    state: np.ndarray  # uint64, one column per field of COLUMNS
+    nft_id: np.ndarray
+    highest_bid: np.ndarray
+    auction_base: np.ndarray
+    auction_period: np.ndarray
+    payback_deadline: np.ndarray
+    last_interest_update_block: np.ndarray
+    debt_left: np.ndarray
+    missing: list[int]  # apps that do not exist (deleted or wrong id)
+
+    @classmethod
+    def from_rows(cls, app_ids: list[int], rows: list[list[int]], missing: list[int]) -> "FleetState":
+        table = np.array(rows, dtype=np.uint64).reshape(len(rows), len(COLUMNS))
+        return cls(np.array(app_ids, dtype=np.uint64), *table.T, missing=missing)
+
+    @classmethod
+    def concat(cls, parts: list["FleetState"]) -> "FleetState":
+        if not parts:
+            return cls.from_rows([], [], [])
+        columns = [np.concatenate([getattr(p, name) for p in parts]) for name in ("app_id",) + COLUMNS]
+        return cls(*columns, missing=[app_id for p in parts for app_id in p.missing])
+
+    def __len__(self) -> int:
+        return len(self.app_id)
+
+
+def decode_row(global_state: list[dict]) -> list[int]:
+    """Uint fields of COLUMNS from an algod global-state list (0 when unset)"""
+    row = [0] * len(COLUMNS)
+    for entry in global_state:
+        index = _KEYS.get(entry["key"])
+        if index is not None:
+            row[index] = entry["value"].get("uint", 0)
+    return row
+
+
+def _fetch(client: algod.AlgodClient, app_id: int) -> list[dict] | None:
+    try:
+        return client.application_info(app_id).get("params", {}).get("global-state", [])
+    except error.AlgodHTTPError as err:
+        if getattr(err, "code", None) == 404:
+            return None
+        raise
+
+
+def stream_fleet(
+    client: algod.AlgodClient,
+    app_ids: list[int],
+    max_workers: int = MAX_WORKERS,
+    chunk_size: int = CHUNK_SIZE,
+) -> Iterator[FleetState]:
+    """Yields the apps' state in columnar chunks, in completion order"""
+    ids, rows, missing = [], [], []
+    pending = {}
+    app_iter = iter(app_ids)
+    with ThreadPoolExecutor(max_workers, thread_name_prefix="fleet") as executor:
+        # at most two requests per worker queued: memory stays flat for any fleet size
+        for app_id in app_iter:
+            pending[executor.submit(_fetch, client, app_id)] = app_id
+            if len(pending) >= 2 * max_workers:
+                break
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                app_id = pending.pop(future)
+                global_state = future.result()
+                if global_state is None:
+                    missing.append(app_id)
+                else:
+                    ids.append(app_id)
+                    rows.append(decode_row(global_state))
+                next_id = next(app_iter, None)
+                if next_id is not None:
+                    pending[executor.submit(_fetch, client, next_id)] = next_id
+            if len(ids) >= chunk_size:
+                yield FleetState.from_rows(ids, rows, missing)
+                ids, rows, missing = [], [], []
+    if ids or missing:
+        yield FleetState.from_rows(ids, rows, missing)
+
+
+def read_fleet(client: algod.AlgodClient, app_ids: list[int], max_workers: int = MAX_WORKERS) -> FleetState:
+    """The state of every app as one set of columns, ordered by completion (see FleetState.app_id)"""
+    return FleetState.concat(list(stream_fleet(client, app_ids, max_workers)))
+
+
+# Scans `apps` apps on the local algod stand-in with `latency` seconds per request: sequential
+# get_application_state calls (extrapolated from a sample) against read_fleet.
+def benchmark(apps=10000, latency=0.005, sample=200):
+    import dataclasses
+    import random
+    import time
+
+    from algosdk.constants import microalgos_to_algos_ratio as algo
+
+    from src.light_client import LightClient
+    from src.local_algod import LocalAlgod
+    from src.simulator import SimulatedApp
+
+    node = LocalAlgod()
+    ledger = node.ledger
+    _, owner = ledger.new_account(10 ** 5 * algo)
+    sim = SimulatedApp(ledger)
+    sim.create(owner)
+    template = ledger.apps[sim.app_id]
+    app_ids = [sim.app_id]
+    # copies of one created app with random loan fields, instead of `apps` create transactions
+    for _ in range(apps - 1):
+        app_id = ledger._new_id()
+        ledger.apps[app_id] = dataclasses.replace(template, id=app_id, global_state={
+            b"state": random.randint(0, 2), b"highest_bid": random.randint(0, 10 ** 9),
+            b"debt_left": random.randint(0, 10 ** 9), b"auction_period": random.randint(0, 10 ** 6),
+            b"payback_deadline": random.randint(0, 10 ** 6), b"nft_id": app_id + 1,
+        })
+        app_ids.append(app_id)
+    node.latency = latency
+
+    start = time.perf_counter()
+    for app_id in app_ids[:sample]:
+        LightClient(node, app_id).get_application_state()
+    sequential = (time.perf_counter() - start) / sample * apps
+
+    start, first_chunk = time.perf_counter(), None
+    parts = []
+    for part in stream_fleet(node, app_ids):
+        first_chunk = first_chunk or time.perf_counter() - start
+        parts.append(part)
+    fleet = FleetState.concat(parts)
+    elapsed = time.perf_counter() - start
+    order = np.argsort(fleet.app_id)
+    expected = [ledger.apps[app_id].global_state.get(b"debt_left", 0) for app_id in sorted(app_ids)]
+    assert len(fleet) == apps and fleet.debt_left[order].tolist() == expected
+    in_loan = fleet.state == 2
+    print(f"sequential get_application_state (extrapolated from {sample}): {sequential:.1f}s for {apps} apps")
+    print(f"stream_fleet: {elapsed:.1f}s ({apps / elapsed:.0f} apps/s, first chunk after {first_chunk * 1000:.0f} ms), "
+          f"{int(in_loan.sum())} loans with {int(fleet.debt_left[in_loan].sum())} microAlgos of debt")
+    node.close()
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,99 @@
+# Grouped submission of many independent transactions (bulk minting, funding, opt-ins).
+# Transactions are packed 16 per atomic group (the protocol limit) and signed once; the groups are sent
+# concurrently and confirmed in one pass: every round the groups not confirmed yet are checked through
+# their first transaction, woken by the shared round watcher (src/rounds.py) instead of one
+# wait_for_confirmation loop per transaction.
+from concurrent.futures import ThreadPoolExecutor
+
+from algosdk import error
+from algosdk.atomic_transaction_composer import TransactionSigner
+from algosdk.constants import tx_group_limit
+from algosdk.future import transaction
+from algosdk.v2client import algod
+
+from src import rounds
+
+# Groups sent concurrently
+MAX_IN_FLIGHT = 8
+
+
+def sign_in_groups(txns: list[transaction.Transaction], signer: TransactionSigner,
+                   group_size: int = tx_group_limit) -> list[list[transaction.SignedTransaction]]:
+    """Splits the transactions into atomic groups of at most group_size (group ids set in place) and signs them"""
+    groups = []
+    for start in range(0, len(txns), group_size):
+        group = txns[start:start + group_size]
+        if len(group) > 1:
+            transaction.assign_group_id(group)
+        groups.append(signer.sign_transactions(group, list(range(len(group)))))
+    return groups
+
+
+def send_and_confirm(
+    client: algod.AlgodClient,
+    groups: list[list[transaction.SignedTransaction]],
+    max_in_flight: int = MAX_IN_FLIGHT,
+) -> list[int]:
+    """Sends the signed groups concurrently and waits for all of them; returns their confirmed rounds"""
+    if not groups:
+        return []
+    last_valid = min(stxn.transaction.last_valid_round for group in groups for stxn in group)
+    txids = [group[0].get_txid() for group in groups]
+    confirmed: dict[str, int] = {}
+    watcher = rounds.watcher_for(client)
+    with ThreadPoolExecutor(max_in_flight, thread_name_prefix="groups") as executor:
+        list(executor.map(client.send_transactions, groups))
+        last_round = client.status()["last-round"]
+        while True:
+            pending = [txid for txid in txids if txid not in confirmed]
+            for txid, info in zip(pending, executor.map(client.pending_transaction_info, pending)):
+                if info.get("confirmed-round", 0) > 0:
+                    confirmed[txid] = info["confirmed-round"]
+                elif info.get("pool-error"):
+                    raise error.AlgodHTTPError(f"group {txid} rejected: {info['pool-error']}")
+            if len(confirmed) == len(txids):
+                return [confirmed[txid] for txid in txids]
+            if last_round > last_valid:
+                raise error.ConfirmationTimeoutError(f"{len(txids) - len(confirmed)} groups not confirmed "
+                                                     f"by round {last_valid}")
+            last_round = watcher.wait_for(last_round + 1)
+
+
+# Funds `accounts` new accounts on the local algod stand-in (one block every block_time seconds) with
+# utils.fund_accounts, against one confirmed payment at a time (extrapolated from a sample).
+def benchmark(accounts=1000, block_time=0.25, latency=0.005, sample=8):
+    import time
+
+    from algosdk import account
+    from algosdk.atomic_transaction_composer import AccountTransactionSigner
+    from algosdk.constants import microalgos_to_algos_ratio as algo
+
+    from src import utils
+    from src.local_algod import LocalAlgod
+
+    node = LocalAlgod(block_time=block_time, latency=latency)
+    with node._cond:
+        private_key, funder = node.ledger.new_account(10 ** 6 * algo)
+    signer = AccountTransactionSigner(private_key)
+    receivers = [account.generate_account()[1] for _ in range(accounts)]
+
+    start = time.perf_counter()
+    for receiver in receivers[:sample]:
+        txn = transaction.PaymentTxn(funder, node.suggested_params(), receiver, algo)
+        transaction.wait_for_confirmation(node, node.send_transaction(txn.sign(private_key)))
+        node.account_info(receiver)
+    sequential = (time.perf_counter() - start) / sample * accounts
+
+    start, requests = time.perf_counter(), node.requests
+    balances = utils.fund_accounts(node, signer, funder, receivers[sample:], algo)
+    bulk = time.perf_counter() - start
+    assert all(balance == algo for balance in balances.values())
+    print(f"one payment at a time (extrapolated): {sequential:.1f}s for {accounts} accounts")
+    print(f"fund_accounts: {bulk:.2f}s for {len(balances)} accounts, {node.requests - requests} requests, "
+          f"{-(-len(balances) // tx_group_limit)} groups")
+    rounds.watcher_for(node).stop()
+    node.close()
+
+
+if __name__ == "__main__":
+    benchmark()
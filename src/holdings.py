@@ -0,0 +1,186 @@
+# Per-account asset-holding cache.
+# Checking whether an account holds an asset used to download its whole account_info and walk its asset
+# list, which for a collector holding thousands of ASAs is a large payload per check. HoldingCache asks the
+# per-asset endpoint (/accounts/{address}/assets/{id}) instead, and builds a dict index from one
+# account_info when many assets of the same account are needed. Cached answers stay valid until we send an
+# asset transaction for the account: answers read before the round of that transaction are refetched.
+# Holdings moved by others (e.g. BorrowMyNFT inner transactions) are only seen with refresh=True.
+# opt_in_to_assets opts an account in to many assets with grouped transactions (src/groups.py).
+import threading
+
+from algosdk import error
+from algosdk.atomic_transaction_composer import TransactionSigner
+from algosdk.future import transaction
+from algosdk.v2client import algod
+
+from src import groups
+from src.params import SuggestedParamsProvider
+
+# Above this many assets of one account, one account_info is cheaper than per-asset lookups
+INDEX_THRESHOLD = 16
+
+
+class HoldingCache:
+    def __init__(self, client: algod.AlgodClient):
+        self.client = client
+        # (address, asset id) -> (round of the answer, holding or None if not opted in)
+        self._holdings: dict[tuple[str, int], tuple[int, dict | None]] = {}
+        # address -> (round of the answer, every holding of the account by asset id)
+        self._indexes: dict[str, tuple[int, dict[int, dict]]] = {}
+        # address -> round of the last asset transaction we sent for it
+        self._sent: dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.index_builds = 0
+        self.hits = 0
+
+    def sent(self, address: str, last_round: int):
+        """Records an asset transaction of the account confirmed (or sent) in last_round"""
+        with self._lock:
+            self._sent[address] = max(self._sent.get(address, 0), last_round)
+
+    def _fresh(self, address: str, answered_at: int) -> bool:
+        # caller holds self._lock
+        return answered_at >= self._sent.get(address, 0)
+
+    def holding(self, address: str, asset_id: int, refresh: bool = False) -> dict | None:
+        """Holding of the account for the asset, None if the account is not opted in"""
+        with self._lock:
+            if refresh:
+                self._holdings.pop((address, asset_id), None)
+                self._indexes.pop(address, None)
+            cached = self._holdings.get((address, asset_id))
+            if cached is not None and self._fresh(address, cached[0]):
+                self.hits += 1
+                return cached[1]
+            index = self._indexes.get(address)
+            if index is not None and self._fresh(address, index[0]):
+                self.hits += 1
+                return index[1].get(asset_id)
+        try:
+            self.lookups += 1
+            info = self.client.account_asset_info(address, asset_id)
+            answered_at, holding = info.get("round", 0), info["asset-holding"]
+        except error.AlgodHTTPError as err:
+            if getattr(err, "code", None) != 404:
+                # nodes without the per-asset endpoint: one full account_info for every later check
+                return self.holdings(address).get(asset_id)
+            holding = None
+        with self._lock:
+            if holding is None:
+                # not opted in as of our last asset transaction for the account
+                answered_at = self._sent.get(address, 0)
+            self._holdings[(address, asset_id)] = (answered_at, holding)
+        return holding
+
+    def holdings(self, address: str, refresh: bool = False) -> dict[int, dict]:
+        """Every holding of the account by asset id, from one account_info"""
+        with self._lock:
+            if refresh:
+                self._indexes.pop(address, None)
+            index = self._indexes.get(address)
+            if index is not None and self._fresh(address, index[0]):
+                self.hits += 1
+                return index[1]
+        self.index_builds += 1
+        info = self.client.account_info(address)
+        index = {holding["asset-id"]: holding for holding in info.get("assets", [])}
+        with self._lock:
+            self._indexes[address] = (info.get("round", 0), index)
+        return index
+
+    def missing(self, address: str, asset_ids: list[int]) -> list[int]:
+        """The assets the account is not opted in to"""
+        if len(asset_ids) > INDEX_THRESHOLD:
+            index = self.holdings(address)
+            return [asset_id for asset_id in asset_ids if asset_id not in index]
+        return [asset_id for asset_id in asset_ids if self.holding(address, asset_id) is None]
+
+
+_caches: dict[int, HoldingCache] = {}
+
+
+# The shared holding cache of an algod client (one per node/client, as for rounds.watcher_for)
+def cache_for(client: algod.AlgodClient) -> HoldingCache:
+    cache = _caches.get(id(client))
+    if cache is None or cache.client is not client:
+        cache = _caches[id(client)] = HoldingCache(client)
+    return cache
+
+
+def opt_in_to_assets(
+    client: algod.AlgodClient,
+    signer: TransactionSigner,
+    address: str,
+    asset_ids: list[int],
+    params: SuggestedParamsProvider = None,
+    cache: HoldingCache = None,
+) -> list[int]:
+    """Opts the account in to the assets it does not hold yet, 16 per group; returns those asset ids"""
+    cache = cache or cache_for(client)
+    missing = cache.missing(address, list(dict.fromkeys(asset_ids)))
+    if not missing:
+        return []
+    sp = (params or SuggestedParamsProvider(client)).get()
+    txns = [transaction.AssetTransferTxn(sender=address, sp=sp, receiver=address, amt=0, index=asset_id)
+            for asset_id in missing]
+    try:
+        confirmed = groups.send_and_confirm(client, groups.sign_in_groups(txns, signer))
+    except (error.AlgodHTTPError, error.ConfirmationTimeoutError):
+        # some groups may have been committed anyway
+        cache.sent(address, client.status()["last-round"] + 1)
+        raise
+    cache.sent(address, max(confirmed))
+    return missing
+
+
+# A collector account holding `held` NFTs checks `checks` of them and opts in to `new` more on the local
+# algod stand-in: full account_info scans against the holding cache and grouped opt-ins.
+def benchmark(held=2000, checks=200, new=64, latency=0.002):
+    import json
+    import time
+
+    from algosdk.atomic_transaction_composer import AccountTransactionSigner
+    from algosdk.constants import microalgos_to_algos_ratio as algo
+
+    from src.local_algod import LocalAlgod
+    from src.simulator import create_nft_txn
+
+    node = LocalAlgod(latency=latency)
+    ledger = node.ledger
+    _, creator = ledger.new_account(10 ** 4 * algo)
+    collector_key, collector = ledger.new_account(10 ** 4 * algo)
+    asset_ids = [ledger.submit([create_nft_txn(creator, f"NFT {i}", "G3", "")])[0].created_asset_id
+                 for i in range(held + new)]
+    for asset_id in asset_ids[:held]:
+        ledger.accounts[collector].assets[asset_id] = 0
+
+    def scan(asset_id):
+        # what opt_in_to_asset and print_asset_holding did: full account_info and a linear walk
+        info = node.account_info(collector)
+        return next((h for h in info["assets"] if h["asset-id"] == asset_id), None), len(json.dumps(info))
+
+    start = time.perf_counter()
+    payload = sum(scan(asset_id)[1] for asset_id in asset_ids[:checks])
+    scan_time = time.perf_counter() - start
+
+    cache = HoldingCache(node)
+    start = time.perf_counter()
+    found = [cache.holding(collector, asset_id) for asset_id in asset_ids[:checks]]
+    found += [cache.holding(collector, asset_id) for asset_id in asset_ids[:checks]]
+    cache_time = time.perf_counter() - start
+    assert all(found)
+    print(f"{checks} holding checks on an account with {held} assets: account_info scans {scan_time:.2f}s "
+          f"({payload / 1e6:.1f} MB of JSON); cache {cache_time / 2:.2f}s per pass, {cache.lookups} lookups, "
+          f"{cache.hits} hits")
+
+    start, first_round = time.perf_counter(), ledger.round
+    added = opt_in_to_assets(node, AccountTransactionSigner(collector_key), collector, asset_ids, cache=cache)
+    assert len(added) == new and cache.holding(collector, asset_ids[-1]) is not None
+    print(f"opt-in to {len(asset_ids)} assets ({new} new): {time.perf_counter() - start:.2f}s, "
+          f"{ledger.round - first_round} rounds, {cache.index_builds} account_info")
+    node.close()
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,315 @@
+# Streaming block ingestor: a local SQLite index of BorrowMyNFT loans, bids and repayments.
+# Blocks are read in order (msgpack block_info) and every application call whose first argument is a
+# BorrowMyNFT selector of contract.json is decoded: the global state delta of the call updates the
+# `loans` row of the app, the call itself goes to `events` (with the amount of its payment argument) and
+# its inner payments/asset transfers to `transfers`. Each block is written in one SQLite transaction
+# together with the checkpoint, so the ingestor resumes exactly where it stopped. Portfolio questions are
+# then answered locally, without one application_info per app.
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import msgpack
+from algosdk import encoding
+from algosdk.v2client import algod
+
+from src import rounds
+from src.light_client import CONTRACT_PATH, load_spec
+
+path = os.path.dirname(os.path.abspath(__file__))
+
+DB_PATH = os.path.join(path, "loans.sqlite")
+# Blocks fetched concurrently while catching up
+PREFETCH = 8
+# Same interest rate as BorrowMyNFT: debt_left * rounds / INTEREST_RATE_DEN per pay_back
+INTEREST_RATE_DEN = 1000000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoint (id INTEGER PRIMARY KEY CHECK (id = 1), round INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS loans (
+    app_id INTEGER PRIMARY KEY,
+    nft_id INTEGER NOT NULL DEFAULT 0,
+    borrower_address TEXT,
+    lender_address TEXT,
+    highest_bid INTEGER NOT NULL DEFAULT 0,
+    auction_base INTEGER NOT NULL DEFAULT 0,
+    auction_period INTEGER NOT NULL DEFAULT 0,
+    payback_deadline INTEGER NOT NULL DEFAULT 0,
+    last_interest_update_block INTEGER NOT NULL DEFAULT 0,
+    debt_left INTEGER NOT NULL DEFAULT 0,
+    state INTEGER NOT NULL DEFAULT 0,
+    deleted INTEGER NOT NULL DEFAULT 0,
+    updated_round INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS loans_state ON loans (state, highest_bid);
+CREATE INDEX IF NOT EXISTS loans_lender ON loans (lender_address, state);
+CREATE TABLE IF NOT EXISTS events (
+    round INTEGER NOT NULL,
+    intra INTEGER NOT NULL,
+    app_id INTEGER NOT NULL,
+    method TEXT NOT NULL,
+    sender TEXT NOT NULL,
+    amount INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (round, intra)
+);
+CREATE INDEX IF NOT EXISTS events_app ON events (app_id, method);
+CREATE TABLE IF NOT EXISTS transfers (
+    round INTEGER NOT NULL,
+    intra INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    app_id INTEGER NOT NULL,
+    receiver TEXT NOT NULL,
+    amount INTEGER NOT NULL,
+    asset_id INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (round, intra, seq)
+);
+CREATE VIEW IF NOT EXISTS bids AS
+    SELECT round, app_id, sender AS lender, amount FROM events WHERE method = 'place_bid';
+CREATE VIEW IF NOT EXISTS repayments AS
+    SELECT round, app_id, sender AS borrower, amount FROM events WHERE method = 'pay_back';
+"""
+
+UINT_KEYS = ("nft_id", "highest_bid", "auction_base", "auction_period", "payback_deadline",
+             "last_interest_update_block", "debt_left", "state")
+ADDRESS_KEYS = ("borrower_address", "lender_address")
+
+
+class BlockIngestor:
+    def __init__(self, client: algod.AlgodClient, db_path=DB_PATH, app_ids: set[int] = None,
+                 start_round: int = None, spec_path=CONTRACT_PATH, prefetch: int = PREFETCH):
+        """app_ids: apps to index; by default every app called with a BorrowMyNFT selector.
+        start_round: first block of a new index (default: the current round); ignored when resuming"""
+        self.client = client
+        self.db = sqlite3.connect(db_path, check_same_thread=False)
+        self.db.executescript(SCHEMA)
+        contract = load_spec(spec_path)["_contract"]
+        self.selectors = {m.get_selector(): m for m in contract.methods}
+        self.app_ids = set(app_ids) if app_ids is not None else None
+        self.prefetch = prefetch
+        self.executor = ThreadPoolExecutor(prefetch, thread_name_prefix="ingest")
+        self._stopped = False
+        if self.checkpoint() is None:
+            first = start_round if start_round is not None else client.status()["last-round"] + 1
+            with self.db:
+                self.db.execute("INSERT INTO checkpoint (id, round) VALUES (1, ?)", (first - 1,))
+        self.blocks = 0
+        self.calls = 0
+
+    def checkpoint(self) -> int | None:
+        """Last round fully ingested"""
+        row = self.db.execute("SELECT round FROM checkpoint WHERE id = 1").fetchone()
+        return row[0] if row else None
+
+    def close(self):
+        self.executor.shutdown()
+        self.db.close()
+
+    # ---- stream ----
+
+    def _fetch(self, number: int) -> dict:
+        raw = self.client.block_info(number, response_format="msgpack")
+        return msgpack.unpackb(raw, raw=True, strict_map_key=False)[b"block"]
+
+    def catch_up(self, last_round: int = None) -> int:
+        """Ingests every committed block after the checkpoint; returns the number of blocks ingested"""
+        if last_round is None:
+            last_round = self.client.status()["last-round"]
+        ingested = 0
+        next_round = self.checkpoint() + 1
+        while next_round <= last_round and not self._stopped:
+            batch = range(next_round, min(last_round, next_round + self.prefetch - 1) + 1)
+            for block in self.executor.map(self._fetch, batch):
+                self.ingest_block(block)
+                ingested += 1
+            next_round = batch[-1] + 1
+        return ingested
+
+    def follow(self, until_round: int = None):
+        """Ingests blocks as they are committed (until `until_round`, or until stop())"""
+        watcher = rounds.watcher_for(self.client)
+        while not self._stopped:
+            last_round = watcher.wait_for(self.checkpoint() + 1)
+            if until_round is not None:
+                last_round = min(last_round, until_round)
+            self.catch_up(last_round)
+            if until_round is not None and self.checkpoint() >= until_round:
+                return
+
+    def stop(self):
+        self._stopped = True
+
+    # ---- decoding ----
+
+    def ingest_block(self, block: dict):
+        number = block[b"rnd"]
+        txns = block.get(b"txns", [])
+        with self.db:
+            for intra, stib in enumerate(txns):
+                txn = stib[b"txn"]
+                if txn.get(b"type") != b"appl":
+                    continue
+                args = txn.get(b"apaa", [])
+                method = self.selectors.get(args[0]) if args else None
+                app_id = txn.get(b"apid", 0) or stib.get(b"apid", 0)
+                if not self._tracked(app_id, method):
+                    continue
+                self.calls += 1
+                name = method.name if method is not None else ("create" if not txn.get(b"apid") else "delete"
+                                                                if txn.get(b"apan") == 5 else "call")
+                self._record_call(number, intra, app_id, name, txn, self._payment_amount(txns, intra, method))
+                data = stib.get(b"dt", {})
+                self._apply_delta(app_id, number, data.get(b"gd", {}), deleted=name == "delete")
+                for seq, inner in enumerate(data.get(b"itx", [])):
+                    self._record_transfer(number, intra, seq, app_id, inner[b"txn"])
+            self.db.execute("UPDATE checkpoint SET round = ? WHERE id = 1", (number,))
+        self.blocks += 1
+
+    def _tracked(self, app_id: int, method) -> bool:
+        if self.app_ids is not None:
+            return app_id in self.app_ids
+        if method is not None:
+            return True
+        # creation and deletion calls carry no selector: index them for apps already known
+        return self.db.execute("SELECT 1 FROM loans WHERE app_id = ?", (app_id,)).fetchone() is not None
+
+    @staticmethod
+    def _payment_amount(txns: list, intra: int, method) -> int:
+        """Amount of the payment transaction argument of an ABI call (the transactions right before it)"""
+        if method is None:
+            return 0
+        txn_args = [arg for arg in method.args if arg.type in ("txn", "pay")]
+        if not txn_args:
+            return 0
+        # list_nft: only the payment precedes the call (the NFT transfer follows it)
+        previous = txns[intra - len(txn_args):intra]
+        return sum(stib[b"txn"].get(b"amt", 0) for stib in previous if stib[b"txn"].get(b"type") == b"pay")
+
+    def _record_call(self, number, intra, app_id, name, txn, amount):
+        self.db.execute(
+            "INSERT OR REPLACE INTO events (round, intra, app_id, method, sender, amount) VALUES (?, ?, ?, ?, ?, ?)",
+            (number, intra, app_id, name, encoding.encode_address(txn[b"snd"]), amount),
+        )
+
+    def _record_transfer(self, number, intra, seq, app_id, inner):
+        if inner.get(b"type") == b"pay":
+            receiver, amount, asset_id = inner.get(b"rcv"), inner.get(b"amt", 0), 0
+        elif inner.get(b"type") == b"axfer":
+            receiver = inner.get(b"aclose") or inner.get(b"arcv")
+            amount, asset_id = inner.get(b"aamt", 0), inner.get(b"xaid", 0)
+        else:
+            return
+        self.db.execute(
+            "INSERT OR REPLACE INTO transfers (round, intra, seq, app_id, receiver, amount, asset_id) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (number, intra, seq, app_id, encoding.encode_address(receiver) if receiver else "", amount, asset_id),
+        )
+
+    def _apply_delta(self, app_id: int, number: int, delta: dict, deleted=False):
+        self.db.execute("INSERT OR IGNORE INTO loans (app_id) VALUES (?)", (app_id,))
+        columns, values = ["updated_round = ?", "deleted = ?"], [number, int(deleted)]
+        for raw_key, change in delta.items():
+            key = raw_key.decode(errors="replace")
+            if key in UINT_KEYS:
+                value = change.get(b"ui", 0) if change.get(b"at") != 3 else 0
+            elif key in ADDRESS_KEYS:
+                value = change.get(b"bs") if change.get(b"at") != 3 else None
+                value = encoding.encode_address(value) if value and len(value) == 32 else None
+            else:
+                continue
+            columns.append(f"{key} = ?")
+            values.append(value)
+        self.db.execute(f"UPDATE loans SET {', '.join(columns)} WHERE app_id = ?", values + [app_id])
+
+    # ---- portfolio queries ----
+
+    def in_auction_above(self, min_bid: int = 0) -> list[tuple]:
+        """(app_id, nft_id, highest_bid, auction_period) of the apps in auction with a bid above min_bid"""
+        return self.db.execute(
+            "SELECT app_id, nft_id, highest_bid, auction_period FROM loans "
+            "WHERE state = 1 AND deleted = 0 AND highest_bid > ? ORDER BY highest_bid DESC", (min_bid,),
+        ).fetchall()
+
+    def outstanding_debt(self, lender: str = None, current_round: int = None) -> int:
+        """Total debt of the active loans (of one lender), with the interest accrued up to current_round"""
+        current_round = current_round if current_round is not None else self.checkpoint()
+        query = ("SELECT COALESCE(SUM(debt_left + debt_left * MAX(? - last_interest_update_block, 0) / ?), 0) "
+                 "FROM loans WHERE state = 2 AND deleted = 0")
+        params = [current_round, INTEREST_RATE_DEN]
+        if lender is not None:
+            query += " AND lender_address = ?"
+            params.append(lender)
+        return self.db.execute(query, params).fetchone()[0]
+
+    def history(self, app_id: int) -> list[tuple]:
+        return self.db.execute(
+            "SELECT round, method, sender, amount FROM events WHERE app_id = ? ORDER BY round, intra", (app_id,),
+        ).fetchall()
+
+
+# Ingests the blocks of `loans` loan cycles run through the local algod stand-in, then compares the
+# portfolio queries on the index with one application_info call per app.
+def benchmark(loans=50, db_path=":memory:"):
+    import random
+
+    from algosdk.constants import microalgos_to_algos_ratio as algo
+
+    from src.local_algod import LocalAlgod
+    from src.simulator import SimulatedApp, asset_transfer_txn, create_nft_txn, payment_txn
+
+    node = LocalAlgod(latency=0.002)
+    ingestor = BlockIngestor(node, db_path, start_round=node.ledger.round + 1)
+    ledger = node.ledger
+    _, owner = ledger.new_account(10000 * algo)
+    _, borrower = ledger.new_account(10000 * algo)
+    _, lender = ledger.new_account(10000 * algo)
+    app_ids = []
+    for i in range(loans):
+        sim = SimulatedApp(ledger)
+        sim.app_id = node.submit([sim.build_create(owner)])[0].created_app_id
+        node.submit([payment_txn(owner, sim.app_addr, algo // 10)])
+        asset_id = node.submit([create_nft_txn(borrower, f"NFT {i}", "G3", "")])[0].created_asset_id
+        node.submit(sim.build_call("list_nft", borrower, fee=2000, nft=asset_id,
+                                   payment=payment_txn(borrower, sim.app_addr, algo // 10),
+                                   auction_base=1000, auction_period=1000, payback_deadline=1000)
+                    + [asset_transfer_txn(borrower, sim.app_addr, asset_id, 1)])
+        for bid in range(random.randint(0, 3)):
+            accounts = [lender] if bid else []
+            node.submit(sim.build_call("place_bid", lender, fee=3000, accounts=accounts,
+                                       payment=payment_txn(lender, sim.app_addr, 2000 * (bid + 1))))
+            if bid and i % 2:
+                node.submit(sim.build_call("accept_bid", borrower, fee=2000))
+                node.submit(sim.build_call("pay_back", borrower, fee=5000, accounts=[lender],
+                                           payment=payment_txn(borrower, sim.app_addr, 1000)))
+                break
+        app_ids.append(sim.app_id)
+
+    start = time.perf_counter()
+    ingested = ingestor.catch_up()
+    elapsed = time.perf_counter() - start
+    print(f"ingested {ingested} blocks ({ingestor.calls} BorrowMyNFT calls) in {elapsed:.2f}s, "
+          f"checkpoint {ingestor.checkpoint()}")
+
+    start = time.perf_counter()
+    auctions = ingestor.in_auction_above(2000)
+    debt = ingestor.outstanding_debt(lender, ledger.round)
+    local = time.perf_counter() - start
+    print(f"index: {len(auctions)} apps in auction above 2000, outstanding debt {debt} in {local * 1000:.2f} ms")
+
+    start = time.perf_counter()
+    states = [node.application_info(app_id)["params"]["global-state"] for app_id in app_ids]
+    remote = time.perf_counter() - start
+    print(f"application_info per app: {len(states)} requests in {remote * 1000:.0f} ms")
+
+    # the index matches the chain
+    for app_id in app_ids:
+        chain = ledger.global_state(app_id)
+        row = ingestor.db.execute("SELECT state, highest_bid, debt_left FROM loans WHERE app_id = ?",
+                                  (app_id,)).fetchone()
+        assert row == (chain[b"state"], chain[b"highest_bid"], chain[b"debt_left"]), (app_id, row)
+    ingestor.close()
+    node.close()
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -1,15 +1,18 @@
 from ast import Global
 import json
-from time import sleep
 
 from algosdk.future import transaction
-from algosdk.atomic_transaction_composer import TransactionWithSigner
+from algosdk.atomic_transaction_composer import AtomicTransactionComposer, TransactionWithSigner
 from beaker import consts, sandbox
-from beaker.client import ApplicationClient, LogicException
+from beaker.client import LogicException
 
-from src.contract import BorrowMyNFT
+from src.bidding import Bidder, BidRejected, EscalationPolicy
+from src.compile_cache import cached_application_client
+from src.light_client import LightClient, MULTI_APPROVAL_PATH, MULTI_CLEAR_PATH, MULTI_CONTRACT_PATH
+from src.loan_record import BOX_MIN_BALANCE, loan_box, read_loans
+from src.params import SuggestedParamsProvider
 from src.utils import nft_metadata_github_url
-from src import utils
+from src import app_state, utils
 
 # CONSTANTS
 # NB. If you use sandbox use lower DURATIONs values (e.g. 2) else 5-10 is good for testnet
@@ -29,15 +32,19 @@ lender_account = accounts.pop()
 
 print("Addresses", contract_owner_account.address, borrower_account.address, lender_account.address)
 
-# Create instance of the BorrowMyNFT contract
-app = BorrowMyNFT()
-
-# Create an Application client for event creator containing both an algod client and the app
-app_client = ApplicationClient(
+# Create an Application client for event creator containing both an algod client and the app.
+# TEAL, ABI spec and bytecode of BorrowMyNFT come from the compile cache
+app_client = cached_application_client(
     client,
-    app,
     signer=contract_owner_account.signer
 )
+app = app_client.app
+
+# Suggested params shared by every helper, refreshed about once per round
+params = SuggestedParamsProvider(client)
+
+# Sandbox dev mode produces blocks only when transactions arrive: round waiters nudge it
+dev_block_nudge = (lambda: utils.nudge_dev_block(client, contract_owner_account)) if SANDBOX else None
 
 receipts=[]
 def demo():
@@ -96,7 +103,7 @@ def demo():
     # Read state from borrower account
     read_global_state(app_client_lender, "lender")
 
-    utils.wait_for_round(client, ending_auction_round)
+    utils.wait_for_round(client, ending_auction_round, nudge=dev_block_nudge)
 
     # Borrower accept the offer
     accept_offer(app_client_borrower)
@@ -121,14 +128,8 @@ def demo():
 
     print(">>> SCENARIO 2: Lender calls timeout as borrower is not accepting any offer <<<\n")
 
-    #  Providing nft info and payment to allow contract opt in
-    allow_contract_to_opt_in(app_addr, app_client_borrower, asset_id)
-
-    # Read state from owner account
-    read_global_state(app_client)
-
-    # Set offer
-    ending_auction_round = set_new_offer(
+    # Contract opt in and offer in a single group
+    ending_auction_round = list_nft(
         app_addr=app_addr,
         app_client_to_use=app_client_borrower,
         asset_id=asset_id,
@@ -144,11 +145,7 @@ def demo():
 
     # Read state from lender account
     read_global_state(app_client_lender, "lender")
-    while (client.status().get('last-round') < ending_auction_round+2):
-        app_client.fund(100 * consts.milli_algo)
-        print("Waiting for round ", ending_auction_round+2)
-        sleep(30)
-        print("Current round ", client.status().get('last-round'))
+    utils.wait_for_round(client, ending_auction_round + 2, nudge=dev_block_nudge)
 
     # Read state from lender account
     read_global_state(app_client_lender, "lender")
@@ -168,14 +165,9 @@ def demo():
     utils.print_asset_holding(client, app_addr)
 
     print(">>> SCENARIO 3: Borrower cancel offer before auction finishes <<<\n")
-    #  Providing nft info and payment to allow contract opt in
-    allow_contract_to_opt_in(app_addr, app_client_borrower, asset_id)
-
-    # Read state from owner account
-    read_global_state(app_client)
 
-    # Set offer
-    ending_auction_round = set_new_offer(
+    # Contract opt in and offer in a single group
+    ending_auction_round = list_nft(
         app_addr=app_addr,
         app_client_to_use=app_client_borrower,
         asset_id=asset_id,
@@ -202,14 +194,8 @@ def demo():
 
     print(">>> SCENARIO 4: Lender claim NFT after incomplete payback <<<\n")
 
-    #  Providing nft info and payment to allow contract opt in
-    allow_contract_to_opt_in(app_addr, app_client_borrower, asset_id)
-
-    # Read state from owner account
-    read_global_state(app_client)
-
-    # Set offer
-    ending_auction_round = set_new_offer(
+    # Contract opt in and offer in a single group
+    ending_auction_round = list_nft(
         app_addr=app_addr,
         app_client_to_use=app_client_borrower,
         asset_id=asset_id,
@@ -226,7 +212,7 @@ def demo():
     # Read state from borrower account
     read_global_state(app_client_lender, "lender")
 
-    utils.wait_for_round(client, ending_auction_round)
+    utils.wait_for_round(client, ending_auction_round, nudge=dev_block_nudge)
 
     # Borrower accept the offer
     accept_offer(app_client_borrower)
@@ -244,7 +230,7 @@ def demo():
     # Wait for loan period to end
     current_round = client.status().get('last-round')
     print(f"Current round: {current_round}")
-    utils.wait_for_round(client, current_round + LOAN_DURATION + 1)  # +1 to be sure
+    utils.wait_for_round(client, current_round + LOAN_DURATION + 1, nudge=dev_block_nudge)  # +1 to be sure
 
     # Lender claim the NFT after loan period expired
     claim_nft_after_loan_expiration(app_client_lender, asset_id)
@@ -278,9 +264,7 @@ def demo():
     print("Deleting contract")
     try:
         # need double fee from owner to get back money
-        sp = client.suggested_params()
-        sp.flat_fee = True
-        sp.fee = 2000
+        sp = params.for_method("delete")
         app_client.delete(
             suggested_params=sp,
         )
@@ -292,11 +276,10 @@ def demo():
 
 def pay_me(app_client_to_use, app_addr):
     print("> Paying contract creator")
-    sp = client.suggested_params()
-    sp.flat_fee = True
-    sp.fee = 2000
+    sp = params.for_method("pay_me")
     # need passing asset id as foreign, contract search referenced id (saved in state) in that array
-    receipt=app_client_to_use.call(
+    receipt=call(
+        app_client_to_use,
         app.pay_me,
         suggested_params=sp,
     )
@@ -305,11 +288,10 @@ def pay_me(app_client_to_use, app_addr):
 
 def cancel_offer(app_client_to_use, asset_id):
     print("> Cancelling offer")
-    sp = client.suggested_params()
-    sp.flat_fee = True
-    sp.fee = 3000
+    sp = params.for_method("cancel_offer")
     # need passing asset id as foreign, contract search referenced id (saved in state) in that array
-    receipt = app_client_to_use.call(
+    receipt = call(
+        app_client_to_use,
         app.cancel_offer,
         suggested_params=sp,
         foreign_assets=[asset_id],
@@ -318,11 +300,10 @@ def cancel_offer(app_client_to_use, asset_id):
 
 def timeout(app_client_to_use, asset_id, foreign_addr):
     print("> Cancelling offer (timeout)")
-    sp = client.suggested_params()
-    sp.flat_fee = True
-    sp.fee = 3000
+    sp = params.for_method("timeout")
     # need passing asset id as foreign, contract search referenced id (saved in state) in that array
-    receipt=app_client_to_use.call(
+    receipt=call(
+        app_client_to_use,
         app.timeout,
         suggested_params=sp,
         foreign_assets=[asset_id],
@@ -337,10 +318,9 @@ def claim_nft_after_loan_expiration(app_client_to_use, asset_id):
     print("\tLender opting in to NFT to receive it")
     utils.opt_in_to_asset(client, lender_account, asset_id)
     print("\tLender opted in to NFT")
-    sp = client.suggested_params()
-    sp.flat_fee = True
-    sp.fee = 2000
-    receipt=app_client_to_use.call(
+    sp = params.for_method("loan_expired")
+    receipt=call(
+        app_client_to_use,
         app.loan_expired,
         suggested_params=sp,
         foreign_assets=[asset_id],
@@ -352,20 +332,19 @@ def claim_nft_after_loan_expiration(app_client_to_use, asset_id):
 
 def pay_back(app_client_to_use, app_addr, amount_to_payback, asset_id):
     print(f"> NFT borrower paybacks {amount_to_payback} of the loan")
-    sp = client.suggested_params()
-    sp.flat_fee = True
-    sp.fee = 5000
+    sp = params.for_method("pay_back")
     payment_txn = TransactionWithSigner(
         txn=transaction.PaymentTxn(
             sender=borrower_account.address,
-            sp=sp,
+            sp=params.get(),
             receiver=app_addr,
             amt=amount_to_payback * consts.milli_algo,
             note=b'To payback the money lender',
         ),
         signer=borrower_account.signer,
     )
-    receipt=app_client_to_use.call(
+    receipt=call(
+        app_client_to_use,
         app.pay_back,
         suggested_params=sp,
         payment=payment_txn,
@@ -376,10 +355,9 @@ def pay_back(app_client_to_use, app_addr, amount_to_payback, asset_id):
 
 def accept_offer(app_client_to_use):
     print("> Borrower accepting the offer")
-    sp = client.suggested_params()
-    sp.flat_fee = True
-    sp.fee = 2000
-    receipt=app_client_to_use.call(
+    sp = params.for_method("accept_bid")
+    receipt=call(
+        app_client_to_use,
         app.accept_bid,
         suggested_params=sp,
     )
@@ -387,33 +365,25 @@ def accept_offer(app_client_to_use):
     receipts.append("accept_offer: "+receipt.tx_id)
 
 
-def place_bid(app_addr, app_client_to_use, bid_amount):
+def place_bid(app_addr, app_client_to_use, bid_amount, max_bid_amount=None):
     print("> Lender placing a bid")
-    sp = client.suggested_params()
-    sp.flat_fee = True
-    sp.fee = 3000
-    payment_txn = TransactionWithSigner(
-        txn=transaction.PaymentTxn(
-            sender=lender_account.address,
-            sp=sp,
-            receiver=app_addr,
-            amt=bid_amount * consts.milli_algo,
-            note=b'Lender bidding 200 milliAlgos'
-        ),
-        signer=lender_account.signer,
-    )
-    receipt=app_client_to_use.call(
-        app.place_bid,
-        suggested_params=sp,
-        payment=payment_txn,
-    )
-    print("Bid placed")
-    receipts.append("place_bid: "+receipt.tx_id)
+    # the Bidder checks the bid against the current auction state first and, if another lender got a
+    # higher bid in first, retries once above it, up to max_bid_amount (default: the bid itself)
+    bidder = Bidder(client, app_client_to_use.app_id, lender_account.signer, params=params,
+                    policy=EscalationPolicy(max_attempts=2))
+    max_bid_amount = bid_amount if max_bid_amount is None else max_bid_amount
+    try:
+        placed = bidder.bid(bid_amount * consts.milli_algo, max_bid=max_bid_amount * consts.milli_algo)
+    except BidRejected as err:
+        print(f"Bid not placed: {err}")
+        raise
+    print(f"Bid of {placed.amount} microAlgos placed")
+    receipts.append("place_bid: "+placed.result.tx_id)
 
 
 def set_new_offer(app_addr, app_client_to_use, asset_id, auction_base, auction_duration):
     print("> Borrower setting offer")
-    sp = client.suggested_params()
+    sp = params.get()
     asset_xfer_txn = TransactionWithSigner(
         txn=transaction.AssetTransferTxn(
             sender=borrower_account.address,
@@ -427,7 +397,8 @@ def set_new_offer(app_addr, app_client_to_use, asset_id, auction_base, auction_d
     current_round = client.status().get('last-round')
     print(f"Current round: {current_round}")
     ending_auction_round = current_round + auction_duration  # about ten minutes
-    receipt=app_client_to_use.call(
+    receipt=call(
+        app_client_to_use,
         app.set_offer,
         suggested_params=sp,
         asset_xfer=asset_xfer_txn,
@@ -441,29 +412,86 @@ def set_new_offer(app_addr, app_client_to_use, asset_id, auction_base, auction_d
     return ending_auction_round
 
 
+# One atomic group [min balance payment, list_nft call, NFT transfer]: the contract opts in to the NFT and the
+# offer is set in the same round, instead of allow_contract_to_opt_in followed by set_new_offer
+def list_nft(app_addr, app_client_to_use, asset_id, auction_base, auction_duration):
+    print("> Borrower listing the NFT (contract opt in and offer in one group)")
+    payment_txn = TransactionWithSigner(
+        txn=transaction.PaymentTxn(
+            sender=borrower_account.address,
+            sp=params.get(),
+            receiver=app_addr,
+            amt=100 * consts.milli_algo,
+            note=b'To allow contrat opt in'
+        ),
+        signer=borrower_account.signer,
+    )
+    asset_xfer_txn = TransactionWithSigner(
+        txn=transaction.AssetTransferTxn(
+            sender=borrower_account.address,
+            receiver=app_addr,
+            sp=params.get(),
+            index=asset_id,
+            amt=1,
+        ),
+        signer=borrower_account.signer,
+    )
+    atc = AtomicTransactionComposer()
+    # Double fee to cover the inner opt-in transaction fee
+    app_client_to_use.add_method_call(
+        atc,
+        app.list_nft,
+        suggested_params=params.for_method("list_nft"),
+        payment=payment_txn,
+        nft=asset_id,
+        auction_base=auction_base,  # milliAlgos, 0.1 Algo
+        auction_period=auction_duration,  # n. of blocks
+        payback_deadline=LOAN_DURATION,  # n. of blocks after accepting the offer
+    )
+    # the NFT transfer must follow the call, once the contract has opted in
+    atc.add_transaction(asset_xfer_txn)
+    result = atc.execute(client, 4)
+    app_state.sent(client, app_client_to_use.app_id, result.confirmed_round)
+    ending_auction_round = result.confirmed_round + auction_duration
+    print(f"NFT listed in round {result.confirmed_round}")
+    receipts.append("list_nft: "+result.tx_ids[1])
+    return ending_auction_round
+
+
+# App call through beaker's client; the app's next state read goes to algod
+def call(app_client_to_use, method, **kwargs):
+    try:
+        result = app_client_to_use.call(method, **kwargs)
+    except Exception:
+        app_state.sent(client, app_client_to_use.app_id)
+        raise
+    app_state.sent(client, app_client_to_use.app_id, result.tx_info.get("confirmed-round"))
+    return result
+
+
 def read_global_state(app_client_to_use, role="owner"):
+    # served by the round-versioned state cache: algod is read again only once a new block is committed
     print(f"> Getting whole state from {role} account")
-    state = app_client_to_use.get_application_state()
-    print(f"State: {json.dumps(state, indent=4)}")
+    state = app_state.cache_for(client).get(app_client_to_use.app_id)
+    print(f"State (round {state.round}): {json.dumps(state.as_dict(), indent=4)}")
 
 
 def allow_contract_to_opt_in(app_addr, app_client_to_use, asset_id):
     print("> Send NFT info and MIN_BALANCE payment to contract")
-    sp = client.suggested_params()
     payment_txn = TransactionWithSigner(
         txn=transaction.PaymentTxn(
             sender=borrower_account.address,
-            sp=sp,
+            sp=params.get(),
             receiver=app_addr,
             amt=100 * consts.milli_algo,
             note=b'To allow contrat opt in'
         ),
         signer=borrower_account.signer,
     )
-    # Double fee to cover inner transaction fee
-    sp.flat_fee = True
-    sp.fee = 3000
-    receipt=app_client_to_use.call(
+    # Triple fee to cover the inner opt-in transaction fee
+    sp = params.for_method("provide_access_to_nft")
+    receipt=call(
+        app_client_to_use,
         app.provide_access_to_nft,
         suggested_params=sp,
         nft=asset_id,
@@ -472,5 +500,128 @@ def allow_contract_to_opt_in(app_addr, app_client_to_use, asset_id):
     print("Provided access to NFT")
     receipts.append("provide_access_to_nft: "+receipt.tx_id)
 
+# BorrowMyNFTs (src/multi_contract.py): several NFTs in auction and on loan at the same time, one loan box
+# per NFT. Every call references the box of its NFT (boxes=) and listing pays the box minimum balance.
+def demo_multi(n_loans=3):
+    print("### MULTI-LOAN SCENARIOS ###\n")
+
+    print(">>> SCENARIO 0: App setup <<<\n")
+    multi_client = LightClient(client, signer=contract_owner_account.signer, spec_path=MULTI_CONTRACT_PATH)
+    app_id, app_addr, txid = multi_client.create(approval_path=MULTI_APPROVAL_PATH, clear_path=MULTI_CLEAR_PATH)
+    print(f"App created in txid: {txid} with:\n\tapp_id: {app_id}\n\tapp_addr: {app_addr}\n")
+    multi_client.fund(100 * consts.milli_algo)
+    multi_client_borrower = multi_client.prepare(signer=borrower_account.signer)
+    multi_client_lender = multi_client.prepare(signer=lender_account.signer)
+
+    print(f">>> SCENARIO 1: {n_loans} NFTs listed and funded at the same time <<<\n")
+    asset_ids = [
+        utils.create_default_nft(client, borrower_account.private_key, borrower_account.address,
+                                 f"G3 NFT {i}@arc3", "G3", nft_metadata_github_url)
+        for i in range(n_loans)
+    ]
+    # the auctions stay open while the other NFTs are listed and bid on (one round per group in dev mode)
+    auction_duration = AUCTION_DURATION + 2 * n_loans
+    ending_auction_round = max(
+        list_nft_multi(app_addr, multi_client_borrower, asset_id, auction_base=100, auction_duration=auction_duration)
+        for asset_id in asset_ids
+    )
+    for asset_id in asset_ids:
+        place_bid_multi(app_addr, multi_client_lender, asset_id, bid_amount=200)
+    print(f"Loans: {json.dumps(read_loans(client, app_id), indent=4)}")
+    utils.wait_for_round(client, ending_auction_round, nudge=dev_block_nudge)
+    for asset_id in asset_ids:
+        print(f"> Borrower accepting the offer on {asset_id}")
+        multi_client_borrower.call("accept_bid", suggested_params=params.for_method("accept_bid"),
+                                   nft=asset_id, boxes=loan_box(asset_id))
+
+    print(">>> SCENARIO 2: Borrower pays every loan back <<<\n")
+    for asset_id in asset_ids:
+        pay_back_multi(app_addr, multi_client_borrower, asset_id, amount_to_payback=250)
+    print(f"Loans left: {len(read_loans(client, app_id))}")
+
+    print(">>> SCENARIO 3: Owner collects the fees and deletes the app <<<\n")
+    multi_client.call("pay_me", suggested_params=params.for_method("pay_me"))
+    multi_client.delete(suggested_params=params.for_method("delete"))
+    print("### END ###\n")
+
+
+# One atomic group [min balance payment, list_nft call, NFT transfer]: the payment covers the contract NFT
+# holding and the loan box
+def list_nft_multi(app_addr, multi_client_to_use, asset_id, auction_base, auction_duration):
+    print(f"> Borrower listing NFT {asset_id}")
+    payment_txn = TransactionWithSigner(
+        txn=transaction.PaymentTxn(
+            sender=borrower_account.address,
+            sp=params.get(),
+            receiver=app_addr,
+            amt=100 * consts.milli_algo + BOX_MIN_BALANCE,
+            note=b'To allow contract opt in and the loan box'
+        ),
+        signer=borrower_account.signer,
+    )
+    asset_xfer_txn = TransactionWithSigner(
+        txn=transaction.AssetTransferTxn(
+            sender=borrower_account.address,
+            receiver=app_addr,
+            sp=params.get(),
+            index=asset_id,
+            amt=1,
+        ),
+        signer=borrower_account.signer,
+    )
+    atc = AtomicTransactionComposer()
+    multi_client_to_use.add_method_call(
+        atc,
+        "list_nft",
+        suggested_params=params.for_method("list_nft"),
+        boxes=loan_box(asset_id),
+        payment=payment_txn,
+        nft=asset_id,
+        auction_base=auction_base,  # milliAlgos, 0.1 Algo
+        auction_period=auction_duration,  # n. of blocks
+        payback_deadline=LOAN_DURATION,  # n. of blocks after accepting the offer
+    )
+    atc.add_transaction(asset_xfer_txn)
+    result = atc.execute(client, 4)
+    app_state.sent(client, multi_client_to_use.app_id, result.confirmed_round)
+    receipts.append("list_nft: "+result.tx_ids[1])
+    return result.confirmed_round + auction_duration
+
+
+def place_bid_multi(app_addr, multi_client_to_use, asset_id, bid_amount):
+    print(f"> Lender placing a bid on {asset_id}")
+    payment_txn = TransactionWithSigner(
+        txn=transaction.PaymentTxn(
+            sender=lender_account.address,
+            sp=params.get(),
+            receiver=app_addr,
+            amt=bid_amount * consts.milli_algo,
+        ),
+        signer=lender_account.signer,
+    )
+    result = multi_client_to_use.call("place_bid", suggested_params=params.for_method("place_bid"),
+                                      boxes=loan_box(asset_id), nft=asset_id, payment=payment_txn)
+    receipts.append("place_bid: "+result.tx_id)
+
+
+def pay_back_multi(app_addr, multi_client_to_use, asset_id, amount_to_payback):
+    print(f"> NFT borrower paybacks {amount_to_payback} of the loan on {asset_id}")
+    payment_txn = TransactionWithSigner(
+        txn=transaction.PaymentTxn(
+            sender=borrower_account.address,
+            sp=params.get(),
+            receiver=app_addr,
+            amt=amount_to_payback * consts.milli_algo,
+        ),
+        signer=borrower_account.signer,
+    )
+    result = multi_client_to_use.call("pay_back", suggested_params=params.for_method("pay_back"),
+                                      boxes=loan_box(asset_id), accounts=[lender_account.address],
+                                      nft=asset_id, payment=payment_txn)
+    receipts.append("pay_back: "+result.tx_id)
+
+
 if __name__ == "__main__":
-    demo()
\ No newline at end of file
+    import sys
+
+    demo_multi() if "--multi" in sys.argv else demo()
\ No newline at end of file
@@ -0,0 +1,274 @@
+# Deadline keeper: fires timeout and loan_expired when their round arrives.
+# Every tracked BorrowMyNFT app sits in one min-heap keyed by the round at which its next action becomes
+# valid (timeout: auction_period + 1, loan_expired: payback_deadline). The keeper thread sleeps on the
+# shared round watcher (src/rounds.py) until the earliest deadline, so tracking tens of thousands of loans
+# costs one status stream plus one state read per due app, instead of polling every app each round.
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from algosdk import encoding, error
+from algosdk.atomic_transaction_composer import TransactionSigner
+from algosdk.v2client import algod
+
+from src import app_state, holdings, rounds
+from src.light_client import CONTRACT_PATH, LightClient
+from src.params import SuggestedParamsProvider
+
+AUCTION_STATE = 1
+LOAN_STATE = 2
+# Calls fired concurrently
+MAX_WORKERS = 16
+# Failed calls are retried MAX_RETRIES times, 1, 2, 4, ... rounds after the previous attempt
+MAX_RETRIES = 3
+
+
+class DeadlineKeeper:
+    def __init__(
+        self,
+        client: algod.AlgodClient,
+        signer: TransactionSigner,
+        sender: str = None,
+        params: SuggestedParamsProvider = None,
+        max_workers: int = MAX_WORKERS,
+        spec_path=CONTRACT_PATH,
+    ):
+        self.client = client
+        self.light = LightClient(client, 0, signer, sender, spec_path=spec_path)
+        self.sender = self.light.sender
+        self.params = params or SuggestedParamsProvider(client)
+        self.watcher = rounds.watcher_for(client)
+        self.states = app_state.cache_for(client)
+        self.executor = ThreadPoolExecutor(max_workers, thread_name_prefix="keeper")
+        # (due round, seq, app id, action); entries replaced in _scheduled are skipped when popped
+        self._heap: list[tuple[int, int, int, str]] = []
+        self._scheduled: dict[int, tuple[int, int, int, str]] = {}
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._armed: int | None = None
+        self._stopped = False
+        self._thread: threading.Thread | None = None
+        self.fired: list[dict] = []
+        self.state_reads = 0
+        self.failures = 0
+        # failed attempts per app (reset when a call goes through), apps given up after MAX_RETRIES
+        self._retries: dict[int, int] = {}
+        self.given_up: list[int] = []
+
+    # ---- schedule ----
+
+    def next_action(self, state: dict[bytes, int | bytes]) -> tuple[int, str] | None:
+        """(last committed round after which the call is valid, method) of an app state, None if nothing to do"""
+        if state.get(b"state") == AUCTION_STATE:
+            # timeout asserts Global.round() > auction_period
+            return state[b"auction_period"], "timeout"
+        if state.get(b"state") == LOAN_STATE and state.get(b"lender_address") == encoding.decode_address(self.sender):
+            # loan_expired asserts Global.round() >= payback_deadline and can only be sent by the lender
+            return state[b"payback_deadline"] - 1, "loan_expired"
+        return None
+
+    def read_state(self, app_id: int) -> dict[bytes, int | bytes]:
+        snapshot, hit = self.states.lookup(app_id)
+        if not hit:
+            self.state_reads += 1
+        return snapshot.raw
+
+    def track(self, app_id: int, state: dict[bytes, int | bytes] = None):
+        """Schedules the next action of an app; the state is read from algod unless given"""
+        if state is None:
+            state = self.read_state(app_id)
+        action = self.next_action(state)
+        if action is None:
+            self.untrack(app_id)
+        else:
+            self._schedule(app_id, *action)
+
+    def _schedule(self, app_id: int, due_round: int, action: str):
+        with self._cond:
+            entry = (due_round, next(self._seq), app_id, action)
+            self._scheduled[app_id] = entry
+            heapq.heappush(self._heap, entry)
+            if self._armed is None or entry[0] < self._armed:
+                self._cond.notify()
+
+    def track_many(self, app_ids: list[int]):
+        list(self.executor.map(self.track, app_ids))
+
+    def untrack(self, app_id: int):
+        with self._cond:
+            self._scheduled.pop(app_id, None)
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._scheduled)
+
+    # ---- loop ----
+
+    def start(self) -> "DeadlineKeeper":
+        if self._thread is None or not self._thread.is_alive():
+            self._stopped = False
+            self._thread = threading.Thread(target=self.run, name="deadline-keeper", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+
+    def _wake(self, _future):
+        with self._cond:
+            self._armed = None
+            self._cond.notify()
+
+    def _due(self) -> list[tuple[int, int, int, str]]:
+        """Blocks until at least one deadline is reached; returns the due entries"""
+        with self._cond:
+            while not self._stopped:
+                while self._heap and self._scheduled.get(self._heap[0][2]) is not self._heap[0]:
+                    heapq.heappop(self._heap)
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+                due_round = self._heap[0][0]
+                last_round = self.watcher.last_round
+                if last_round is not None and last_round >= due_round:
+                    due = []
+                    while self._heap and self._heap[0][0] <= last_round:
+                        entry = heapq.heappop(self._heap)
+                        if self._scheduled.get(entry[2]) is entry:
+                            del self._scheduled[entry[2]]
+                            due.append(entry)
+                    return due
+                # one watcher registration for the earliest deadline; re-armed only for an earlier one
+                if self._armed is None or due_round < self._armed:
+                    self._armed = due_round
+                    self.watcher.future(due_round).add_done_callback(self._wake)
+                self._cond.wait()
+            return []
+
+    def run(self):
+        while not self._stopped:
+            for entry in self._due():
+                self.executor.submit(self._fire, *entry)
+
+    def _fire(self, due_round: int, _seq: int, app_id: int, action: str):
+        try:
+            # the state may have moved since it was scheduled (bid accepted, repaid, cancelled)
+            state = self.read_state(app_id)
+            current = self.next_action(state)
+            # a retry is scheduled after the deadline of its action: only a later deadline reschedules it
+            if current is None or current[1] != action or current[0] > due_round:
+                if current is not None:
+                    self.track(app_id, state)
+                return
+            nft_id = state[b"nft_id"]
+            accounts = None
+            if action == "timeout":
+                # the NFT goes back to the borrower and the highest bid to its lender
+                accounts = [encoding.encode_address(state[b"borrower_address"])]
+                if state.get(b"highest_bid", 0) > 0:
+                    accounts.append(encoding.encode_address(state[b"lender_address"]))
+            else:
+                # the NFT is closed out to the lender, who must be opted in to it
+                holdings.opt_in_to_assets(self.client, self.light.signer, self.sender, [nft_id], self.params)
+            client = LightClient(self.client, app_id, self.light.signer, self.sender)
+            result = client.call(action, suggested_params=self.params.for_method(action),
+                                 foreign_assets=[nft_id], accounts=accounts)
+            self.fired.append({
+                "app_id": app_id,
+                "action": action,
+                "due_round": due_round,
+                "confirmed_round": result.tx_info.get("confirmed-round"),
+                "tx_id": result.tx_id,
+            })
+            with self._cond:
+                self._retries.pop(app_id, None)
+        except (error.AlgodHTTPError, error.ConfirmationTimeoutError) as err:
+            with self._cond:
+                self.failures += 1
+                retries = self._retries[app_id] = self._retries.get(app_id, 0) + 1
+                if retries > MAX_RETRIES:
+                    del self._retries[app_id]
+                    self.given_up.append(app_id)
+            if retries > MAX_RETRIES:
+                print(f"Keeper: {action} on app {app_id} failed ({err}), giving up after {MAX_RETRIES} retries")
+                return
+            # never at the round that just failed: the same call would fail again right away
+            retry_round = max(due_round, self.watcher.last_round or due_round) + 2 ** (retries - 1)
+            print(f"Keeper: {action} on app {app_id} failed ({err}), retrying after round {retry_round}")
+            self._schedule(app_id, retry_round, action)
+
+
+# Scaling benchmark against the local algod stand-in: `loans` apps, half in auction (timeout) and half
+# with an accepted loan whose lender runs the keeper (loan_expired), with random deadlines. Reports the
+# algod requests issued by the keeper against polling every app each round, and the firing delay.
+def benchmark(loans=200, block_time=0.05, max_deadline=40):
+    import random
+
+    from algosdk.atomic_transaction_composer import AccountTransactionSigner
+    from algosdk.constants import microalgos_to_algos_ratio as algo
+
+    from src.local_algod import LocalAlgod
+    from src.simulator import SimulatedApp, asset_transfer_txn, create_nft_txn, payment_txn
+
+    node = LocalAlgod()
+    ledger = node.ledger
+    _, owner = ledger.new_account(10000 * algo)
+    _, borrower = ledger.new_account(10000 * algo)
+    lender_key, lender = ledger.new_account(10000 * algo)
+    app_ids = []
+    for i in range(loans):
+        sim = SimulatedApp(ledger)
+        sim.create(owner)
+        ledger.submit([payment_txn(owner, sim.app_addr, algo // 10)])
+        asset_id = ledger.submit([create_nft_txn(borrower, f"NFT {i}", "G3", "")])[0].created_asset_id
+        # deadlines fall after the setup (at most `loans` rounds)
+        auction = loans + random.randint(1, max_deadline)
+        sim.call("list_nft", borrower, fee=2000, nft=asset_id, payment=payment_txn(borrower, sim.app_addr, algo // 10),
+                 auction_base=1000, auction_period=auction if i % 2 == 0 else 1, payback_deadline=auction,
+                 after=[asset_transfer_txn(borrower, sim.app_addr, asset_id, 1)])
+        if i % 2:
+            sim.call("place_bid", lender, fee=3000, payment=payment_txn(lender, sim.app_addr, 2000))
+            ledger.advance(2)
+            sim.call("accept_bid", borrower, fee=2000)
+        app_ids.append(sim.app_id)
+
+    node.block_time = block_time
+    node._thread = threading.Thread(target=node._produce_blocks, daemon=True)
+    node._thread.start()
+    keeper = DeadlineKeeper(node, AccountTransactionSigner(lender_key), lender)
+    start_round, requests = ledger.round, node.requests
+    start = time.perf_counter()
+    keeper.track_many(app_ids)
+    keeper.start()
+    while keeper.pending() or len(keeper.fired) + len(keeper.given_up) < loans:
+        time.sleep(block_time)
+        if ledger.round - start_round > 2 * (max_deadline + loans):
+            break
+    elapsed_rounds = ledger.round - start_round
+    delays = [f["confirmed_round"] - max(f["due_round"], start_round) for f in keeper.fired]
+    print(f"{loans} loans, {len(keeper.fired)} calls fired ({keeper.failures} failures, {len(keeper.given_up)} given "
+          f"up) over {elapsed_rounds} rounds "
+          f"in {time.perf_counter() - start:.1f}s")
+    print(f"rounds from deadline to confirmation: max {max(delays)}, mean {sum(delays) / len(delays):.2f}")
+    print(f"keeper algod requests: {node.requests - requests} ({keeper.state_reads} state reads); "
+          f"polling every app each round: {loans * elapsed_rounds}")
+
+    # heap cost at scale, without the network
+    n = 50000
+    heap_keeper = DeadlineKeeper(node, AccountTransactionSigner(lender_key), lender)
+    start = time.perf_counter()
+    for app_id in range(n):
+        heap_keeper.track(app_id, {b"state": AUCTION_STATE, b"auction_period": random.randint(1, 10 ** 6)})
+    print(f"scheduling {n} apps: {(time.perf_counter() - start) / n * 1e6:.1f} us per app")
+    keeper.stop()
+    heap_keeper.stop()
+    rounds.watcher_for(node).stop()
+    node.close()
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,132 @@
+# Compares the ten-key BorrowMyNFT layout with the single-slot packed layout (src/packed_contract.py):
+# opcode cost of every method, measured with the simulator on the interact.py scenarios, and the client
+# side time needed to decode the application state returned by algod.
+import os
+import statistics
+import timeit
+
+from algosdk.constants import microalgos_to_algos_ratio as algo
+
+from src import loan_record
+from src.light_client import decode_state
+from src.local_algod import algod_global_state
+from src.simulator import (
+    Ledger,
+    SimulatedApp,
+    asset_transfer_txn,
+    create_nft_txn,
+    payment_txn,
+)
+
+path = os.path.dirname(os.path.abspath(__file__))
+
+LAYOUTS = {
+    "ten keys": (
+        os.path.join(path, "approval.teal"),
+        os.path.join(path, "clear.teal"),
+        os.path.join(path, "contract.json"),
+    ),
+    "packed": (
+        os.path.join(path, "packed_approval.teal"),
+        os.path.join(path, "packed_clear.teal"),
+        os.path.join(path, "packed_contract.json"),
+    ),
+}
+
+
+# Same scenarios as simulator.demo(); returns the simulated app and the algod shaped global state
+# snapshot taken while the loan is active (state 2)
+def run_scenarios(approval_path, clear_path, contract_path, auction_duration=2, loan_duration=2):
+    milli_algo = algo // 1000
+    ledger = Ledger()
+    _, owner = ledger.new_account(100 * algo)
+    _, borrower = ledger.new_account(100 * algo)
+    _, lender = ledger.new_account(100 * algo)
+    sim = SimulatedApp(ledger, approval_path, clear_path, contract_path)
+
+    def list_nft(asset_id):
+        sim.call("provide_access_to_nft", borrower, fee=3000, nft=asset_id,
+                 payment=payment_txn(borrower, sim.app_addr, 100 * milli_algo))
+        sim.call("set_offer", borrower, foreign_assets=[asset_id],
+                 asset_xfer=asset_transfer_txn(borrower, sim.app_addr, asset_id, 1),
+                 auction_base=100, auction_period=auction_duration, payback_deadline=loan_duration)
+        return ledger.round + auction_duration
+
+    def bid_and_accept(asset_id, amount):
+        ending_auction_round = list_nft(asset_id)
+        sim.call("place_bid", lender, fee=3000, payment=payment_txn(lender, sim.app_addr, amount))
+        ledger.advance(max(0, ending_auction_round - ledger.round))
+        sim.call("accept_bid", borrower, fee=2000)
+
+    sim.create(owner)
+    ledger.submit([payment_txn(owner, sim.app_addr, 100 * milli_algo)])
+    asset_id = ledger.submit([create_nft_txn(borrower, "G3 NFT@arc3", "G3", "")])[0].created_asset_id
+
+    # loan complete flow
+    bid_and_accept(asset_id, 200 * milli_algo)
+    active_state = algod_global_state(ledger.global_state(sim.app_id))
+    sim.call("pay_back", borrower, fee=5000, foreign_assets=[asset_id], accounts=[lender],
+             payment=payment_txn(borrower, sim.app_addr, 200 * milli_algo))
+    # timeout after an outbid
+    ending_auction_round = list_nft(asset_id)
+    sim.call("place_bid", lender, fee=3000, payment=payment_txn(lender, sim.app_addr, 2 * milli_algo))
+    sim.call("place_bid", lender, fee=3000, payment=payment_txn(lender, sim.app_addr, 3 * milli_algo))
+    ledger.advance(max(0, ending_auction_round + 2 - ledger.round))
+    sim.call("timeout", lender, fee=3000, foreign_assets=[asset_id], accounts=[borrower])
+    # cancel offer
+    list_nft(asset_id)
+    sim.call("cancel_offer", borrower, fee=3000, foreign_assets=[asset_id])
+    # partial payback, then the loan expires
+    bid_and_accept(asset_id, 200 * milli_algo)
+    sim.call("pay_back", borrower, fee=5000, foreign_assets=[asset_id], accounts=[lender],
+             payment=payment_txn(borrower, sim.app_addr, 100 * milli_algo))
+    ledger.advance(loan_duration + 1)
+    ledger.submit([asset_transfer_txn(lender, lender, asset_id, 0)])
+    sim.call("loan_expired", lender, fee=2000, foreign_assets=[asset_id])
+    sim.call("read_state", owner)
+    sim.call("pay_me", owner, fee=2000)
+    sim.delete(owner, fee=2000)
+    return sim, active_state
+
+
+def cost_by_method(sim: SimulatedApp) -> dict[str, float]:
+    costs = {}
+    for call in sim.calls:
+        costs.setdefault(call.method, []).append(call.cost)
+    return {method: statistics.mean(values) for method, values in costs.items()}
+
+
+# Reads every loan field from the algod response, as a keeper would
+def decode_ten_keys(global_state):
+    state = decode_state(global_state)
+    return state["state"], state["highest_bid"], state["debt_left"], state["payback_deadline"]
+
+
+def decode_packed(global_state):
+    _, loan = loan_record.decode_packed_state(global_state)
+    return loan.state, loan.highest_bid, loan.debt_left, loan.payback_deadline
+
+
+def benchmark(number=20000):
+    results = {name: run_scenarios(*paths) for name, paths in LAYOUTS.items()}
+    costs = {name: cost_by_method(sim) for name, (sim, _) in results.items()}
+
+    print(f"{'method':24s}" + "".join(f"{name:>12s}" for name in LAYOUTS) + f"{'delta':>10s}")
+    methods = sorted(set().union(*costs.values()))
+    for method in methods:
+        ten, packed = costs["ten keys"].get(method), costs["packed"].get(method)
+        delta = f"{packed - ten:+10.1f}" if ten is not None and packed is not None else f"{'':>10s}"
+        print(f"{method:24s}{ten or 0:12.1f}{packed or 0:12.1f}{delta}")
+    totals = {name: sum(c.cost for c in sim.calls) for name, (sim, _) in results.items()}
+    print(f"{'total opcode cost':24s}" + "".join(f"{totals[name]:12d}" for name in LAYOUTS))
+
+    decoders = {"ten keys": decode_ten_keys, "packed": decode_packed}
+    for name, (_, active_state) in results.items():
+        decoder = decoders[name]
+        elapsed = min(timeit.repeat(lambda: decoder(active_state), number=number, repeat=5))
+        print(f"client decode ({name}, {len(active_state)} entries): {elapsed / number * 1e6:.2f} us per state")
+    return costs
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,305 @@
+# Lightweight BorrowMyNFT client for bots and keepers.
+# It builds ABI method calls straight from src/contract.json and deploys the checked-in approval/clear
+# TEAL, so only py-algorand-sdk is imported: no pyteal AST construction, no beaker compilation.
+import copy
+import json
+import os
+from base64 import b64decode
+from math import ceil
+
+from algosdk import abi
+from algosdk.atomic_transaction_composer import (
+    ABI_RETURN_HASH,
+    ABIResult,
+    AccountTransactionSigner,
+    AtomicTransactionComposer,
+    TransactionSigner,
+    TransactionWithSigner,
+)
+from algosdk.constants import APP_PAGE_MAX_SIZE
+from algosdk.future import transaction
+from algosdk.logic import get_application_address
+from algosdk.v2client import algod
+
+path = os.path.dirname(os.path.abspath(__file__))
+
+CONTRACT_PATH = os.path.join(path, "contract.json")
+APPROVAL_PATH = os.path.join(path, "approval.teal")
+CLEAR_PATH = os.path.join(path, "clear.teal")
+# BorrowMyNFTs (src/multi_contract.py): one loan box per NFT
+MULTI_CONTRACT_PATH = os.path.join(path, "multi_contract.json")
+MULTI_APPROVAL_PATH = os.path.join(path, "multi_approval.teal")
+MULTI_CLEAR_PATH = os.path.join(path, "multi_clear.teal")
+
+_specs: dict[str, dict] = {}
+
+
+# contract.json is parsed once per process
+def load_spec(spec_path=CONTRACT_PATH):
+    spec = _specs.get(spec_path)
+    if spec is None:
+        with open(spec_path) as f:
+            spec = _specs[spec_path] = json.load(f)
+        spec["_contract"] = abi.Contract.undictify(spec["contract"])
+    return spec
+
+
+def _str_or_hex(value: bytes) -> str:
+    try:
+        return value.decode("utf-8")
+    except UnicodeDecodeError:
+        return value.hex()
+
+
+# Same output as beaker.client.state_decode.decode_state
+def decode_state(state, raw=False):
+    decoded = {}
+    for sv in state:
+        raw_key = b64decode(sv["key"])
+        key = raw_key if raw else _str_or_hex(raw_key)
+        if sv["value"]["type"] == 1:
+            raw_value = b64decode(sv["value"]["bytes"])
+            decoded[key] = raw_value if raw else _str_or_hex(raw_value)
+        else:
+            decoded[key] = sv["value"]["uint"]
+    return decoded
+
+
+# ABI return value of a method call, decoded from its last log (pending transaction or dryrun info)
+def abi_result(method: abi.Method, tx_id: str, tx_info: dict) -> ABIResult:
+    raw_value = return_value = decode_error = None
+    if method.returns.type == abi.Returns.VOID:
+        return ABIResult(tx_id, raw_value, return_value, decode_error, tx_info, method)
+    try:
+        log = b64decode(tx_info["logs"][-1])
+        if log[:4] != ABI_RETURN_HASH:
+            raise Exception("no logs")
+        raw_value = log[4:]
+        return_value = method.returns.type.decode(raw_value)
+    except Exception as e:
+        decode_error = e
+    return ABIResult(
+        tx_id=tx_id,
+        raw_value=raw_value,
+        return_value=return_value,
+        decode_error=decode_error,
+        tx_info=tx_info,
+        method=method,
+    )
+
+
+class LightClient:
+    """ABI client for BorrowMyNFT driven by contract.json; mirrors the parts of beaker's
+    ApplicationClient used by src/interact.py (create, call, prepare, fund, get_application_state)."""
+
+    def __init__(
+        self,
+        client: algod.AlgodClient,
+        app_id: int = 0,
+        signer: TransactionSigner = None,
+        sender: str = None,
+        suggested_params: transaction.SuggestedParams = None,
+        spec_path=CONTRACT_PATH,
+    ):
+        self.client = client
+        self.app_id = app_id
+        self.app_addr = get_application_address(app_id) if app_id != 0 else None
+        self.signer = signer
+        self.sender = sender if sender is not None else self._sender_of(signer)
+        self.suggested_params = suggested_params
+        self.spec = load_spec(spec_path)
+        self.contract: abi.Contract = self.spec["_contract"]
+        self.methods = {m.name: m for m in self.contract.methods}
+
+    @staticmethod
+    def _sender_of(signer):
+        if isinstance(signer, AccountTransactionSigner):
+            from algosdk.account import address_from_private_key
+            return address_from_private_key(signer.private_key)
+        return None
+
+    def prepare(self, signer: TransactionSigner = None, sender: str = None) -> "LightClient":
+        """makes a copy of the current client bound to another signer"""
+        lc = copy.copy(self)
+        lc.signer = signer or self.signer
+        lc.sender = sender if sender is not None else self._sender_of(lc.signer) or self.sender
+        return lc
+
+    def get_method(self, method: str | abi.Method) -> abi.Method:
+        return method if isinstance(method, abi.Method) else self.methods[method]
+
+    def get_suggested_params(self, sp: transaction.SuggestedParams = None) -> transaction.SuggestedParams:
+        if sp is not None:
+            return sp
+        if self.suggested_params is not None:
+            return self.suggested_params
+        return self.client.suggested_params()
+
+    # declared values take one slot each, reserved ones max_keys slots (as beaker does)
+    def _schema(self, scope: str) -> transaction.StateSchema:
+        schema = self.spec["schema"][scope]
+        slots = [(v["type"], 1) for v in schema["declared"].values()]
+        slots += [(v["type"], v["max_keys"]) for v in schema.get("reserved", {}).values()]
+        return transaction.StateSchema(
+            num_uints=sum(n for t, n in slots if t == "uint64"),
+            num_byte_slices=sum(n for t, n in slots if t != "uint64"),
+        )
+
+    def global_schema(self) -> transaction.StateSchema:
+        return self._schema("global")
+
+    def local_schema(self) -> transaction.StateSchema:
+        return self._schema("local")
+
+    def create(self, suggested_params: transaction.SuggestedParams = None, approval_path=APPROVAL_PATH,
+               clear_path=CLEAR_PATH) -> tuple[int, str, str]:
+        """Deploys the checked-in TEAL, compiled by algod"""
+        with open(approval_path) as f:
+            approval = b64decode(self.client.compile(f.read())["result"])
+        with open(clear_path) as f:
+            clear = b64decode(self.client.compile(f.read())["result"])
+        extra_pages = ceil((len(approval) + len(clear) - APP_PAGE_MAX_SIZE) / APP_PAGE_MAX_SIZE)
+        atc = AtomicTransactionComposer()
+        atc.add_transaction(TransactionWithSigner(
+            txn=transaction.ApplicationCreateTxn(
+                sender=self.sender,
+                sp=self.get_suggested_params(suggested_params),
+                on_complete=transaction.OnComplete.NoOpOC,
+                approval_program=approval,
+                clear_program=clear,
+                global_schema=self.global_schema(),
+                local_schema=self.local_schema(),
+                extra_pages=max(0, extra_pages),
+            ),
+            signer=self.signer,
+        ))
+        txid = atc.execute(self.client, 4).tx_ids[0]
+        self.app_id = self.client.pending_transaction_info(txid)["application-index"]
+        self.app_addr = get_application_address(self.app_id)
+        return self.app_id, self.app_addr, txid
+
+    def add_method_call(
+        self,
+        atc: AtomicTransactionComposer,
+        method: str | abi.Method,
+        suggested_params: transaction.SuggestedParams = None,
+        on_complete: transaction.OnComplete = transaction.OnComplete.NoOpOC,
+        accounts: list[str] = None,
+        foreign_apps: list[int] = None,
+        foreign_assets: list[int] = None,
+        note: bytes = None,
+        lease: bytes = None,
+        boxes: list[tuple[int, bytes]] = None,
+        **kwargs,
+    ) -> AtomicTransactionComposer:
+        method = self.get_method(method)
+        missing = [arg.name for arg in method.args if arg.name not in kwargs]
+        if missing:
+            raise Exception(f"Unspecified argument: {missing[0]}")
+        atc.add_method_call(
+            self.app_id,
+            method,
+            self.sender,
+            self.get_suggested_params(suggested_params),
+            self.signer,
+            method_args=[kwargs[arg.name] for arg in method.args],
+            on_complete=on_complete,
+            accounts=accounts,
+            foreign_apps=foreign_apps,
+            foreign_assets=foreign_assets,
+            note=note,
+            lease=lease,
+            boxes=boxes,
+        )
+        return atc
+
+    def call(self, method: str | abi.Method, **kwargs) -> ABIResult:
+        method = self.get_method(method)
+        atc = self.add_method_call(AtomicTransactionComposer(), method, **kwargs)
+        if self.spec["hints"].get(method.name, {}).get("read_only"):
+            return self._dryrun(method, atc)
+        # imported here: app_state builds on this module
+        from src import app_state
+
+        try:
+            result = atc.execute(self.client, 4).abi_results.pop()
+        except Exception:
+            # the group may still be committed (confirmation timeout)
+            app_state.sent(self.client, self.app_id)
+            raise
+        app_state.sent(self.client, self.app_id, result.tx_info.get("confirmed-round"))
+        return result
+
+    def _dryrun(self, method: abi.Method, atc: AtomicTransactionComposer) -> ABIResult:
+        signed = atc.gather_signatures()
+        result = self.client.dryrun(transaction.create_dryrun(self.client, signed))
+        return abi_result(method, atc.tx_ids[-1], result["txns"][-1])
+
+    def delete(self, suggested_params: transaction.SuggestedParams = None) -> str:
+        atc = AtomicTransactionComposer()
+        atc.add_transaction(TransactionWithSigner(
+            txn=transaction.ApplicationDeleteTxn(self.sender, self.get_suggested_params(suggested_params),
+                                                 self.app_id),
+            signer=self.signer,
+        ))
+        return atc.execute(self.client, 4).tx_ids[0]
+
+    def fund(self, amount: int, addr: str = None) -> str:
+        atc = AtomicTransactionComposer()
+        atc.add_transaction(TransactionWithSigner(
+            txn=transaction.PaymentTxn(self.sender, self.client.suggested_params(), addr or self.app_addr, amount),
+            signer=self.signer,
+        ))
+        return atc.execute(self.client, 4).tx_ids[0]
+
+    def get_application_state(self, raw=False):
+        """gets the global state info for the app id set"""
+        app_state = self.client.application_info(self.app_id)
+        if "params" not in app_state or "global-state" not in app_state["params"]:
+            return {}
+        return decode_state(app_state["params"]["global-state"], raw=raw)
+
+
+# Startup benchmark: fresh interpreter, import + build a client able to call place_bid
+_STARTUP_SNIPPETS = {
+    "beaker (src.contract)": (
+        "from beaker.client import ApplicationClient\n"
+        "from src.contract import BorrowMyNFT\n"
+        "app_client = ApplicationClient(None, BorrowMyNFT())\n"
+        "app_client.app.place_bid\n"
+    ),
+    "light (src.light_client)": (
+        "from src.light_client import LightClient\n"
+        "app_client = LightClient(None, app_id=1)\n"
+        "app_client.get_method('place_bid')\n"
+    ),
+}
+
+
+def benchmark_startup(runs=5):
+    import subprocess
+    import sys
+
+    root = os.path.dirname(path)
+    probe = (
+        "import resource, time\n"
+        "started = time.perf_counter()\n"
+        "{snippet}"
+        "elapsed = time.perf_counter() - started\n"
+        "print(elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)\n"
+    )
+    results = {}
+    for name, snippet in _STARTUP_SNIPPETS.items():
+        samples = []
+        for _ in range(runs):
+            out = subprocess.run([sys.executable, "-c", probe.format(snippet=snippet)], cwd=root,
+                                 capture_output=True, text=True, check=True).stdout.split()
+            samples.append((float(out[0]), int(out[1])))
+        samples.sort()
+        results[name] = samples[len(samples) // 2]
+        print(f"{name:28s} startup {results[name][0] * 1000:8.1f} ms   max RSS {results[name][1] / 1024:7.1f} MiB")
+    return results
+
+
+if __name__ == "__main__":
+    benchmark_startup()
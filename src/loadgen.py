@@ -0,0 +1,321 @@
+# Load generator for BorrowMyNFT.
+# Borrowers arrive as a Poisson process. Each one deploys its app, mints an NFT (src/mint.py) and lists it
+# with list_nft (the one-group form of provide_access_to_nft + set_offer). Lenders bid on it concurrently
+# through the race-aware Bidder (src/bidding.py). The borrower then accepts the best bid and either repays
+# it with an exact quote (src/quote.py), or lets it expire so that the lender claims the NFT with
+# loan_expired. Every group sent goes through MeteredAlgod, which labels it with its ABI method and measures
+# submit-to-confirmation latency, confirmed transactions, assert failures and fees, whatever helper sent it.
+# Runs against the local HTTP stand-in (src/local_server.py) or a sandbox node.
+#
+#   python -m src.loadgen [--target local|sandbox] [--borrowers N] [--lenders N] [--rate R] ...
+import argparse
+import math
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+
+from algosdk import account, encoding, error
+from algosdk.atomic_transaction_composer import (
+    AccountTransactionSigner,
+    AtomicTransactionComposer,
+    TransactionWithSigner,
+)
+from algosdk.constants import microalgos_to_algos_ratio as algo
+from algosdk.future import transaction
+from algosdk.v2client import algod
+
+from src import app_state, holdings, rounds, utils
+from src.bidding import BidRejected, Bidder, EscalationPolicy
+from src.light_client import LightClient
+from src.mint import NFT, mint_nfts
+from src.params import SuggestedParamsProvider
+from src.quote import Repayer
+
+# Funds given to every generated account
+BORROWER_FUNDS = 10 * algo
+LENDER_FUNDS = 1000 * algo
+
+
+@dataclass
+class LoadConfig:
+    borrowers: int = 200
+    lenders: int = 40
+    arrival_rate: float = 40.0  # borrowers arriving per second
+    bids_per_auction: int = 3
+    auction_rounds: int = 20
+    loan_rounds: int = 4
+    repay_ratio: float = 0.7  # loans repaid; the others expire and are claimed by the lender
+    workers: int = 128
+
+
+@dataclass
+class MethodStats:
+    latencies: list[float] = field(default_factory=list)  # seconds from submission to confirmation
+    groups: int = 0  # groups sent
+    confirmed_txns: int = 0
+    assert_failures: int = 0  # groups rejected by a failed assert (logic eval error)
+    other_failures: int = 0  # groups rejected for another reason
+    fees: int = 0  # microAlgos paid by the confirmed groups
+
+
+class MeteredAlgod:
+    """algod client proxy recording every group sent, labelled with its ABI method"""
+
+    def __init__(self, client: algod.AlgodClient):
+        self.client = client
+        self.selectors = {m.get_selector(): m.name for m in LightClient(client).contract.methods}
+        self.stats: dict[str, MethodStats] = {}
+        # txid -> [label, submission time, transactions, fees, confirmed] until the txid is seen confirmed
+        self._pending: dict[str, list] = {}
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def label(self, txns: list[transaction.Transaction]) -> str:
+        for txn in txns:
+            if isinstance(txn, transaction.ApplicationCallTxn):
+                if txn.index == 0:
+                    return "create"
+                if txn.app_args:
+                    return self.selectors.get(txn.app_args[0], "app_call")
+        kinds = {type(txn) for txn in txns}
+        if kinds == {transaction.AssetConfigTxn}:
+            return "mint"
+        if kinds == {transaction.AssetTransferTxn} and all(t.receiver == t.sender and not t.amount for t in txns):
+            return "opt_in"
+        return "payment"
+
+    def _stats(self, name: str) -> MethodStats:
+        # caller holds self._lock
+        return self.stats.setdefault(name, MethodStats())
+
+    def send_transaction(self, txn, **kwargs):
+        return self.send_transactions([txn], **kwargs)
+
+    def send_transactions(self, txns, **kwargs):
+        group = [stxn.transaction for stxn in txns]
+        name = self.label(group)
+        start = time.perf_counter()
+        try:
+            txid = self.client.send_transactions(txns, **kwargs)
+        except error.AlgodHTTPError as err:
+            with self._lock:
+                stats = self._stats(name)
+                stats.groups += 1
+                if "logic eval error" in str(err):
+                    stats.assert_failures += 1
+                else:
+                    stats.other_failures += 1
+            raise
+        with self._lock:
+            self._stats(name).groups += 1
+            entry = [name, start, len(group), sum(t.fee for t in group), False]
+            for stxn in txns:
+                self._pending[stxn.get_txid()] = entry
+        return txid
+
+    def pending_transaction_info(self, transaction_id, **kwargs):
+        info = self.client.pending_transaction_info(transaction_id, **kwargs)
+        if isinstance(info, dict) and info.get("confirmed-round", 0) > 0:
+            with self._lock:
+                entry = self._pending.pop(transaction_id, None)
+                # the entry is shared by the transactions of the group: it is counted once
+                if entry is not None and not entry[4]:
+                    entry[4] = True
+                    name, start, txns, fees, _ = entry
+                    stats = self._stats(name)
+                    stats.latencies.append(time.perf_counter() - start)
+                    stats.confirmed_txns += txns
+                    stats.fees += fees
+        return info
+
+    def reset(self):
+        with self._lock:
+            self.stats.clear()
+            self._pending.clear()
+
+    def report(self, elapsed: float) -> dict:
+        with self._lock:
+            rows = {}
+            for name, stats in sorted(self.stats.items()):
+                latencies = sorted(stats.latencies)
+                rows[name] = {
+                    "groups": stats.groups,
+                    "confirmed_txns": stats.confirmed_txns,
+                    "p50_ms": round(statistics.median(latencies) * 1000, 1) if latencies else None,
+                    # nearest rank
+                    "p99_ms": round(latencies[math.ceil(len(latencies) * 0.99) - 1] * 1000, 1) if latencies else None,
+                    "assert_failure_rate": round(stats.assert_failures / stats.groups, 3) if stats.groups else 0.0,
+                    "other_failures": stats.other_failures,
+                    "fees": stats.fees,
+                }
+            confirmed = sum(row["confirmed_txns"] for row in rows.values())
+            return {
+                "elapsed_s": round(elapsed, 1),
+                "confirmed_tps": round(confirmed / elapsed, 1) if elapsed else 0.0,
+                "fees": sum(row["fees"] for row in rows.values()),
+                "methods": rows,
+            }
+
+
+class LoadGenerator:
+    def __init__(self, client: algod.AlgodClient, faucet_signer: AccountTransactionSigner, faucet: str,
+                 config: LoadConfig, block_time: float):
+        self.client = MeteredAlgod(client)
+        self.config = config
+        self.params = SuggestedParamsProvider(self.client, ttl=block_time)
+        self.watcher = rounds.watcher_for(self.client)
+        self.faucet_signer, self.faucet = faucet_signer, faucet
+        self.borrowers: list[tuple[str, str]] = []
+        self.lenders: list[tuple[str, str]] = []
+        self.outcomes: dict[str, int] = {}
+        self.errors: list[str] = []
+        self._lock = threading.Lock()
+
+    def setup(self):
+        self.borrowers = [account.generate_account() for _ in range(self.config.borrowers)]
+        self.lenders = [account.generate_account() for _ in range(self.config.lenders)]
+        utils.fund_accounts(self.client, self.faucet_signer, self.faucet, [a for _, a in self.borrowers],
+                            BORROWER_FUNDS, self.params)
+        utils.fund_accounts(self.client, self.faucet_signer, self.faucet, [a for _, a in self.lenders],
+                            LENDER_FUNDS, self.params)
+
+    def _outcome(self, name: str):
+        with self._lock:
+            self.outcomes[name] = self.outcomes.get(name, 0) + 1
+
+    def run(self) -> dict:
+        self.setup()
+        # the funding of the populations is not part of the load
+        self.client.reset()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(self.config.workers, thread_name_prefix="borrower") as borrowers, \
+                ThreadPoolExecutor(self.config.workers, thread_name_prefix="lender") as lenders:
+            futures = []
+            for borrower in self.borrowers:
+                futures.append(borrowers.submit(self._borrower, borrower, lenders))
+                time.sleep(random.expovariate(self.config.arrival_rate))
+            wait(futures)
+        report = self.client.report(time.perf_counter() - start)
+        report["outcomes"] = dict(self.outcomes)
+        report["errors"] = self.errors[:5]
+        return report
+
+    def _borrower(self, borrower: tuple[str, str], lenders: ThreadPoolExecutor):
+        try:
+            self._lifecycle(borrower, lenders)
+        except Exception as err:
+            self._outcome("error")
+            with self._lock:
+                self.errors.append(f"{type(err).__name__}: {err}")
+
+    def _lifecycle(self, borrower: tuple[str, str], lenders: ThreadPoolExecutor):
+        key, address = borrower
+        signer = AccountTransactionSigner(key)
+        owner = LightClient(self.client, signer=signer, suggested_params=self.params.get())
+        app_id, app_addr, _ = owner.create()
+        owner.fund(algo // 10)
+        nft_id = mint_nfts(self.client, signer, address, [NFT(f"Load NFT {app_id}@arc3", "LOAD")], self.params)[0]
+
+        client = LightClient(self.client, app_id, signer)
+        atc = client.add_method_call(
+            AtomicTransactionComposer(), "list_nft", suggested_params=self.params.for_method("list_nft"),
+            payment=TransactionWithSigner(transaction.PaymentTxn(address, self.params.get(), app_addr, algo // 10),
+                                          signer),
+            nft=nft_id, auction_base=10000, auction_period=self.config.auction_rounds,
+            payback_deadline=self.config.loan_rounds,
+        )
+        atc.add_transaction(TransactionWithSigner(
+            transaction.AssetTransferTxn(address, self.params.get(), app_addr, 1, nft_id), signer))
+        app_state.sent(self.client, app_id, atc.execute(self.client, 4).confirmed_round)
+
+        bids = [lenders.submit(self._bid, app_id, random.choice(self.lenders))
+                for _ in range(self.config.bids_per_auction)]
+        wait(bids)
+        state = client.get_application_state(raw=True)
+        if not state.get(b"highest_bid"):
+            self._outcome("no_bid")
+            return
+        winner_address = encoding.encode_address(state[b"lender_address"])
+        winner_key = next(k for k, a in self.lenders if a == winner_address)
+        client.call("accept_bid", suggested_params=self.params.for_method("accept_bid"))
+
+        if random.random() < self.config.repay_ratio:
+            Repayer(self.client, app_id, signer, address, self.params).pay_in_full()
+            self._outcome("repaid")
+            return
+        # the lender opts in to the NFT and claims it once the payback deadline is reached
+        winner_signer = AccountTransactionSigner(winner_key)
+        holdings.opt_in_to_assets(self.client, winner_signer, winner_address, [nft_id], self.params)
+        deadline = client.get_application_state(raw=True)[b"payback_deadline"]
+        self.watcher.wait_for(deadline - 1)
+        LightClient(self.client, app_id, winner_signer).call(
+            "loan_expired", suggested_params=self.params.for_method("loan_expired"), foreign_assets=[nft_id])
+        self._outcome("claimed")
+
+    def _bid(self, app_id: int, lender: tuple[str, str]):
+        key, _ = lender
+        bidder = Bidder(self.client, app_id, AccountTransactionSigner(key), params=self.params,
+                        policy=EscalationPolicy(step=10000, max_attempts=3))
+        try:
+            bidder.bid(random.randint(20000, 100000), max_bid=algo)
+        except BidRejected:
+            pass
+
+
+def print_report(report: dict):
+    print(f"{report['elapsed_s']}s, {report['confirmed_tps']} confirmed txn/s, fees {report['fees']} microAlgos")
+    print(f"outcomes: {report['outcomes']}")
+    print(f"{'method':16s}{'groups':>8s}{'txns':>8s}{'p50 ms':>9s}{'p99 ms':>9s}{'asserts':>9s}{'other':>7s}"
+          f"{'fees':>10s}")
+    for name, row in report["methods"].items():
+        print(f"{name:16s}{row['groups']:8d}{row['confirmed_txns']:8d}{row['p50_ms'] or 0:9.1f}"
+              f"{row['p99_ms'] or 0:9.1f}{row['assert_failure_rate']:9.1%}{row['other_failures']:7d}{row['fees']:10d}")
+    for err in report["errors"]:
+        print(f"  error: {err}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="BorrowMyNFT load generator")
+    parser.add_argument("--target", choices=("local", "sandbox"), default="local")
+    parser.add_argument("--block-time", type=float, default=0.5, help="local target only")
+    parser.add_argument("--latency", type=float, default=0.002, help="local target only")
+    for name, default in LoadConfig.__dataclass_fields__.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=type(default.default), default=default.default)
+    args = parser.parse_args(argv)
+    config = LoadConfig(**{name: getattr(args, name) for name in LoadConfig.__dataclass_fields__})
+
+    server = None
+    if args.target == "local":
+        from src.algod_pool import PooledAlgodClient
+        from src.local_server import TOKEN, LocalAlgodServer
+
+        server = LocalAlgodServer(block_time=args.block_time, latency=args.latency).start()
+        with server.node._cond:
+            faucet_key, faucet = server.node.ledger.new_account(10 ** 8 * algo)
+        client = PooledAlgodClient(TOKEN, server.address, pool_size=config.workers)
+        block_time = args.block_time
+    else:
+        from beaker import sandbox
+
+        client = sandbox.get_algod_client()
+        faucet_account = sandbox.get_accounts()[0]
+        faucet_key, faucet = faucet_account.private_key, faucet_account.address
+        block_time = 1.0
+
+    generator = LoadGenerator(client, AccountTransactionSigner(faucet_key), faucet, config, block_time)
+    if args.target == "sandbox":
+        # dev mode makes blocks only when transactions arrive: deadline waiters nudge it
+        rounds.watcher_for(generator.client, nudge=lambda: utils.nudge_dev_block(client, faucet_account))
+    print_report(generator.run())
+    rounds.watcher_for(generator.client).stop()
+    if server is not None:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
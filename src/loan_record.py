@@ -0,0 +1,139 @@
+# Packed loan record used by the multi-loan contract (src/multi_contract.py) and the single-slot contract
+# (src/packed_contract.py).
+# The record packs the two addresses and the numeric fields of BorrowMyNFT at fixed offsets. The multi-loan
+# contract stores it in a box named by the 8 bytes big endian NFT id (one box per loan, no limit on the
+# number of loans); the single-slot contract stores it in global state under "loan" (key + value must fit
+# the 128 bytes of a global state entry).
+import struct
+from base64 import b64decode
+
+from algosdk import encoding
+from algosdk.v2client import algod
+from pyteal import Expr, Extract, ExtractUint64, Int, Itob, Replace, ScratchVar
+
+RECORD_FORMAT = ">32s32sQQQQQQQ"
+RECORD_SIZE = struct.calcsize(RECORD_FORMAT)
+
+# Byte offsets of the fields inside a record
+BORROWER_ADDRESS = 0
+LENDER_ADDRESS = 32
+HIGHEST_BID = 64
+AUCTION_BASE = 72
+AUCTION_PERIOD = 80
+PAYBACK_DEADLINE = 88
+LAST_INTEREST_UPDATE_BLOCK = 96
+DEBT_LEFT = 104
+STATE = 112
+
+FIELDS = (
+    "borrower_address",
+    "lender_address",
+    "highest_bid",
+    "auction_base",
+    "auction_period",
+    "payback_deadline",
+    "last_interest_update_block",
+    "debt_left",
+    "state",
+)
+
+# Minimum balance a loan box adds to the app account: 2500 per box + 400 per byte of name and value
+BOX_MIN_BALANCE = 2500 + 400 * (8 + RECORD_SIZE)
+
+_record = struct.Struct(RECORD_FORMAT)
+_uint64 = struct.Struct(">Q")
+assert RECORD_SIZE == STATE + 8 and RECORD_SIZE + 8 <= 128
+
+
+# Field access on a record held in a scratch slot, for the contracts
+def get_uint(loan: ScratchVar, offset: int) -> Expr:
+    return ExtractUint64(loan.load(), Int(offset))
+
+
+def get_address(loan: ScratchVar, offset: int) -> Expr:
+    return Extract(loan.load(), Int(offset), Int(32))
+
+
+def set_uint(loan: ScratchVar, offset: int, value: Expr) -> Expr:
+    return loan.store(Replace(loan.load(), Int(offset), Itob(value)))
+
+
+def set_address(loan: ScratchVar, offset: int, value: Expr) -> Expr:
+    return loan.store(Replace(loan.load(), Int(offset), value))
+
+
+def loan_key(nft_id: int) -> bytes:
+    return nft_id.to_bytes(8, "big")
+
+
+# Box references for a call that touches the loan of nft_id (0 is the called app)
+def loan_box(nft_id: int) -> list[tuple[int, bytes]]:
+    return [(0, loan_key(nft_id))]
+
+
+def decode_loan(value: bytes) -> dict:
+    fields = dict(zip(FIELDS, _record.unpack(value)))
+    fields["borrower_address"] = encoding.encode_address(fields["borrower_address"])
+    fields["lender_address"] = encoding.encode_address(fields["lender_address"])
+    return fields
+
+
+def encode_loan(loan: dict) -> bytes:
+    values = [loan[name] for name in FIELDS]
+    values[0] = encoding.decode_address(values[0])
+    values[1] = encoding.decode_address(values[1])
+    return _record.pack(*values)
+
+
+class LoanView:
+    """Zero-copy view over a packed record: fields are unpacked from the underlying buffer on access,
+    addresses are only base32 encoded when read."""
+
+    __slots__ = ("_buf",)
+
+    def __init__(self, value: bytes | memoryview):
+        self._buf = memoryview(value)
+        if len(self._buf) != RECORD_SIZE:
+            raise ValueError(f"loan record must be {RECORD_SIZE} bytes, got {len(self._buf)}")
+
+    def _uint(self, offset: int) -> int:
+        return _uint64.unpack_from(self._buf, offset)[0]
+
+    def _address(self, offset: int) -> str:
+        return encoding.encode_address(self._buf[offset:offset + 32].tobytes())
+
+    borrower_address = property(lambda self: self._address(BORROWER_ADDRESS))
+    lender_address = property(lambda self: self._address(LENDER_ADDRESS))
+    highest_bid = property(lambda self: self._uint(HIGHEST_BID))
+    auction_base = property(lambda self: self._uint(AUCTION_BASE))
+    auction_period = property(lambda self: self._uint(AUCTION_PERIOD))
+    payback_deadline = property(lambda self: self._uint(PAYBACK_DEADLINE))
+    last_interest_update_block = property(lambda self: self._uint(LAST_INTEREST_UPDATE_BLOCK))
+    debt_left = property(lambda self: self._uint(DEBT_LEFT))
+    state = property(lambda self: self._uint(STATE))
+
+    def as_dict(self) -> dict:
+        return decode_loan(self._buf)
+
+
+# Decodes the global state of a single-loan packed app (src/packed_contract.py): the NFT id and a LoanView,
+# or None for the loan while no offer is set
+def decode_packed_state(global_state: list[dict]) -> tuple[int, LoanView | None]:
+    nft_id, loan = 0, None
+    for sv in global_state:
+        key = b64decode(sv["key"])
+        if key == b"nft_id":
+            nft_id = sv["value"].get("uint", 0)
+        elif key == b"loan" and sv["value"].get("bytes"):
+            loan = LoanView(b64decode(sv["value"]["bytes"]))
+    return nft_id, loan
+
+
+# All the loans served by one app: the box names are listed with one call, then every box is read
+def read_loans(client: algod.AlgodClient, app_id: int) -> dict[int, dict]:
+    loans = {}
+    for box in client.application_boxes(app_id).get("boxes", []):
+        name = b64decode(box["name"])
+        value = client.application_box_by_name(app_id, name)["value"]
+        loans[int.from_bytes(name, "big")] = decode_loan(b64decode(value))
+    return loans
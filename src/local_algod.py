@@ -0,0 +1,471 @@
+# In-process algod stand-in backed by the simulator ledger (src/simulator.py).
+# It answers the subset of the AlgodClient API used by this project (status, status_after_block,
+# suggested_params, send_transactions/send_raw_transaction, pending_transaction_info, account_info,
+# application_info, application boxes, compile) with algod shaped responses, so clients and benchmarks can run real signed
+# msgpack transactions without a node. A configurable latency is added to every request (network round
+# trip) and blocks are produced every block_time seconds; block_time=0 behaves like sandbox dev mode
+# (one block per accepted group). Committed blocks are kept and served by block_info, with the logs, inner
+# transactions and global state deltas of every application call. Signatures are not verified.
+import base64
+import threading
+import time
+
+import msgpack
+from algosdk import encoding
+from algosdk.error import AlgodHTTPError
+from algosdk.future import transaction
+from algosdk.logic import get_application_address
+
+from src.simulator import (
+    MIN_TXN_FEE,
+    Ledger,
+    Program,
+    SimulationError,
+    Txn,
+    TxnResult,
+    assemble,
+    load_program,
+)
+
+GENESIS_ID = "local-v1"
+GENESIS_HASH = base64.b64encode(b"borrow-my-nft local algod".ljust(32, b"\0")).decode()
+CONSENSUS_VERSION = "local-avm-v8"
+MAX_TXN_LIFE = 1000
+
+# status_after_block returns after this many seconds even if no block was produced (as algod does)
+STATUS_AFTER_BLOCK_TIMEOUT = 60
+
+
+def _b64(value: bytes) -> str:
+    return base64.b64encode(value).decode()
+
+
+# The "global-state" list returned by algod's application_info
+def algod_global_state(state: dict[bytes, int | bytes]) -> list[dict]:
+    return [
+        {
+            "key": _b64(key),
+            "value": {"type": 1, "bytes": _b64(value), "uint": 0}
+            if isinstance(value, bytes) else {"type": 2, "bytes": "", "uint": value},
+        }
+        for key, value in state.items()
+    ]
+
+
+# JSON form of a msgpack structure: bytes become base64 strings
+def _json_safe(value):
+    if isinstance(value, bytes):
+        return _b64(value)
+    if isinstance(value, dict):
+        return {(_b64(k) if isinstance(k, bytes) else k): _json_safe(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_json_safe(v) for v in value]
+    return value
+
+
+class LocalAlgod:
+    def __init__(self, ledger: Ledger = None, block_time: float = 0.0, latency: float = 0.0):
+        self.ledger = ledger or Ledger(dev_mode=False)
+        # groups must be gathered in blocks by this class, not by the ledger
+        self.ledger.dev_mode = False
+        self.block_time = block_time
+        self.latency = latency
+        self.requests = 0
+        self._programs: dict[bytes, Program] = {}
+        self._info: dict[str, dict] = {}
+        self._unconfirmed: list[str] = []
+        self._blocks: dict[int, dict] = {}
+        self._block_txns: list[dict] = []
+        self._cond = threading.Condition()
+        self._closed = False
+        self._last_block_at = time.monotonic()
+        self._thread = None
+        if block_time > 0:
+            self._thread = threading.Thread(target=self._produce_blocks, name="local-algod-blocks", daemon=True)
+            self._thread.start()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    # ---- blocks ----
+
+    def _produce_blocks(self):
+        while True:
+            with self._cond:
+                self._cond.wait(self.block_time)
+                if self._closed:
+                    return
+                self._new_block()
+
+    def _new_block(self):
+        # caller holds self._cond
+        self.ledger.advance(1)
+        self._blocks[self.ledger.round] = {"rnd": self.ledger.round, "ts": self.ledger.timestamp,
+                                           "gen": GENESIS_ID, "gh": base64.b64decode(GENESIS_HASH),
+                                           "txns": self._block_txns}
+        self._block_txns = []
+        for txid in self._unconfirmed:
+            self._info[txid]["confirmed-round"] = self.ledger.round
+        self._unconfirmed.clear()
+        self._last_block_at = time.monotonic()
+        self._cond.notify_all()
+
+    def _round_trip(self):
+        self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    # ---- node status ----
+
+    def _status(self) -> dict:
+        return {
+            "last-round": self.ledger.round,
+            "last-version": CONSENSUS_VERSION,
+            "next-version": CONSENSUS_VERSION,
+            "next-version-round": self.ledger.round + 1,
+            "next-version-supported": True,
+            "time-since-last-round": int((time.monotonic() - self._last_block_at) * 1e9),
+            "catchup-time": 0,
+            "stopped-at-unsupported-round": False,
+        }
+
+    def status(self, **kwargs) -> dict:
+        self._round_trip()
+        with self._cond:
+            return self._status()
+
+    def status_after_block(self, block_num: int, **kwargs) -> dict:
+        self._round_trip()
+        with self._cond:
+            self._cond.wait_for(lambda: self._closed or self.ledger.round > block_num, STATUS_AFTER_BLOCK_TIMEOUT)
+            return self._status()
+
+    def suggested_params(self, **kwargs) -> transaction.SuggestedParams:
+        self._round_trip()
+        with self._cond:
+            first = self.ledger.round
+        return transaction.SuggestedParams(
+            fee=0,
+            first=first,
+            last=first + MAX_TXN_LIFE,
+            gh=GENESIS_HASH,
+            gen=GENESIS_ID,
+            flat_fee=False,
+            consensus_version=CONSENSUS_VERSION,
+            min_fee=MIN_TXN_FEE,
+        )
+
+    # ---- programs ----
+
+    def compile(self, source: str, source_map=False, **kwargs) -> dict:
+        self._round_trip()
+        program = load_program(source)
+        try:
+            bytecode = assemble(program)
+        except SimulationError as err:
+            raise AlgodHTTPError(str(err), 400)
+        self._programs[bytecode] = program
+        return {"hash": encoding.encode_address(encoding.checksum(b"Program" + bytecode)), "result": _b64(bytecode)}
+
+    def _program(self, bytecode: bytes) -> Program | None:
+        if not bytecode:
+            return None
+        program = self._programs.get(bytecode)
+        if program is None:
+            raise AlgodHTTPError("unknown program: compile its TEAL with this node first", 400)
+        return program
+
+    # ---- transactions ----
+
+    def send_transaction(self, txn, **kwargs) -> str:
+        return self.send_transactions([txn], **kwargs)
+
+    def send_transactions(self, txns, **kwargs) -> str:
+        serialized = [base64.b64decode(encoding.msgpack_encode(txn)) for txn in txns]
+        return self.send_raw_transaction(base64.b64encode(b"".join(serialized)), **kwargs)
+
+    def send_raw_transaction(self, txn, **kwargs) -> str:
+        self._round_trip()
+        raw = base64.b64decode(txn)
+        group = [self._to_txn(stxn) for stxn in self._decode(raw)]
+        with self._cond:
+            if any(t.txid in self._info for t in group):
+                raise AlgodHTTPError("transaction already in ledger", 400)
+            try:
+                self._submit(group, self._unpack(raw))
+            except SimulationError as err:
+                raise AlgodHTTPError(f"TransactionPool.Remember: {err}", 400)
+        return group[0].txid
+
+    def submit(self, group: list[Txn]) -> list[TxnResult]:
+        """Evaluates a group built in-process (e.g. by SimulatedApp.build_call) as if it was sent to the node"""
+        with self._cond:
+            return self._submit(group)
+
+    def _submit(self, group: list[Txn], signed: list[dict] = None) -> list[TxnResult]:
+        # caller holds self._cond
+        app_ids = {t.application_id for t in group if t.type == "appl" and t.application_id in self.ledger.apps}
+        before = {app_id: self.ledger.global_state(app_id) for app_id in app_ids}
+        results = self.ledger.submit(group)
+        for index, result in enumerate(results):
+            txid = result.txn.get_txid()
+            self._info[txid] = self._pending_info(result, signed[index] if signed else None)
+            self._unconfirmed.append(txid)
+        self._block_txns.extend(self._block_entries(results, before, signed))
+        if self.block_time <= 0:
+            self._new_block()
+        return results
+
+    @staticmethod
+    def _unpack(raw: bytes) -> list[dict]:
+        """The signed transactions of a submission as sent (msgpack field names, zero values omitted)"""
+        unpacker = msgpack.Unpacker(raw=False, strict_map_key=False)
+        unpacker.feed(raw)
+        return list(unpacker)
+
+    def _decode(self, raw: bytes) -> list[transaction.SignedTransaction]:
+        return [transaction.SignedTransaction.undictify(obj) for obj in self._unpack(raw)]
+
+    def _to_txn(self, stxn: transaction.SignedTransaction) -> Txn:
+        t = stxn.transaction
+        txn = Txn(
+            type=t.type,
+            sender=t.sender,
+            fee=t.fee,
+            first_valid=t.first_valid_round,
+            last_valid=t.last_valid_round,
+            note=t.note or b"",
+            txid=stxn.get_txid(),
+        )
+        match t.type:
+            case "pay":
+                txn.receiver, txn.amount, txn.close_remainder_to = t.receiver, t.amt or 0, t.close_remainder_to
+            case "axfer":
+                txn.xfer_asset, txn.asset_amount = t.index, t.amount or 0
+                txn.asset_receiver, txn.asset_close_to = t.receiver, t.close_assets_to
+                txn.asset_sender = t.revocation_target
+            case "acfg":
+                txn.config_asset = t.index or 0
+                txn.total, txn.decimals, txn.default_frozen = t.total or 0, t.decimals or 0, bool(t.default_frozen)
+                txn.unit_name = (t.unit_name or "").encode()
+                txn.asset_name = (t.asset_name or "").encode()
+                txn.url = (t.url or "").encode()
+                txn.metadata_hash = t.metadata_hash or b""
+                txn.manager, txn.reserve, txn.freeze, txn.clawback = t.manager, t.reserve, t.freeze, t.clawback
+            case "appl":
+                txn.application_id = t.index or 0
+                txn.on_completion = int(t.on_complete or 0)
+                txn.app_args = list(t.app_args or [])
+                txn.accounts = list(t.accounts or [])
+                txn.foreign_assets = list(t.foreign_assets or [])
+                txn.foreign_apps = list(t.foreign_apps or [])
+                # box references carry an index into the foreign apps (0 is the called app)
+                txn.boxes = [(txn.foreign_apps[ref.app_index - 1] if ref.app_index else 0, ref.name)
+                             for ref in t.boxes or []]
+                txn.approval_program = self._program(t.approval_program)
+                txn.clear_program = self._program(t.clear_program)
+                if t.global_schema:
+                    txn.global_num_uint = t.global_schema.num_uints or 0
+                    txn.global_num_byte_slice = t.global_schema.num_byte_slices or 0
+                if t.local_schema:
+                    txn.local_num_uint = t.local_schema.num_uints or 0
+                    txn.local_num_byte_slice = t.local_schema.num_byte_slices or 0
+                txn.extra_pages = t.extra_pages or 0
+            case _:
+                raise AlgodHTTPError(f"transaction type {t.type} not supported by the local node", 400)
+        return txn
+
+    def _pending_info(self, result: TxnResult, signed: dict = None) -> dict:
+        info = {"pool-error": "", "txn": signed or {"txn": {"type": result.txn.type, "snd": result.txn.sender}}}
+        if result.logs:
+            info["logs"] = [_b64(log) for log in result.logs]
+        if result.inner_txns:
+            info["inner-txns"] = [self._pending_info(inner) for inner in result.inner_txns]
+        if result.created_app_id:
+            info["application-index"] = result.created_app_id
+        if result.created_asset_id:
+            info["asset-index"] = result.created_asset_id
+        return info
+
+    def pending_transaction_info(self, transaction_id: str, **kwargs) -> dict:
+        self._round_trip()
+        with self._cond:
+            info = self._info.get(transaction_id)
+            if info is None:
+                raise AlgodHTTPError("txn does not exist", 404)
+            return dict(info)
+
+    # ---- blocks ----
+
+    @staticmethod
+    def _txn_dict(txn: Txn) -> dict:
+        """The msgpack field names algod uses for a transaction (zero values omitted)"""
+        def addr(value):
+            return encoding.decode_address(value) if value else None
+
+        def index(app_id):
+            return 0 if app_id in (0, txn.application_id) else txn.foreign_apps.index(app_id) + 1
+
+        fields = {
+            "type": txn.type, "snd": addr(txn.sender), "fee": txn.fee, "fv": txn.first_valid, "lv": txn.last_valid,
+            "note": txn.note, "grp": txn.group if txn.group != bytes(32) else None,
+        }
+        match txn.type:
+            case "pay":
+                fields.update(rcv=addr(txn.receiver), amt=txn.amount, close=addr(txn.close_remainder_to))
+            case "axfer":
+                fields.update(xaid=txn.xfer_asset, aamt=txn.asset_amount, arcv=addr(txn.asset_receiver),
+                              aclose=addr(txn.asset_close_to), asnd=addr(txn.asset_sender))
+            case "acfg":
+                fields.update(caid=txn.config_asset, apar={
+                    "t": txn.total, "dc": txn.decimals, "un": txn.unit_name.decode(errors="replace"),
+                    "an": txn.asset_name.decode(errors="replace"), "au": txn.url.decode(errors="replace"),
+                    "am": txn.metadata_hash, "m": addr(txn.manager), "r": addr(txn.reserve),
+                })
+            case "appl":
+                fields.update(apid=txn.application_id, apan=txn.on_completion, apaa=txn.app_args,
+                              apat=[addr(a) for a in txn.accounts], apas=txn.foreign_assets, apfa=txn.foreign_apps,
+                              apbx=[{key: value for key, value in (("i", index(app_id)), ("n", name)) if value}
+                                    for app_id, name in txn.boxes])
+                if txn.application_id == 0:
+                    fields.update(apap=assemble(txn.approval_program), apsu=assemble(txn.clear_program),
+                                  apgs={"nui": txn.global_num_uint, "nbs": txn.global_num_byte_slice})
+        return {key: value for key, value in fields.items() if value not in (None, 0, b"", [], {}, False)}
+
+    def _apply_data(self, result: TxnResult) -> dict:
+        data = {}
+        if result.logs:
+            data["lg"] = result.logs
+        if result.inner_txns:
+            data["itx"] = [{"txn": self._txn_dict(inner.txn), "dt": self._apply_data(inner)}
+                           for inner in result.inner_txns]
+        return data
+
+    @staticmethod
+    def _signed_entry(stxn: dict) -> dict:
+        """A signed transaction as algod stores it in a block: genesis id and hash are left to the header"""
+        txn = dict(stxn["txn"])
+        txn.pop("gh", None)
+        entry = {**stxn, "txn": txn}
+        if txn.pop("gen", None):
+            entry["hgi"] = True
+        return entry
+
+    def _block_entries(self, results: list[TxnResult], before: dict[int, dict],
+                       signed: list[dict] = None) -> list[dict]:
+        """SignedTxnInBlock entries of a group; the global state delta of an app is attached to its last call"""
+        last_call = {r.txn.application_id: i for i, r in enumerate(results) if r.txn.type == "appl"}
+        entries = []
+        for index, result in enumerate(results):
+            if signed:
+                entry = self._signed_entry(signed[index])
+            else:
+                entry = {"txn": self._txn_dict(result.txn), "hgi": True}
+            data = self._apply_data(result)
+            app_id = result.txn.application_id
+            if result.created_app_id:
+                entry["apid"] = result.created_app_id
+                app_id = result.created_app_id
+            if result.created_asset_id:
+                entry["caid"] = result.created_asset_id
+            if result.txn.type == "appl" and last_call.get(result.txn.application_id) == index:
+                old = before.get(app_id, {})
+                new = self.ledger.apps[app_id].global_state if app_id in self.ledger.apps else {}
+                delta = {}
+                for key, value in new.items():
+                    if old.get(key) != value:
+                        delta[key] = {"at": 1, "bs": value} if isinstance(value, bytes) else {"at": 2, "ui": value}
+                for key in old.keys() - new.keys():
+                    delta[key] = {"at": 3}
+                if delta:
+                    data["gd"] = delta
+            if data:
+                entry["dt"] = data
+            entries.append(entry)
+        return entries
+
+    def block_info(self, block=None, response_format="json", round_num=None, **kwargs):
+        self._round_trip()
+        number = block if block is not None else round_num
+        with self._cond:
+            if number not in self._blocks:
+                raise AlgodHTTPError("failed to retrieve information from the ledger", 404)
+            body = {"block": self._blocks[number]}
+        if response_format == "msgpack":
+            return msgpack.packb(body, use_bin_type=True)
+        return _json_safe(body)
+
+    # ---- ledger state ----
+
+    def account_info(self, address: str, exclude=None, **kwargs) -> dict:
+        self._round_trip()
+        with self._cond:
+            acct = self.ledger.accounts.get(address)
+            if acct is None:
+                return {"address": address, "amount": 0, "min-balance": 0, "assets": [], "round": self.ledger.round}
+            info = {
+                "address": address,
+                "amount": acct.balance,
+                "min-balance": self.ledger.min_balance(address),
+                "round": self.ledger.round,
+            }
+            if exclude != "all":
+                info["assets"] = [{"asset-id": asset_id, "amount": amount, "is-frozen": False}
+                                  for asset_id, amount in acct.assets.items()]
+                info["created-apps"] = [{"id": app_id} for app_id in acct.created_apps]
+            return info
+
+    def account_asset_info(self, address: str, asset_id: int, **kwargs) -> dict:
+        self._round_trip()
+        with self._cond:
+            acct = self.ledger.accounts.get(address)
+            if acct is None or asset_id not in acct.assets:
+                raise AlgodHTTPError("account asset info not found", 404)
+            return {
+                "round": self.ledger.round,
+                "asset-holding": {"asset-id": asset_id, "amount": acct.assets[asset_id], "is-frozen": False},
+            }
+
+    def application_info(self, application_id: int, **kwargs) -> dict:
+        self._round_trip()
+        with self._cond:
+            app = self.ledger.apps.get(application_id)
+            if app is None:
+                raise AlgodHTTPError("application does not exist", 404)
+            return {
+                "id": app.id,
+                "params": {
+                    "creator": app.creator,
+                    "approval-program": _b64(assemble(app.approval)),
+                    "clear-state-program": _b64(assemble(app.clear)),
+                    "global-state": algod_global_state(app.global_state),
+                    "global-state-schema": {"num-uint": app.global_num_uint,
+                                            "num-byte-slice": app.global_num_byte_slice},
+                    "local-state-schema": {"num-uint": app.local_num_uint, "num-byte-slice": app.local_num_byte_slice},
+                },
+            }
+
+    def _app_boxes(self, application_id: int) -> dict[bytes, bytes]:
+        app = self.ledger.apps.get(application_id)
+        if app is None:
+            raise AlgodHTTPError("application does not exist", 404)
+        return app.boxes
+
+    def application_box_by_name(self, application_id: int, box_name: bytes, **kwargs) -> dict:
+        self._round_trip()
+        with self._cond:
+            value = self._app_boxes(application_id).get(box_name)
+            if value is None:
+                raise AlgodHTTPError("box not found", 404)
+            return {"name": _b64(box_name), "round": self.ledger.round, "value": _b64(value)}
+
+    def application_boxes(self, application_id: int, limit: int = 0, **kwargs) -> dict:
+        self._round_trip()
+        with self._cond:
+            names = list(self._app_boxes(application_id))
+            return {"boxes": [{"name": _b64(name)} for name in names[:limit or None]]}
+
+    def app_address(self, app_id: int) -> str:
+        return get_application_address(app_id)
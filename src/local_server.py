@@ -0,0 +1,219 @@
+# Local algod HTTP server for hermetic benchmarks.
+# Serves the algod REST endpoints used by interact.py, utils.py and the clients of this project on top of
+# the in-process stand-in (src/local_algod.py): status, status after block, suggested params, raw
+# transactions, pending transaction info, account (and account asset) info, application info and boxes,
+# blocks and TEAL compile (assembled by the simulator). Application calls run in the simulator evaluator, so any
+# AlgodClient (the stock one or PooledAlgodClient) can be benchmarked on one machine with a configurable
+# latency and block time. The API token is not checked.
+#
+#   python -m src.local_server serve [port] [block_time] [latency]   # prints funded accounts
+#   python -m src.local_server                                      # client throughput benchmark
+import base64
+import json
+import re
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import msgpack
+from algosdk.error import AlgodHTTPError
+
+from src.local_algod import LocalAlgod, _json_safe
+
+TOKEN = "a" * 64
+
+
+def _params_json(node: LocalAlgod) -> dict:
+    sp = node.suggested_params()
+    return {
+        "consensus-version": sp.consensus_version,
+        "fee": sp.fee,
+        "genesis-hash": sp.gh,
+        "genesis-id": sp.gen,
+        "last-round": sp.first,
+        "min-fee": sp.min_fee,
+    }
+
+
+# Box names in query strings are "b64:<base64>" (what AlgodClient sends), "str:<text>" or "int:<uint64>"
+def _box_name(value: str) -> bytes:
+    encoding, _, name = value.partition(":")
+    match encoding:
+        case "b64":
+            return base64.b64decode(name)
+        case "str":
+            return name.encode()
+        case "int":
+            return int(name).to_bytes(8, "big")
+    raise AlgodHTTPError(f"invalid box name {value}", 400)
+
+
+# (method, path pattern) -> handler(node, match, query, body); handlers return a JSON-able dict or bytes
+ROUTES = [
+    ("GET", r"/v2/status", lambda node, m, q, b: node.status()),
+    ("GET", r"/v2/status/wait-for-block-after/(\d+)", lambda node, m, q, b: node.status_after_block(int(m[1]))),
+    ("GET", r"/v2/transactions/params", lambda node, m, q, b: _params_json(node)),
+    ("POST", r"/v2/transactions", lambda node, m, q, b: {"txId": node.send_raw_transaction(base64.b64encode(b))}),
+    ("GET", r"/v2/transactions/pending/(\w+)", lambda node, m, q, b: node.pending_transaction_info(m[1])),
+    ("GET", r"/v2/accounts/(\w+)/assets/(\d+)", lambda node, m, q, b: node.account_asset_info(m[1], int(m[2]))),
+    ("GET", r"/v2/accounts/(\w+)", lambda node, m, q, b: node.account_info(m[1], exclude=q.get("exclude"))),
+    ("GET", r"/v2/applications/(\d+)/box",
+     lambda node, m, q, b: node.application_box_by_name(int(m[1]), _box_name(q.get("name", "")))),
+    ("GET", r"/v2/applications/(\d+)/boxes",
+     lambda node, m, q, b: node.application_boxes(int(m[1]), limit=int(q.get("max", 0)))),
+    ("GET", r"/v2/applications/(\d+)", lambda node, m, q, b: node.application_info(int(m[1]))),
+    ("GET", r"/v2/blocks/(\d+)",
+     lambda node, m, q, b: node.block_info(int(m[1]), response_format=q.get("format", "json"))),
+    ("POST", r"/v2/teal/compile", lambda node, m, q, b: node.compile(b.decode())),
+    ("GET", r"/health", lambda node, m, q, b: {}),
+]
+_ROUTES = [(method, re.compile(pattern + r"/?$"), handler) for method, pattern, handler in ROUTES]
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def _dispatch(self, method: str):
+        url = urlsplit(self.path)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        for route_method, pattern, handler in _ROUTES:
+            match = pattern.match(url.path)
+            if route_method == method and match:
+                break
+        else:
+            return self._send(404, {"message": f"{method} {url.path} is not served by the local algod"})
+        try:
+            result = handler(self.server.node, match, query, body)
+        except AlgodHTTPError as err:
+            return self._send(err.code or 400, {"message": str(err)})
+        except Exception as err:
+            return self._send(500, {"message": f"{type(err).__name__}: {err}"})
+        if query.get("format") == "msgpack" and not isinstance(result, bytes):
+            result = msgpack.packb(result, use_bin_type=True)
+        self._send(200, result)
+
+    def _send(self, status: int, result):
+        if isinstance(result, bytes):
+            body, content_type = result, "application/msgpack"
+        else:
+            body, content_type = json.dumps(_json_safe(result)).encode(), "application/json"
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def log_message(self, *args):
+        pass
+
+
+class LocalAlgodServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, node: LocalAlgod = None, host: str = "127.0.0.1", port: int = 0, block_time: float = 0.0,
+                 latency: float = 0.0):
+        super().__init__((host, port), Handler)
+        self.node = node or LocalAlgod(block_time=block_time, latency=latency)
+        self._thread: threading.Thread | None = None
+
+    @property
+    def address(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "LocalAlgodServer":
+        self._thread = threading.Thread(target=self.serve_forever, name="local-algod-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        self.node.close()
+
+
+def serve(port: int = 4001, block_time: float = 4.0, latency: float = 0.0, accounts: int = 3):
+    from algosdk import mnemonic
+    from algosdk.constants import microalgos_to_algos_ratio as algo
+
+    server = LocalAlgodServer(port=port, block_time=block_time, latency=latency)
+    with server.node._cond:
+        keys = [server.node.ledger.new_account(10 ** 6 * algo) for _ in range(accounts)]
+    print(f"Local algod on {server.address} (token {TOKEN}), one block every {block_time}s")
+    for private_key, address in keys:
+        print(f"  {address}: {mnemonic.from_private_key(private_key)}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+# Client throughput over HTTP: deploys BorrowMyNFT through the compile endpoint, lists an NFT and places
+# `bids` bids one after the other with the stock AlgodClient and with PooledAlgodClient.
+def benchmark(bids=200, latency=0.001):
+    import time
+
+    from algosdk.atomic_transaction_composer import (
+        AccountTransactionSigner,
+        AtomicTransactionComposer,
+        TransactionWithSigner,
+    )
+    from algosdk.constants import microalgos_to_algos_ratio as algo
+    from algosdk.future import transaction
+    from algosdk.v2client import algod
+
+    from src import utils
+    from src.algod_pool import PooledAlgodClient
+    from src.light_client import LightClient
+    from src.params import SuggestedParamsProvider
+
+    server = LocalAlgodServer(latency=latency).start()
+    with server.node._cond:
+        owner_key, owner = server.node.ledger.new_account(1000 * algo)
+        borrower_key, borrower = server.node.ledger.new_account(1000 * algo)
+        lender_key, lender = server.node.ledger.new_account(10 ** 6 * algo)
+    for name, client in (("AlgodClient", algod.AlgodClient(TOKEN, server.address)),
+                         ("PooledAlgodClient", PooledAlgodClient(TOKEN, server.address))):
+        params = SuggestedParamsProvider(client)
+        owner_client = LightClient(client, signer=AccountTransactionSigner(owner_key), suggested_params=params.get())
+        app_id, app_addr, _ = owner_client.create()
+        owner_client.fund(algo // 10)
+        asset_id = utils.create_default_nft(client, borrower_key, borrower, "G3 NFT@arc3", "G3",
+                                            utils.nft_metadata_github_url)
+        borrower_client = LightClient(client, app_id, AccountTransactionSigner(borrower_key))
+        atc = borrower_client.add_method_call(
+            AtomicTransactionComposer(), "list_nft", suggested_params=params.for_method("list_nft"),
+            nft=asset_id, auction_base=1000, auction_period=100000, payback_deadline=10,
+            payment=TransactionWithSigner(transaction.PaymentTxn(borrower, params.get(), app_addr, algo // 10),
+                                          borrower_client.signer))
+        atc.add_transaction(TransactionWithSigner(
+            transaction.AssetTransferTxn(borrower, params.get(), app_addr, 1, asset_id), borrower_client.signer))
+        atc.execute(client, 4)
+
+        lender_client = LightClient(client, app_id, AccountTransactionSigner(lender_key))
+        start = time.perf_counter()
+        for i in range(bids):
+            payment = TransactionWithSigner(
+                transaction.PaymentTxn(lender, params.get(), app_addr, 2000 + i), lender_client.signer)
+            lender_client.call("place_bid", suggested_params=params.for_method("place_bid"), payment=payment,
+                               accounts=[lender] if i else None)
+        elapsed = time.perf_counter() - start
+        print(f"{name}: {bids} confirmed place_bid calls over HTTP in {elapsed:.2f}s ({bids / elapsed:.0f} calls/s)")
+    print(f"{server.node.requests} requests served, last round {server.node.ledger.round}")
+    server.stop()
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["serve"]:
+        serve(*(f(a) for f, a in zip((int, float, float), sys.argv[2:])))
+    else:
+        benchmark()
@@ -0,0 +1,102 @@
+# Bulk NFT minting.
+# utils.create_default_nft mints one NFT per call and waits for its confirmation, so a collection of n NFTs
+# takes n rounds. mint_nfts packs up to 16 AssetConfigTxn per atomic group (the protocol limit), signs the
+# groups once with shared suggested params and the cached metadata hash, keeps several groups in flight,
+# and collects every created asset id in one confirmation pass (src/groups.py).
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+from algosdk.atomic_transaction_composer import TransactionSigner
+from algosdk.constants import tx_group_limit
+from algosdk.future import transaction
+from algosdk.v2client import algod
+
+from src import groups, rounds, utils
+from src.groups import MAX_IN_FLIGHT
+from src.params import SuggestedParamsProvider
+
+
+@dataclass
+class NFT:
+    asset_name: str
+    unit_name: str
+    url: str = utils.nft_metadata_github_url
+
+
+def nft_txn(sender: str, sp: transaction.SuggestedParams, nft: NFT, note: bytes) -> transaction.AssetConfigTxn:
+    # same parameters as utils.create_default_nft: no manager, reserve, freeze or clawback
+    return transaction.AssetConfigTxn(
+        sender=sender,
+        sp=sp,
+        total=1,
+        decimals=0,
+        default_frozen=False,
+        unit_name=nft.unit_name,
+        asset_name=nft.asset_name,
+        url=nft.url,
+        metadata_hash=utils.nft_metadata_hash(),
+        note=note,
+        strict_empty_address_check=False,
+        manager="",
+        reserve="",
+        freeze="",
+        clawback="",
+    )
+
+
+def mint_nfts(
+    client: algod.AlgodClient,
+    signer: TransactionSigner,
+    sender: str,
+    nfts: list[NFT],
+    params: SuggestedParamsProvider = None,
+    max_in_flight: int = MAX_IN_FLIGHT,
+) -> list[int]:
+    """Mints the NFTs in groups of 16; returns their asset ids in the same order"""
+    sp = (params or SuggestedParamsProvider(client)).get()
+    # the index in the note keeps identical NFTs from producing identical transactions
+    txns = [nft_txn(sender, sp, nft, b"NFT creation %d" % i) for i, nft in enumerate(nfts)]
+    groups.send_and_confirm(client, groups.sign_in_groups(txns, signer), max_in_flight)
+    # the asset id of every transaction, the groups being committed as a whole
+    with ThreadPoolExecutor(max_in_flight, thread_name_prefix="mint") as executor:
+        infos = executor.map(client.pending_transaction_info, [txn.get_txid() for txn in txns])
+        return [info["asset-index"] for info in infos]
+
+
+# Mints `count` NFTs on the local algod stand-in (one block every block_time seconds) one by one as
+# utils.create_default_nft does, and with mint_nfts.
+def benchmark(count=64, block_time=0.1, latency=0.005):
+    import time
+
+    from algosdk.atomic_transaction_composer import AccountTransactionSigner
+    from algosdk.constants import microalgos_to_algos_ratio as algo
+
+    from src.local_algod import LocalAlgod
+
+    node = LocalAlgod(block_time=block_time, latency=latency)
+    with node._cond:
+        private_key, address = node.ledger.new_account(100 * algo)
+    nfts = [NFT(f"G3 NFT {i}@arc3", "G3") for i in range(count)]
+
+    start, requests, first_round = time.perf_counter(), node.requests, node.ledger.round
+    sequential = [utils.create_default_nft(node, private_key, address, nft.asset_name, nft.unit_name, nft.url)
+                  for nft in nfts[:count // 8]]
+    sequential_time = (time.perf_counter() - start) * 8
+    sequential_rounds = (node.ledger.round - first_round) * 8
+    sequential_requests = (node.requests - requests) * 8
+
+    start, requests, first_round = time.perf_counter(), node.requests, node.ledger.round
+    asset_ids = mint_nfts(node, AccountTransactionSigner(private_key), address, nfts)
+    bulk_time = time.perf_counter() - start
+    assert len(set(asset_ids)) == count and all(node.ledger.asset_balance(address, a) == 1 for a in asset_ids)
+    assert len(sequential) == count // 8
+    print(f"one by one (extrapolated from {count // 8}): {sequential_time:.2f}s, {sequential_rounds} rounds, "
+          f"{sequential_requests} requests")
+    print(f"mint_nfts: {bulk_time:.2f}s, {node.ledger.round - first_round} rounds, {node.requests - requests} "
+          f"requests for {count} NFTs in {-(-count // tx_group_limit)} groups")
+    rounds.watcher_for(node).stop()
+    node.close()
+
+
+if __name__ == "__main__":
+    benchmark()
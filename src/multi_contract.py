@@ -0,0 +1,407 @@
+from pyteal import *
+from beaker import *
+from typing import Final
+
+from src import loan_record as record
+from src.contract import BorrowMyNFT
+from src.loan_record import get_address, get_uint, set_address, set_uint
+
+
+class BorrowMyNFTs(Application):
+    """BorrowMyNFT serving many NFTs at once: every loan lives in its own box, named by the NFT id, and
+    every method addresses a loan through its NFT."""
+
+    escrowed_bids: Final[ApplicationStateValue] = ApplicationStateValue(
+        stack_type=TealType.uint64,
+        default=Int(0),
+        descr="Sum of the highest bids held by the contract while auctions are open",
+    )
+    loan_count: Final[ApplicationStateValue] = ApplicationStateValue(
+        stack_type=TealType.uint64,
+        default=Int(0),
+        descr="Number of loan boxes currently stored",
+    )
+
+    MIN_BAL = BorrowMyNFT.MIN_BAL
+    # minimum balance a loan box adds to the contract, paid by the borrower when listing
+    BOX_MIN_BAL = Int(record.BOX_MIN_BALANCE)
+    FEE = BorrowMyNFT.FEE
+    INTEREST_RATE_DEN = BorrowMyNFT.INTEREST_RATE_DEN
+    INTEREST_RATE_CONTRACT_DEN = BorrowMyNFT.INTEREST_RATE_CONTRACT_DEN
+    MAX_PAYBACK_DEADLINE = BorrowMyNFT.MAX_PAYBACK_DEADLINE
+    MAX_AUCTION_PERIOD = BorrowMyNFT.MAX_AUCTION_PERIOD
+    MAX_N_ALGOS = BorrowMyNFT.MAX_N_ALGOS
+
+    @create
+    def create(self):
+        """Deploys the contract and intialize app states"""
+        return self.initialize_application_state()
+
+    @delete(authorize=Authorize.only(Global.creator_address()))
+    def delete(self):
+        """Enable deletion only if no loan is stored"""
+        return Seq(
+            Assert(
+                self.loan_count == Int(0),
+                Txn.fee() >= self.FEE * Int(2),
+            ),
+            self.pay_out(Balance(self.address) - MinBalance(self.address)),
+        )
+
+    @external
+    def health(self, *, output: abi.String):
+        """Returns the contract health"""
+        return output.set(Bytes("Contract is up and running!"))
+
+    @internal(TealType.none)
+    def pay_out(self, amount: Expr):
+        return InnerTxnBuilder.Execute({
+            TxnField.type_enum: TxnType.Payment,
+            TxnField.receiver: Txn.sender(),
+            TxnField.amount: amount,
+            TxnField.fee: Int(0),
+        })
+
+    # Box access: the caller references the box of the NFT (boxes=[(app_id, loan_key(nft_id))])
+    @staticmethod
+    def has_loan(nft_id: Expr) -> Expr:
+        return Seq(length := App.box_length(Itob(nft_id)), length.hasValue())
+
+    @staticmethod
+    def load_loan(nft_id: Expr, loan: ScratchVar) -> Expr:
+        box = App.box_get(Itob(nft_id))
+        return Seq(box, Assert(box.hasValue()), loan.store(box.value()))
+
+    @staticmethod
+    def store_loan(nft_id: Expr, loan: ScratchVar) -> Expr:
+        return App.box_put(Itob(nft_id), loan.load())
+
+    # Returns the NFT to receiver (closing the contract holding), optionally refunds the lender, and
+    # deletes the loan box (its minimum balance goes back to the contract fees)
+    @internal(TealType.none)
+    def close_loan(self, nft_id: Expr, receiver: Expr, refund: Expr, lender: Expr):
+        return Seq(
+            InnerTxnBuilder.Begin(),
+            InnerTxnBuilder.SetFields({
+                TxnField.type_enum: TxnType.AssetTransfer,
+                TxnField.xfer_asset: nft_id,
+                TxnField.asset_amount: Int(1),
+                TxnField.asset_receiver: receiver,
+                TxnField.asset_close_to: receiver,
+                TxnField.fee: Int(0),
+            }),
+            If(refund > Int(0)).Then(Seq(
+                InnerTxnBuilder.Next(),
+                InnerTxnBuilder.SetFields({
+                    TxnField.type_enum: TxnType.Payment,
+                    TxnField.amount: refund,
+                    TxnField.receiver: lender,
+                    TxnField.fee: Int(0),
+                }),
+            )),
+            InnerTxnBuilder.Submit(),
+            Pop(App.box_delete(Itob(nft_id))),
+            self.loan_count.decrement(),
+        )
+
+    # Collected fees: everything above the minimum balance that is not an open bid
+    @external(authorize=Authorize.only(Global.creator_address()))
+    def pay_me(self):
+        fees = Balance(self.address) - MinBalance(self.address) - self.escrowed_bids
+        return Seq(
+            Assert(
+                Txn.fee() >= self.FEE * Int(2),
+                fees > Int(0),
+            ),
+            self.pay_out(fees),
+        )
+
+    @external
+    def provide_access_to_nft(self, nft: abi.Asset, payment: abi.PaymentTransaction):
+        return Seq(
+            Assert(
+                Global.group_size() == Int(2),
+                Txn.fee() >= self.FEE * Int(3),
+                payment.get().receiver() == self.address,
+                payment.get().amount() >= self.MIN_BAL,
+                Not(self.has_loan(nft.asset_id())),
+            ),
+            InnerTxnBuilder.Execute({
+                TxnField.type_enum: TxnType.AssetTransfer,
+                TxnField.xfer_asset: nft.asset_id(),
+                TxnField.asset_receiver: self.address,
+                TxnField.fee: Int(0),
+                TxnField.asset_amount: Int(0),
+            }),
+        )
+
+    # open_loan checks the NFT parameters and the auction inputs, then creates the loan box of the NFT
+    # (state 1). asset is the reference used to read the asset parameters (foreign assets index or id).
+    # Shared by set_offer and list_nft
+    def open_loan(self, asset: Expr, nft_id: Expr, auction_base: abi.Uint64, auction_period: abi.Uint64,
+                  payback_deadline: abi.Uint64):
+        asset_manager = AssetParam.manager(asset)
+        asset_clawback = AssetParam.clawback(asset)
+        asset_freeze = AssetParam.freeze(asset)
+        return Seq(
+            asset_manager,
+            asset_clawback,
+            asset_freeze,
+            Assert(
+                # check NFT has no dangerous fields set
+                asset_manager.value() == Global.zero_address(),
+                asset_clawback.value() == Global.zero_address(),
+                asset_freeze.value() == Global.zero_address(),
+                # checking inputs
+                auction_base.get() > Int(0),
+                auction_base.get() < self.MAX_N_ALGOS,
+                auction_period.get() > Int(0),
+                auction_period.get() < self.MAX_AUCTION_PERIOD,
+                payback_deadline.get() > Int(0),
+                payback_deadline.get() < self.MAX_PAYBACK_DEADLINE,
+                # one box per NFT: box_create returns 0 if it already exists
+                App.box_create(Itob(nft_id), Int(record.RECORD_SIZE)),
+            ),
+            App.box_put(Itob(nft_id), Concat(
+                Txn.sender(),                                        # borrower_address
+                Global.zero_address(),                               # lender_address
+                Itob(Int(0)),                                        # highest_bid
+                Itob(auction_base.get()),                            # auction_base
+                Itob(Global.round() + auction_period.get()),         # auction_period
+                Itob(payback_deadline.get()),                        # payback_deadline
+                Itob(Int(0)),                                        # last_interest_update_block
+                Itob(Int(0)),                                        # debt_left
+                Itob(Int(1)),                                        # state
+            )),
+            self.loan_count.increment(),
+        )
+
+    # 3 transactions are checked: the payment for the loan box minimum balance, the NFT transfer and the
+    # set_offer call
+    @external
+    def set_offer(
+            self,
+            payment: abi.PaymentTransaction,
+            asset_xfer: abi.AssetTransferTransaction,
+            auction_base: abi.Uint64,
+            auction_period: abi.Uint64,
+            payback_deadline: abi.Uint64
+    ):
+        return Seq(
+            Assert(
+                Global.group_size() == Int(3),
+                payment.get().receiver() == self.address,
+                payment.get().amount() >= self.BOX_MIN_BAL,
+                # check asset transfer is correct
+                asset_xfer.get().asset_receiver() == self.address,
+                asset_xfer.get().asset_amount() == Int(1),
+                asset_xfer.get().sender() == Txn.sender(),
+                Txn.assets[0] == asset_xfer.get().xfer_asset(),
+            ),
+            self.open_loan(Int(0), asset_xfer.get().xfer_asset(), auction_base, auction_period, payback_deadline),
+        )
+
+    # list_nft does provide_access_to_nft and set_offer in a single atomic group of 3 transactions: the
+    # payment for the contract minimum balances (NFT holding and loan box), the list_nft call (the contract
+    # opts in to the NFT) and, right after it, the NFT transfer to the contract
+    @external
+    def list_nft(
+            self,
+            payment: abi.PaymentTransaction,
+            nft: abi.Asset,
+            auction_base: abi.Uint64,
+            auction_period: abi.Uint64,
+            payback_deadline: abi.Uint64
+    ):
+        nft_xfer = Gtxn[Txn.group_index() + Int(1)]
+        return Seq(
+            Assert(
+                Global.group_size() == Int(3),
+                Txn.fee() >= self.FEE * Int(2),
+                payment.get().receiver() == self.address,
+                payment.get().amount() >= self.MIN_BAL + self.BOX_MIN_BAL,
+                # check the NFT transfer following this call
+                nft_xfer.type_enum() == TxnType.AssetTransfer,
+                nft_xfer.xfer_asset() == nft.asset_id(),
+                nft_xfer.asset_receiver() == self.address,
+                nft_xfer.asset_amount() == Int(1),
+                nft_xfer.sender() == Txn.sender(),
+            ),
+            InnerTxnBuilder.Execute({
+                TxnField.type_enum: TxnType.AssetTransfer,
+                TxnField.xfer_asset: nft.asset_id(),
+                TxnField.asset_receiver: self.address,
+                TxnField.fee: Int(0),
+                TxnField.asset_amount: Int(0),
+            }),
+            self.open_loan(nft.asset_id(), nft.asset_id(), auction_base, auction_period, payback_deadline),
+        )
+
+    @external
+    def place_bid(self, nft: abi.Asset, payment: abi.PaymentTransaction):
+        loan = ScratchVar(TealType.bytes)
+        highest_bid = get_uint(loan, record.HIGHEST_BID)
+        return Seq(
+            self.load_loan(nft.asset_id(), loan),
+            Assert(
+                Global.group_size() == Int(2),
+                Txn.fee() >= self.FEE * Int(3),
+                get_uint(loan, record.STATE) == Int(1),
+                payment.get().receiver() == self.address,
+                payment.get().amount() > highest_bid,
+                payment.get().amount() > get_uint(loan, record.AUCTION_BASE),
+                payment.get().amount() <= self.MAX_N_ALGOS,
+                Global.round() <= get_uint(loan, record.AUCTION_PERIOD),
+            ),
+            If(highest_bid > Int(0)).Then(
+                InnerTxnBuilder.Execute({
+                    TxnField.type_enum: TxnType.Payment,
+                    TxnField.amount: highest_bid,
+                    TxnField.receiver: get_address(loan, record.LENDER_ADDRESS),
+                    TxnField.fee: Int(0),
+                })
+            ),
+            self.escrowed_bids.set(self.escrowed_bids - highest_bid + payment.get().amount()),
+            set_uint(loan, record.HIGHEST_BID, payment.get().amount()),
+            set_address(loan, record.LENDER_ADDRESS, payment.get().sender()),
+            self.store_loan(nft.asset_id(), loan),
+        )
+
+    @external
+    def accept_bid(self, nft: abi.Asset):
+        loan = ScratchVar(TealType.bytes)
+        highest_bid = get_uint(loan, record.HIGHEST_BID)
+        return Seq(
+            self.load_loan(nft.asset_id(), loan),
+            Assert(
+                Txn.fee() >= self.FEE * Int(2),
+                Txn.sender() == get_address(loan, record.BORROWER_ADDRESS),
+                highest_bid > Int(0),
+                get_uint(loan, record.STATE) == Int(1),
+            ),
+            InnerTxnBuilder.Execute({
+                TxnField.type_enum: TxnType.Payment,
+                TxnField.amount: highest_bid - highest_bid / self.INTEREST_RATE_CONTRACT_DEN,
+                TxnField.receiver: Txn.sender(),
+                TxnField.fee: Int(0),
+            }),
+            self.escrowed_bids.set(self.escrowed_bids - highest_bid),
+            set_uint(loan, record.STATE, Int(2)),
+            set_uint(loan, record.DEBT_LEFT, highest_bid),
+            set_uint(loan, record.LAST_INTEREST_UPDATE_BLOCK, Global.round()),
+            set_uint(loan, record.PAYBACK_DEADLINE, Global.round() + get_uint(loan, record.PAYBACK_DEADLINE)),
+            self.store_loan(nft.asset_id(), loan),
+        )
+
+    # returns the NFT to the borrower and the highest bid to the lender
+    def _unwind_auction(self, nft: abi.Asset, loan: ScratchVar):
+        highest_bid = get_uint(loan, record.HIGHEST_BID)
+        return Seq(
+            self.escrowed_bids.set(self.escrowed_bids - highest_bid),
+            self.close_loan(
+                nft.asset_id(),
+                get_address(loan, record.BORROWER_ADDRESS),
+                highest_bid,
+                get_address(loan, record.LENDER_ADDRESS),
+            ),
+        )
+
+    @external
+    def timeout(self, nft: abi.Asset):
+        loan = ScratchVar(TealType.bytes)
+        return Seq(
+            self.load_loan(nft.asset_id(), loan),
+            Assert(
+                Txn.fee() >= self.FEE * Int(3),
+                get_uint(loan, record.STATE) == Int(1),
+                Global.round() > get_uint(loan, record.AUCTION_PERIOD),
+            ),
+            self._unwind_auction(nft, loan),
+        )
+
+    @external
+    def cancel_offer(self, nft: abi.Asset):
+        loan = ScratchVar(TealType.bytes)
+        return Seq(
+            self.load_loan(nft.asset_id(), loan),
+            Assert(
+                Txn.sender() == get_address(loan, record.BORROWER_ADDRESS),
+                get_uint(loan, record.STATE) == Int(1),
+                Txn.fee() >= self.FEE * Int(3),
+            ),
+            self._unwind_auction(nft, loan),
+        )
+
+    @external
+    def pay_back(self, nft: abi.Asset, payment: abi.PaymentTransaction):
+        loan = ScratchVar(TealType.bytes)
+        debt = ScratchVar(TealType.uint64)
+        amount = payment.get().amount()
+        lender = get_address(loan, record.LENDER_ADDRESS)
+        # interest=debt_left*blocks/INTEREST_RATE_DEN, as in BorrowMyNFT
+        interest = (get_uint(loan, record.DEBT_LEFT)
+                    * (Global.round() - get_uint(loan, record.LAST_INTEREST_UPDATE_BLOCK))
+                    / self.INTEREST_RATE_DEN)
+        pay = lambda receiver, value: {
+            TxnField.type_enum: TxnType.Payment,
+            TxnField.amount: value,
+            TxnField.receiver: receiver,
+            TxnField.fee: Int(0),
+        }
+        return Seq(
+            self.load_loan(nft.asset_id(), loan),
+            Assert(
+                Global.group_size() == Int(2),
+                Txn.fee() >= self.FEE * Int(5),
+                get_uint(loan, record.STATE) == Int(2),
+                payment.get().receiver() == self.address,
+                amount >= interest,
+            ),
+            debt.store(get_uint(loan, record.DEBT_LEFT) + interest),
+            If(amount >= debt.load()).Then(Seq(
+                # full repayment: refund the excess, pay the lender, give the NFT back
+                If(amount > debt.load()).Then(
+                    InnerTxnBuilder.Execute(pay(Txn.sender(), amount - debt.load()))
+                ),
+                InnerTxnBuilder.Execute(pay(lender, debt.load())),
+                self.close_loan(nft.asset_id(), get_address(loan, record.BORROWER_ADDRESS), Int(0), lender),
+            )).Else(Seq(
+                # partial repayment
+                InnerTxnBuilder.Execute(pay(lender, amount)),
+                set_uint(loan, record.DEBT_LEFT, debt.load() - amount),
+                set_uint(loan, record.LAST_INTEREST_UPDATE_BLOCK, Global.round()),
+                self.store_loan(nft.asset_id(), loan),
+            )),
+        )
+
+    @external
+    def loan_expired(self, nft: abi.Asset):
+        loan = ScratchVar(TealType.bytes)
+        return Seq(
+            self.load_loan(nft.asset_id(), loan),
+            Assert(
+                Txn.sender() == get_address(loan, record.LENDER_ADDRESS),
+                Txn.fee() >= self.FEE * Int(2),
+                get_uint(loan, record.STATE) == Int(2),
+                Global.round() >= get_uint(loan, record.PAYBACK_DEADLINE),
+            ),
+            self.close_loan(nft.asset_id(), Txn.sender(), Int(0), Txn.sender()),
+        )
+
+
+# utility to write the teal code to file for debugging purposes
+if __name__ == "__main__":
+    import os
+    import json
+
+    path = os.path.dirname(os.path.abspath(__file__))
+
+    app = BorrowMyNFTs()
+
+    with open(os.path.join(path, "multi_contract.json"), "w") as f:
+        f.write(json.dumps(app.application_spec(), indent=2))
+
+    with open(os.path.join(path, "multi_approval.teal"), "w") as f:
+        f.write(app.approval_program)
+    with open(os.path.join(path, "multi_clear.teal"), "w") as f:
+        f.write(app.clear_program)
@@ -0,0 +1,369 @@
+from pyteal import *
+from beaker import *
+from typing import Final
+
+from src import loan_record as record
+from src.contract import BorrowMyNFT
+from src.loan_record import get_address, get_uint, set_address, set_uint
+
+
+class BorrowMyNFTPacked(Application):
+    """Same ABI and behaviour as BorrowMyNFT, with the loan packed in a single global state value
+    (src/loan_record.py layout) instead of ten separate keys."""
+
+    nft_id: Final[ApplicationStateValue] = ApplicationStateValue(
+        stack_type=TealType.uint64,
+        descr="A handle to retrieve the correct NFT",
+    )
+    # key + value must fit in 128 bytes, so the NFT id keeps its own key
+    loan: Final[ApplicationStateValue] = ApplicationStateValue(
+        stack_type=TealType.bytes,
+        descr="Packed loan record, empty while no offer is set (state 0)",
+    )
+
+    MIN_BAL = BorrowMyNFT.MIN_BAL
+    FEE = BorrowMyNFT.FEE
+    INTEREST_RATE_DEN = BorrowMyNFT.INTEREST_RATE_DEN
+    INTEREST_RATE_CONTRACT_DEN = BorrowMyNFT.INTEREST_RATE_CONTRACT_DEN
+    MAX_PAYBACK_DEADLINE = BorrowMyNFT.MAX_PAYBACK_DEADLINE
+    MAX_AUCTION_PERIOD = BorrowMyNFT.MAX_AUCTION_PERIOD
+    MAX_N_ALGOS = BorrowMyNFT.MAX_N_ALGOS
+
+    # state of the loan: 0 when no record is stored
+    def state_of(self, loan: ScratchVar) -> Expr:
+        return If(Len(loan.load()) == Int(0), Int(0), get_uint(loan, record.STATE))
+
+    @create
+    def create(self):
+        """Deploys the contract and intialize app states"""
+        return self.initialize_application_state()
+
+    @delete(authorize=Authorize.only(Global.creator_address()))
+    def delete(self):
+        """Enable deletion only if state is 0 = initial"""
+        return Seq(
+            Assert(
+                Len(self.loan) == Int(0),
+                Balance(self.address) != Int(0),
+            ),
+            self.pay_me_internal(),
+        )
+
+    @external
+    def health(self, *, output: abi.String):
+        """Returns the contract health"""
+        return output.set(Bytes("Contract is up and running!"))
+
+    # Reset state empties the loan record: two writes instead of ten
+    @internal(TealType.none)
+    def reset_state(self):
+        return Seq(
+            self.loan.set(Bytes("")),
+            self.nft_id.set(Int(0)),
+        )
+
+    @internal(TealType.none)
+    def pay_me_internal(self):
+        loan = ScratchVar(TealType.bytes)
+        return Seq(
+            loan.store(self.loan),
+            Assert(
+                Txn.fee() >= Global.min_txn_fee() * Int(2),
+                self.state_of(loan) != Int(1),
+            ),
+            InnerTxnBuilder.Execute({
+                TxnField.type_enum: TxnType.Payment,
+                TxnField.receiver: Txn.sender(),
+                TxnField.amount: Balance(self.address) - MinBalance(self.address),
+                TxnField.fee: Int(0)
+            })
+        )
+
+    @external(authorize=Authorize.only(Global.creator_address()))
+    def pay_me(self):
+        return Seq(
+            Assert(
+                Balance(self.address) > MinBalance(self.address)
+            ),
+            self.pay_me_internal()
+        )
+
+    @external
+    def provide_access_to_nft(self, nft: abi.Asset, payment: abi.PaymentTransaction):
+        return Seq(
+            Assert(
+                Global.group_size() == Int(2),
+                Txn.fee() >= self.FEE * Int(3),
+                payment.get().receiver() == self.address,
+                payment.get().amount() >= self.MIN_BAL,
+            ),
+            InnerTxnBuilder.Execute({
+                TxnField.type_enum: TxnType.AssetTransfer,
+                TxnField.xfer_asset: nft.asset_id(),
+                TxnField.asset_receiver: self.address,
+                TxnField.fee: Int(0),
+                TxnField.asset_amount: Int(0),
+            }),
+        )
+
+    @external
+    def set_offer(
+            self,
+            asset_xfer: abi.AssetTransferTransaction,
+            auction_base: abi.Uint64,
+            auction_period: abi.Uint64,
+            payback_deadline: abi.Uint64
+    ):
+        asset_manager = AssetParam.manager(Int(0))
+        asset_clawback = AssetParam.clawback(Int(0))
+        asset_freeze = AssetParam.freeze(Int(0))
+        return Seq(
+            asset_manager,
+            asset_clawback,
+            asset_freeze,
+            Assert(
+                Global.group_size() == Int(2),
+                # check asset transfer is correct
+                asset_xfer.get().asset_receiver() == self.address,
+                asset_xfer.get().asset_amount() == Int(1),
+                asset_xfer.get().sender() == Txn.sender(),
+                # check NFT has no dangerous fields set
+                Txn.assets[0] == asset_xfer.get().xfer_asset(),
+                asset_manager.value() == Global.zero_address(),
+                asset_clawback.value() == Global.zero_address(),
+                asset_freeze.value() == Global.zero_address(),
+                # check state correctness
+                Len(self.loan) == Int(0),
+                # checking inputs
+                auction_base.get() > Int(0),
+                auction_base.get() < self.MAX_N_ALGOS,
+                auction_period.get() > Int(0),
+                auction_period.get() < self.MAX_AUCTION_PERIOD,
+                payback_deadline.get() > Int(0),
+                payback_deadline.get() < self.MAX_PAYBACK_DEADLINE,
+            ),
+            self.nft_id.set(asset_xfer.get().xfer_asset()),
+            self.loan.set(Concat(
+                Txn.sender(),                                        # borrower_address
+                Global.zero_address(),                               # lender_address
+                Itob(Int(0)),                                        # highest_bid
+                Itob(auction_base.get()),                            # auction_base
+                Itob(Global.round() + auction_period.get()),         # auction_period
+                Itob(payback_deadline.get()),                        # payback_deadline
+                Itob(Int(0)),                                        # last_interest_update_block
+                Itob(Int(0)),                                        # debt_left
+                Itob(Int(1)),                                        # state
+            )),
+        )
+
+    @external
+    def place_bid(self, payment: abi.PaymentTransaction):
+        loan = ScratchVar(TealType.bytes)
+        highest_bid = get_uint(loan, record.HIGHEST_BID)
+        return Seq(
+            loan.store(self.loan),
+            Assert(
+                Global.group_size() == Int(2),
+                Txn.fee() >= Global.min_txn_fee() * Int(3),
+                self.state_of(loan) == Int(1),
+                payment.get().receiver() == self.address,
+                payment.get().amount() > highest_bid,
+                payment.get().amount() > get_uint(loan, record.AUCTION_BASE),
+                payment.get().amount() <= self.MAX_N_ALGOS,
+                Global.round() <= get_uint(loan, record.AUCTION_PERIOD),
+            ),
+            If(highest_bid > Int(0)).Then(
+                InnerTxnBuilder.Execute({
+                    TxnField.type_enum: TxnType.Payment,
+                    TxnField.amount: highest_bid,
+                    TxnField.receiver: get_address(loan, record.LENDER_ADDRESS),
+                    TxnField.fee: Int(0)
+                })
+            ),
+            set_uint(loan, record.HIGHEST_BID, payment.get().amount()),
+            set_address(loan, record.LENDER_ADDRESS, payment.get().sender()),
+            self.loan.set(loan.load()),
+        )
+
+    @external
+    def accept_bid(self):
+        loan = ScratchVar(TealType.bytes)
+        highest_bid = get_uint(loan, record.HIGHEST_BID)
+        return Seq(
+            loan.store(self.loan),
+            Assert(
+                Txn.fee() >= Global.min_txn_fee() * Int(2),
+                Txn.sender() == get_address(loan, record.BORROWER_ADDRESS),
+                highest_bid > Int(0),
+                self.state_of(loan) == Int(1),
+            ),
+            InnerTxnBuilder.Execute({
+                TxnField.type_enum: TxnType.Payment,
+                TxnField.amount: highest_bid - highest_bid / self.INTEREST_RATE_CONTRACT_DEN,
+                TxnField.receiver: Txn.sender(),
+                TxnField.fee: Int(0)
+            }),
+            set_uint(loan, record.STATE, Int(2)),
+            set_uint(loan, record.DEBT_LEFT, highest_bid),
+            set_uint(loan, record.LAST_INTEREST_UPDATE_BLOCK, Global.round()),
+            set_uint(loan, record.PAYBACK_DEADLINE, Global.round() + get_uint(loan, record.PAYBACK_DEADLINE)),
+            self.loan.set(loan.load()),
+        )
+
+    # returns the NFT to the borrower and the highest bid (if any) to the lender
+    def unwind_auction(self, loan: ScratchVar):
+        highest_bid = get_uint(loan, record.HIGHEST_BID)
+        borrower = get_address(loan, record.BORROWER_ADDRESS)
+        return Seq(
+            InnerTxnBuilder.Begin(),
+            InnerTxnBuilder.SetFields({
+                TxnField.type_enum: TxnType.AssetTransfer,
+                TxnField.xfer_asset: self.nft_id,
+                TxnField.asset_amount: Int(1),
+                TxnField.asset_receiver: borrower,
+                TxnField.asset_close_to: borrower,
+                TxnField.fee: Int(0)
+            }),
+            If(highest_bid > Int(0)).Then(Seq(
+                InnerTxnBuilder.Next(),
+                InnerTxnBuilder.SetFields({
+                    TxnField.type_enum: TxnType.Payment,
+                    TxnField.amount: highest_bid,
+                    TxnField.receiver: get_address(loan, record.LENDER_ADDRESS),
+                    TxnField.fee: Int(0)
+                }),
+            )),
+            InnerTxnBuilder.Submit(),
+            self.reset_state(),
+        )
+
+    @external
+    def timeout(self):
+        loan = ScratchVar(TealType.bytes)
+        return Seq(
+            loan.store(self.loan),
+            Assert(
+                Txn.fee() >= Global.min_txn_fee() * Int(3),
+                self.state_of(loan) == Int(1),
+                Global.round() > get_uint(loan, record.AUCTION_PERIOD),
+            ),
+            self.unwind_auction(loan),
+        )
+
+    @external
+    def cancel_offer(self):
+        loan = ScratchVar(TealType.bytes)
+        return Seq(
+            loan.store(self.loan),
+            Assert(
+                Txn.sender() == get_address(loan, record.BORROWER_ADDRESS),
+                self.state_of(loan) == Int(1),
+                Txn.fee() >= Global.min_txn_fee() * Int(3),
+            ),
+            self.unwind_auction(loan),
+        )
+
+    @external
+    def pay_back(self, payment: abi.PaymentTransaction):
+        loan = ScratchVar(TealType.bytes)
+        debt = ScratchVar(TealType.uint64)
+        amount = payment.get().amount()
+        lender = get_address(loan, record.LENDER_ADDRESS)
+        borrower = get_address(loan, record.BORROWER_ADDRESS)
+        # interest=debt_left*INTEREST_RATE_NUM*blocks/INTEREST_RATE_DEN. Notice: INTEREST_RATE_NUM=1
+        interest = (get_uint(loan, record.DEBT_LEFT)
+                    * (Global.round() - get_uint(loan, record.LAST_INTEREST_UPDATE_BLOCK))
+                    / self.INTEREST_RATE_DEN)
+        pay = lambda receiver, value: {
+            TxnField.type_enum: TxnType.Payment,
+            TxnField.amount: value,
+            TxnField.receiver: receiver,
+            TxnField.fee: Int(0)
+        }
+        return Seq(
+            loan.store(self.loan),
+            Assert(
+                Global.group_size() == Int(2),
+                Txn.fee() >= Global.min_txn_fee() * Int(5),
+                self.state_of(loan) == Int(2),
+                payment.get().receiver() == self.address,
+                amount >= interest,
+            ),
+            debt.store(get_uint(loan, record.DEBT_LEFT) + interest),
+            If(amount >= debt.load()).Then(Seq(
+                InnerTxnBuilder.Begin(),
+                InnerTxnBuilder.SetFields(pay(lender, debt.load())),
+                #the borrower sent too many algos
+                If(amount > debt.load()).Then(Seq(
+                    InnerTxnBuilder.Next(),
+                    InnerTxnBuilder.SetFields(pay(Txn.sender(), amount - debt.load())),
+                )),
+                InnerTxnBuilder.Next(),
+                InnerTxnBuilder.SetFields({
+                    TxnField.type_enum: TxnType.AssetTransfer,
+                    TxnField.xfer_asset: self.nft_id,
+                    TxnField.asset_amount: Int(1),
+                    TxnField.asset_receiver: borrower,
+                    TxnField.asset_close_to: borrower,
+                    TxnField.fee: Int(0)
+                }),
+                InnerTxnBuilder.Submit(),
+                self.reset_state(),
+            #the borrower paid back a portion of the loan
+            )).Else(Seq(
+                InnerTxnBuilder.Execute(pay(lender, amount)),
+                set_uint(loan, record.DEBT_LEFT, debt.load() - amount),
+                set_uint(loan, record.LAST_INTEREST_UPDATE_BLOCK, Global.round()),
+                self.loan.set(loan.load()),
+            )),
+        )
+
+    @external
+    def loan_expired(self):
+        loan = ScratchVar(TealType.bytes)
+        return Seq(
+            loan.store(self.loan),
+            Assert(
+                Txn.sender() == get_address(loan, record.LENDER_ADDRESS),
+                Txn.fee() >= Global.min_txn_fee() * Int(2),
+                self.state_of(loan) == Int(2),
+                Global.round() >= get_uint(loan, record.PAYBACK_DEADLINE),
+            ),
+            InnerTxnBuilder.Execute({
+                TxnField.type_enum: TxnType.AssetTransfer,
+                TxnField.xfer_asset: self.nft_id,
+                TxnField.asset_amount: Int(1),
+                TxnField.asset_receiver: Txn.sender(),
+                TxnField.asset_close_to: Txn.sender(),
+                TxnField.fee: Int(0)
+            }),
+            self.reset_state(),
+        )
+
+    #utility to access the contract state
+    @external(read_only=True)
+    def read_state(self, *, output: abi.Uint64):
+        """Read current state."""
+        loan = ScratchVar(TealType.bytes)
+        return Seq(
+            loan.store(self.loan),
+            output.set(self.state_of(loan)),
+        )
+
+
+#utility to write the teal code to file for debugging purposes
+if __name__ == "__main__":
+    import os
+    import json
+
+    path = os.path.dirname(os.path.abspath(__file__))
+
+    app = BorrowMyNFTPacked()
+
+    with open(os.path.join(path, "packed_contract.json"), "w") as f:
+        f.write(json.dumps(app.application_spec(), indent=2))
+
+    with open(os.path.join(path, "packed_approval.teal"), "w") as f:
+        f.write(app.approval_program)
+    with open(os.path.join(path, "packed_clear.teal"), "w") as f:
+        f.write(app.clear_program)
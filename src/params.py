@@ -0,0 +1,79 @@
+# Shared suggested_params provider.
+# algod is asked for suggested params at most once per round (or once per configurable TTL); callers get
+# private copies with the flat fee each BorrowMyNFT method needs already applied, so a burst of bids or
+# repayments does not cost one HTTP round trip per transaction. The round is read from the shared round
+# watcher of the client (src/rounds.py) when params are handed out: no listener is registered, so an idle
+# watcher keeps sleeping ahead and the TTL alone applies.
+import copy
+import threading
+import time
+
+from algosdk.constants import min_txn_fee
+from algosdk.future import transaction
+from algosdk.v2client import algod
+
+# Average block time, used as the default TTL so that params are refreshed about once per round
+BLOCK_TIME = 4
+
+# Fee multipliers asserted by BorrowMyNFT (Txn.fee() >= min_txn_fee * n): one unit for the app call
+# itself plus one per inner transaction the method may issue
+METHOD_FEE_MULTIPLIERS = {
+    "provide_access_to_nft": 3,
+    "list_nft": 2,
+    "place_bid": 3,
+    "accept_bid": 2,
+    "timeout": 3,
+    "cancel_offer": 3,
+    "pay_back": 5,
+    "loan_expired": 2,
+    "pay_me": 2,
+    "delete": 2,
+}
+
+
+class SuggestedParamsProvider:
+    def __init__(self, client: algod.AlgodClient, ttl: float = BLOCK_TIME):
+        self.client = client
+        self.ttl = ttl
+        self._params: transaction.SuggestedParams | None = None
+        self._fetched_at = 0.0
+        self._lock = threading.Lock()
+        self.fetches = 0
+
+    def _current(self) -> transaction.SuggestedParams:
+        from src import rounds  # rounds -> block_time imports BLOCK_TIME from this module
+
+        last_round = rounds.watcher_for(self.client).last_round
+        if last_round is not None:
+            self.on_round(last_round)
+        with self._lock:
+            if self._params is None or time.monotonic() - self._fetched_at >= self.ttl:
+                self._params = self.client.suggested_params()
+                self._fetched_at = time.monotonic()
+                self.fetches += 1
+            return self._params
+
+    def invalidate(self):
+        with self._lock:
+            self._params = None
+
+    # Drop the cached params once the chain moves past the round they were fetched in
+    def on_round(self, last_round: int):
+        with self._lock:
+            if self._params is not None and last_round > self._params.first:
+                self._params = None
+
+    @property
+    def min_fee(self) -> int:
+        return max(getattr(self._current(), "min_fee", None) or min_txn_fee, min_txn_fee)
+
+    def get(self, fee: int = None) -> transaction.SuggestedParams:
+        """Returns a copy of the cached params, with a flat fee (default: the minimum fee)"""
+        sp = copy.copy(self._current())
+        sp.flat_fee = True
+        sp.fee = fee if fee is not None else self.min_fee
+        return sp
+
+    def for_method(self, method: str) -> transaction.SuggestedParams:
+        """Returns params whose flat fee covers the inner transactions of the given BorrowMyNFT method"""
+        return self.get(self.min_fee * METHOD_FEE_MULTIPLIERS.get(method, 1))
@@ -0,0 +1,257 @@
+# Vectorized debt and interest projection for loan portfolios.
+# Reproduces the uint64 integer math of BorrowMyNFT.pay_back over NumPy arrays of loans and rounds:
+#   interest = debt_left * (round - last_interest_update_block) / INTEREST_RATE_DEN  (integer division)
+# where, as in the AVM, a product or sum above 2^64 - 1 and a negative difference make the call fail
+# instead of wrapping. Payoff amounts of thousands of loans over every future round up to their
+# payback_deadline are computed as one array operation. `python -m src.projection` checks the engine
+# bit for bit against the TEAL interpreted by the simulator and times it against a per-loan loop.
+from dataclasses import dataclass
+
+import numpy as np
+
+# Same constants as BorrowMyNFT
+INTEREST_RATE_DEN = 1000000
+MAX_UINT64 = 2 ** 64 - 1
+# Fees of one pay_back group: the app call (5 minimum fees, asserted by the contract) and the payment
+MIN_TXN_FEE = 1000
+PAY_BACK_FEE = 6 * MIN_TXN_FEE
+
+U64 = np.uint64
+
+
+def _u64(values) -> np.ndarray:
+    return np.asarray(values, dtype=U64)
+
+
+def interest(debt_left, last_update, rounds) -> tuple[np.ndarray, np.ndarray]:
+    """Interest accrued at `rounds` (broadcast against the loans); returns (interest, ok).
+    ok is False where pay_back would fail evaluating it (round before the last update, or uint64 overflow)"""
+    debt_left, last_update, rounds = np.broadcast_arrays(_u64(debt_left), _u64(last_update), _u64(rounds))
+    ok = rounds >= last_update
+    blocks = np.where(ok, rounds - last_update, U64(0))
+    # debt_left * blocks overflows exactly when debt_left > MAX_UINT64 // blocks
+    safe_blocks = np.maximum(blocks, U64(1))
+    ok &= (blocks == 0) | (debt_left <= U64(MAX_UINT64) // safe_blocks)
+    product = np.where(ok, debt_left * np.where(ok, blocks, U64(0)), U64(0))
+    return product // U64(INTEREST_RATE_DEN), ok
+
+
+def payoff(debt_left, last_update, rounds) -> tuple[np.ndarray, np.ndarray]:
+    """Exact full repayment amount (debt_left + interest) at `rounds`; returns (amount, ok)"""
+    debt_left = _u64(debt_left)
+    accrued, ok = interest(debt_left, last_update, rounds)
+    debt_left = np.broadcast_to(debt_left, accrued.shape)
+    ok &= accrued <= U64(MAX_UINT64) - debt_left
+    return np.where(ok, debt_left + np.where(ok, accrued, U64(0)), U64(0)), ok
+
+
+@dataclass
+class PayBackOutcome:
+    debt_left: np.ndarray  # debt after the call (0 when repaid)
+    last_update: np.ndarray  # last_interest_update_block after the call
+    to_lender: np.ndarray  # inner payment to the lender
+    refund: np.ndarray  # inner payment back to the borrower
+    repaid: np.ndarray  # the NFT goes back to the borrower
+    ok: np.ndarray  # False: the call fails (assert or uint64 error) and nothing changes
+
+
+def pay_back(debt_left, last_update, amount, rounds) -> PayBackOutcome:
+    """State transition of pay_back(amount) evaluated at `rounds`, for arrays of loans"""
+    debt_left, last_update, amount, rounds = np.broadcast_arrays(
+        _u64(debt_left), _u64(last_update), _u64(amount), _u64(rounds))
+    due, ok = payoff(debt_left, last_update, rounds)
+    accrued = due - debt_left
+    ok &= amount >= accrued
+    repaid = ok & (amount >= due)
+    partial = ok & ~repaid
+    zero = U64(0)
+    return PayBackOutcome(
+        debt_left=np.where(repaid, zero, np.where(partial, due - np.where(partial, amount, zero), debt_left)),
+        last_update=np.where(partial, rounds, last_update),
+        to_lender=np.where(repaid, due, np.where(partial, amount, zero)),
+        refund=np.where(repaid, amount - np.where(repaid, due, zero), zero),
+        repaid=repaid,
+        ok=ok,
+    )
+
+
+def project(debt_left, last_update, payback_deadline, start_round: int, horizon: int):
+    """Payoff matrix (loans x rounds) from start_round over `horizon` rounds.
+    Returns (rounds, amounts, valid): valid is False past a loan's payback_deadline (the lender can claim
+    the NFT from that round) and where pay_back would fail"""
+    rounds = np.arange(start_round, start_round + horizon, dtype=U64)
+    amounts, ok = payoff(_u64(debt_left)[:, None], _u64(last_update)[:, None], rounds[None, :])
+    valid = ok & (rounds[None, :] < _u64(payback_deadline)[:, None])
+    return rounds, amounts, valid
+
+
+@dataclass
+class Payment:
+    round: int
+    amount: int
+    repays: bool
+
+
+def simulate(debt_left: int, last_update: int, payments: list[Payment]) -> tuple[int, int]:
+    """Applies a schedule with the contract math; returns (total sent, debt left)"""
+    total = 0
+    for payment in payments:
+        out = pay_back(debt_left, last_update, payment.amount, payment.round)
+        if not out.ok:
+            raise ValueError(f"pay_back of {payment.amount} fails at round {payment.round}")
+        total += payment.amount - int(out.refund)
+        debt_left, last_update = int(out.debt_left), int(out.last_update)
+        if out.repaid:
+            break
+    return total, debt_left
+
+
+def cheapest_schedule(debt_left: int, last_update: int, payback_deadline: int, income: list[tuple[int, int]],
+                      fee: int = PAY_BACK_FEE) -> tuple[list[Payment], int]:
+    """Cheapest way to repay a loan before its deadline given when the borrower receives funds.
+
+    income: (round, amount) cash arrivals. The loan is repaid (with the exact amount) at the first round the
+    accumulated cash covers the payoff. Interest is simple and only reset by pay_back, so paying part of the
+    principal earlier saves interest, but every extra pay_back costs its fee: the arrivals that get a partial
+    payment (all the cash available) are chosen by local search on the exact total cost.
+    Returns (payments, total cost including fees).
+    """
+    income = sorted(income)
+
+    def plan(partial_at: set[int]) -> list[Payment] | None:
+        debt, last, cash, payments = debt_left, last_update, 0, []
+        for index, (arrival, amount) in enumerate(income):
+            cash += amount
+            next_arrival = income[index + 1][0] if index + 1 < len(income) else payback_deadline
+            # earliest round before the next arrival at which the cash covers the payoff
+            window = np.arange(max(arrival, last), min(next_arrival, payback_deadline), dtype=U64)
+            if len(window):
+                due, ok = payoff(debt, last, window)
+                affordable = np.flatnonzero(ok & (due <= U64(cash)))
+                if len(affordable):
+                    at = int(window[affordable[0]])
+                    payments.append(Payment(at, int(due[affordable[0]]), True))
+                    return payments
+            if index in partial_at and cash > 0:
+                out = pay_back(debt, last, cash, arrival)
+                if out.ok and not out.repaid:
+                    payments.append(Payment(arrival, cash, False))
+                    debt, last, cash = int(out.debt_left), int(out.last_update), 0
+        return None
+
+    def cost(payments):
+        return None if payments is None else simulate(debt_left, last_update, payments)[0] + fee * len(payments)
+
+    # local search over the arrivals that get a partial payment, from "none" and from "all of them":
+    # a partial payment is toggled whenever that lowers the total cost
+    results = []
+    for partial_at in (set(), set(range(len(income)))):
+        best = plan(partial_at)
+        if best is None:
+            continue
+        improved = True
+        while improved:
+            improved = False
+            for index in range(len(income)):
+                candidate_at = partial_at ^ {index}
+                candidate = plan(candidate_at)
+                if candidate is not None and cost(candidate) < cost(best):
+                    partial_at, best, improved = candidate_at, candidate, True
+        results.append((cost(best), best))
+    if not results:
+        raise ValueError("the income does not cover the loan before its deadline")
+    total, best = min(results, key=lambda result: result[0])
+    return best, total
+
+
+# ---- verification and benchmark ----
+
+def verify_against_teal(cases=300, seed=7):
+    """Runs random pay_back calls through the TEAL of BorrowMyNFT (simulator) and compares every outcome"""
+    import random
+
+    from algosdk.constants import microalgos_to_algos_ratio as algo
+
+    from src.simulator import Ledger, SimulatedApp, SimulationError, asset_transfer_txn, create_nft_txn, payment_txn
+
+    rng = random.Random(seed)
+    ledger = Ledger()
+    _, owner = ledger.new_account(10 ** 6 * algo)
+    _, borrower = ledger.new_account(10 ** 7 * algo)
+    _, lender = ledger.new_account(10 ** 6 * algo)
+    sim = SimulatedApp(ledger)
+    sim.create(owner)
+    ledger.submit([payment_txn(owner, sim.app_addr, algo)])
+    asset_id = ledger.submit([create_nft_txn(borrower, "NFT", "G3", "")])[0].created_asset_id
+    sim.call("list_nft", borrower, fee=2000, nft=asset_id, payment=payment_txn(borrower, sim.app_addr, algo // 10),
+             auction_base=1000, auction_period=10, payback_deadline=1000,
+             after=[asset_transfer_txn(borrower, sim.app_addr, asset_id, 1)])
+    sim.call("place_bid", lender, fee=3000, payment=payment_txn(lender, sim.app_addr, 2000))
+    ledger.advance(11)
+    sim.call("accept_bid", borrower, fee=2000)
+    ledger.submit([asset_transfer_txn(lender, lender, asset_id, 0)])
+    loan_state = ledger.global_state(sim.app_id)
+
+    mismatches = 0
+    for case in range(cases):
+        debt = rng.choice([rng.randint(1, 10 ** 6), rng.randint(1, 2 * 10 ** 11), rng.randint(1, 2 ** 63)])
+        last = rng.randint(1, 10 ** 6)
+        blocks = rng.choice([0, rng.randint(0, 100), rng.randint(0, 10 ** 7)])
+        due = debt + debt * blocks // INTEREST_RATE_DEN
+        amount = min(rng.choice([due, due + rng.randint(1, 10 ** 6), max(0, due - rng.randint(1, due)),
+                                 debt * blocks // INTEREST_RATE_DEN]), 5 * 10 ** 12)
+        # loan state set directly, then pay_back evaluated at round last + blocks
+        app = ledger.apps[sim.app_id]
+        app.global_state = dict(loan_state)
+        app.global_state.update({b"debt_left": debt, b"last_interest_update_block": last})
+        ledger.fund(borrower, amount)
+        ledger.round = last + blocks - 1
+        lender_balance = ledger.balance(lender)
+        try:
+            sim.call("pay_back", borrower, fee=5000, foreign_assets=[asset_id], accounts=[lender],
+                     payment=payment_txn(borrower, sim.app_addr, amount))
+            teal = (True, ledger.balance(lender) - lender_balance, ledger.global_state(sim.app_id)[b"debt_left"])
+        except SimulationError:
+            teal = (False, 0, debt)
+        if ledger.asset_balance(sim.app_addr, asset_id) is None:
+            # repaid: the NFT is listed again for the next case
+            sim.call("list_nft", borrower, fee=2000, nft=asset_id, payment=payment_txn(borrower, sim.app_addr, algo // 10),
+                     auction_base=1000, auction_period=10, payback_deadline=1000,
+                     after=[asset_transfer_txn(borrower, sim.app_addr, asset_id, 1)])
+        out = pay_back(debt, last, amount, last + blocks)
+        engine = (bool(out.ok), int(out.to_lender), int(out.debt_left))
+        if teal != engine:
+            mismatches += 1
+            print(f"mismatch: debt {debt} blocks {blocks} amount {amount}: teal {teal} engine {engine}")
+    print(f"pay_back vs TEAL: {cases} cases, {mismatches} mismatches")
+    return mismatches
+
+
+def benchmark(loans=5000, horizon=500, seed=3):
+    import time
+
+    rng = np.random.default_rng(seed)
+    debt = rng.integers(10 ** 5, 2 * 10 ** 11, loans, dtype=np.uint64)
+    last = rng.integers(1, 1000, loans, dtype=np.uint64)
+    deadline = last + rng.integers(100, 2000, loans, dtype=np.uint64)
+
+    start = time.perf_counter()
+    _, amounts, valid = project(debt, last, deadline, 1000, horizon)
+    vectorized = time.perf_counter() - start
+
+    start = time.perf_counter()
+    looped = [[int(d) + int(d) * (r - int(l)) // INTEREST_RATE_DEN for r in range(1000, 1000 + horizon)]
+              for d, l in zip(debt, last)]
+    loop = time.perf_counter() - start
+    assert all(int(a) == b for row_a, row_b in zip(amounts, looped) for a, b in zip(row_a, row_b))
+    print(f"{loans} loans x {horizon} rounds: numpy {vectorized * 1000:.1f} ms, python loop {loop * 1000:.0f} ms "
+          f"({loop / vectorized:.0f}x); {int(valid.sum())} payable (loan, round) pairs")
+
+    payments, total = cheapest_schedule(50 * 10 ** 9, 0, 10 ** 6, [(1000, 20 * 10 ** 9), (200000, 20 * 10 ** 9),
+                                                                  (400000, 20 * 10 ** 9)])
+    print(f"cheapest schedule for 50000 Algo: {[(p.round, p.amount) for p in payments]}, cost {total}")
+
+
+if __name__ == "__main__":
+    verify_against_teal()
+    benchmark()
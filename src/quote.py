@@ -0,0 +1,238 @@
+# Exact pay_back quotes.
+# A full repayment must cover debt_left plus the interest accrued up to the round the call is evaluated in.
+# Sending less than the interest fails the assert, sending more takes the refund branch (one more inner
+# payment). Repayer predicts the inclusion round from the block time measured by the shared round watcher
+# (src/block_time.py), quotes the exact payoff for it
+# from the per-round cached state (src/projection.py math) and sends the group with first_valid =
+# last_valid = that round: the call either runs in the quoted round and takes the exact-amount branch, or
+# is rejected without fee and re-quoted for a later round.
+import copy
+import time
+from dataclasses import dataclass, field
+
+from algosdk import encoding, error
+from algosdk.atomic_transaction_composer import (
+    ABIResult,
+    AtomicTransactionComposer,
+    TransactionSigner,
+    TransactionWithSigner,
+)
+from algosdk.future import transaction
+from algosdk.v2client import algod
+
+from src import app_state, projection, rounds
+from src.bidding import RoundStateCache
+from src.light_client import LightClient
+from src.params import SuggestedParamsProvider
+
+LOAN_STATE = 2
+# Fraction of the block time after which the next round is considered too close to be reached
+SAFETY = 0.8
+
+
+@dataclass
+class Quote:
+    round: int  # round in which the payment must be evaluated
+    amount: int  # exact full repayment at that round
+    debt_left: int
+    interest: int
+    # global state the quote was computed from
+    state: dict[bytes, int | bytes] = field(default_factory=dict, repr=False, compare=False)
+
+
+def quote(state: dict[bytes, int | bytes], target_round: int) -> Quote:
+    """Exact full repayment of a loan (global state of the app) if evaluated at target_round"""
+    if state.get(b"state") != LOAN_STATE:
+        raise ValueError("the app has no active loan")
+    debt_left, last_update = state[b"debt_left"], state[b"last_interest_update_block"]
+    amount, ok = projection.payoff(debt_left, last_update, target_round)
+    if not ok:
+        raise ValueError(f"pay_back cannot be evaluated at round {target_round}")
+    return Quote(round=target_round, amount=int(amount), debt_left=debt_left, interest=int(amount) - debt_left,
+                 state=state)
+
+
+def pinned(sp: transaction.SuggestedParams, target_round: int) -> transaction.SuggestedParams:
+    """Copy of the params valid in target_round only"""
+    sp = copy.copy(sp)
+    sp.first = sp.last = target_round
+    return sp
+
+
+class Repayer:
+    def __init__(
+        self,
+        client: algod.AlgodClient,
+        app_id: int,
+        signer: TransactionSigner,
+        sender: str = None,
+        params: SuggestedParamsProvider = None,
+        cache: RoundStateCache = None,
+        block_time: float = None,
+    ):
+        self.light = LightClient(client, app_id, signer, sender)
+        self.sender = self.light.sender
+        self.params = params or SuggestedParamsProvider(client)
+        self.cache = cache or RoundStateCache(client, app_id)
+        self.watcher = rounds.watcher_for(client)
+        # fixed block time in seconds; by default the estimate of the watcher, fed by every status read
+        self.block_time = block_time
+        # round trip to algod (EWMA), the time a group sent after a status read needs to reach the node
+        self.round_trip = 0.0
+        # time taken by the signer (EWMA): a wallet asking the user to confirm can take several blocks
+        self.sign_time = 0.0
+        self.attempts = 0
+        self.missed = 0
+        self.exact = 0
+
+    def predict_round(self) -> int:
+        """First round a group signed and sent from now on can still be evaluated in"""
+        start = time.monotonic()
+        status = self.light.client.status()
+        self.round_trip = 0.5 * self.round_trip + 0.5 * (time.monotonic() - start)
+        self.watcher.block_times.observe_status(status)
+        block_time = self.block_time or self.watcher.block_times.mean
+        # the status is already half a round trip old, then the group is signed and needs a round trip more
+        elapsed = status.get("time-since-last-round", 0) / 1e9 + 1.5 * self.round_trip + self.sign_time
+        # aim past every block expected to be cut before the group gets there, with a SAFETY margin
+        return status["last-round"] + 1 + int(elapsed / block_time + 1 - SAFETY)
+
+    def quote(self, target_round: int = None) -> Quote:
+        return quote(self.cache.get(), target_round if target_round is not None else self.predict_round())
+
+    def pay_at(self, q: Quote) -> ABIResult:
+        """Signs and sends the exact repayment of a quote, valid only in the quoted round"""
+        state = q.state
+        payment = TransactionWithSigner(
+            txn=transaction.PaymentTxn(self.sender, pinned(self.params.get(), q.round), self.light.app_addr,
+                                       q.amount),
+            signer=self.light.signer,
+        )
+        method = self.light.get_method("pay_back")
+        atc = self.light.add_method_call(
+            AtomicTransactionComposer(),
+            method,
+            suggested_params=pinned(self.params.for_method("pay_back"), q.round),
+            payment=payment,
+            foreign_assets=[state[b"nft_id"]],
+            accounts=[encoding.encode_address(state[b"lender_address"])],
+        )
+        start = time.monotonic()
+        atc.gather_signatures()
+        self.sign_time = 0.5 * self.sign_time + 0.5 * (time.monotonic() - start)
+        # a group for round r can only be sent once round r - 1 is committed
+        self.watcher.wait_for(q.round - 1)
+        try:
+            result = atc.execute(self.light.client, 4).abi_results.pop()
+        except Exception:
+            app_state.sent(self.light.client, self.light.app_id)
+            raise
+        app_state.sent(self.light.client, self.light.app_id, result.tx_info.get("confirmed-round"))
+        return result
+
+    def pay_in_full(self, max_attempts: int = 3) -> tuple[Quote, ABIResult]:
+        """Repays the loan with the exact amount, re-quoting for a later round when a round is missed"""
+        for _ in range(max_attempts):
+            self.attempts += 1
+            q = self.quote()
+            try:
+                result = self.pay_at(q)
+            except (error.AlgodHTTPError, error.ConfirmationTimeoutError):
+                # the group can only be evaluated in the quoted round: once it is committed, the rejection
+                # (or the group dropped from the pool) is a missed round; before, it is a real failure
+                if self.light.client.status()["last-round"] < q.round:
+                    raise
+                self.missed += 1
+                continue
+            if result.tx_info.get("confirmed-round") == q.round:
+                self.exact += 1
+            return q, result
+        raise error.AlgodHTTPError(f"pay_back not included after {max_attempts} quoted rounds")
+
+
+# Repays `loans` loans on the local algod stand-in (real block time, request latency) with a signer that
+# takes up to a block and a half, as a wallet waiting for the user would: with exact pinned quotes, and
+# with the naive approach (quote for the next round, group valid for 1000 rounds).
+def benchmark(loans=30, block_time=0.25, latency=0.02, max_sign_time=0.35):
+    import random
+    import threading
+
+    from algosdk.atomic_transaction_composer import AccountTransactionSigner
+    from algosdk.constants import microalgos_to_algos_ratio as algo
+
+    from src.local_algod import LocalAlgod
+    from src.simulator import SimulatedApp, asset_transfer_txn, create_nft_txn, payment_txn
+
+    class SlowSigner(AccountTransactionSigner):
+        def sign_transactions(self, txn_group, indexes):
+            time.sleep(random.uniform(0, max_sign_time))
+            return super().sign_transactions(txn_group, indexes)
+
+    node = LocalAlgod(latency=latency)
+    ledger = node.ledger
+    _, owner = ledger.new_account(10000 * algo)
+    borrower_key, borrower = ledger.new_account(100000 * algo)
+    _, lender = ledger.new_account(100000 * algo)
+    app_ids = []
+    for i in range(2 * loans):
+        sim = SimulatedApp(ledger)
+        sim.app_id = node.submit([sim.build_create(owner)])[0].created_app_id
+        node.submit([payment_txn(owner, sim.app_addr, algo // 10)])
+        asset_id = node.submit([create_nft_txn(borrower, f"NFT {i}", "G3", "")])[0].created_asset_id
+        node.submit(sim.build_call("list_nft", borrower, fee=2000, nft=asset_id,
+                                   payment=payment_txn(borrower, sim.app_addr, algo // 10),
+                                   auction_base=1000, auction_period=1, payback_deadline=100000)
+                    + [asset_transfer_txn(borrower, sim.app_addr, asset_id, 1)])
+        node.submit(sim.build_call("place_bid", lender, fee=3000, payment=payment_txn(lender, sim.app_addr, 1000 * algo)))
+        node.submit(sim.build_call("accept_bid", borrower, fee=2000))
+        app_ids.append(sim.app_id)
+    node.block_time = block_time
+    node._thread = threading.Thread(target=node._produce_blocks, daemon=True)
+    node._thread.start()
+
+    signer = SlowSigner(borrower_key)
+    params = SuggestedParamsProvider(node, ttl=block_time)
+
+    def outcome(app_id, result):
+        # a full repayment pays the lender and returns the NFT; the refund branch also pays the excess back
+        if ledger.global_state(app_id).get(b"state") == LOAN_STATE:
+            return "partial"
+        inner = result.tx_info.get("inner-txns", [])
+        return "refund" if len(inner) > 2 else "exact"
+
+    pinned_outcomes, naive_outcomes = [], []
+    start = time.perf_counter()
+    repayers = []
+    for app_id in app_ids[:loans]:
+        repayer = Repayer(node, app_id, signer, borrower, params=params)
+        if repayers:
+            repayer.round_trip, repayer.sign_time = repayers[-1].round_trip, repayers[-1].sign_time
+        _, result = repayer.pay_in_full(max_attempts=5)
+        pinned_outcomes.append(outcome(app_id, result))
+        repayers.append(repayer)
+    pinned_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for app_id in app_ids[loans:]:
+        light = LightClient(node, app_id, signer, borrower)
+        state = light.get_application_state(raw=True)
+        q = quote(state, node.status()["last-round"] + 1)
+        payment = TransactionWithSigner(transaction.PaymentTxn(borrower, params.get(), light.app_addr, q.amount),
+                                        signer)
+        result = light.call("pay_back", suggested_params=params.for_method("pay_back"), payment=payment,
+                            foreign_assets=[state[b"nft_id"]],
+                            accounts=[encoding.encode_address(state[b"lender_address"])])
+        naive_outcomes.append(outcome(app_id, result))
+    naive_time = time.perf_counter() - start
+
+    attempts = sum(r.attempts for r in repayers)
+    print(f"pinned quotes: {pinned_outcomes.count('exact')}/{loans} repaid with the exact amount, "
+          f"{attempts} groups signed ({sum(r.missed for r in repayers)} missed their round), {pinned_time:.1f}s")
+    print(f"naive quotes:  {naive_outcomes.count('exact')}/{loans} exact, {naive_outcomes.count('partial')} left "
+          f"with debt, {naive_outcomes.count('refund')} refunded, {naive_time:.1f}s")
+    rounds.watcher_for(node).stop()
+    node.close()
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,173 @@
+# Shared block subscription: one long-poll status-after-block stream per algod node.
+# Any number of threads or coroutines register target rounds and are woken exactly when that round is
+# committed, so waiting on hundreds of auction and payback deadlines costs one connection. While only
+# far-away rounds are waited for, the watcher sleeps until the block-time estimate says the earliest one
+# may be near, instead of long-polling algod every round.
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import Future
+
+from algosdk.v2client import algod
+
+from src.block_time import BlockTimeEstimator
+
+# Back-off between failed status calls (seconds)
+RETRY_DELAYS = (0.5, 1, 2, 5, 10)
+# Block intervals observed before the watcher sleeps on the block-time estimate
+MIN_BLOCK_SAMPLES = 10
+
+
+class RoundWatcher:
+    def __init__(self, client: algod.AlgodClient, nudge=None, sleep_ahead: bool = True):
+        self.client = client
+        # Optional callable producing a block on demand. Sandbox dev mode only makes a block when a
+        # transaction is submitted, so waiters would never wake up without it.
+        self.nudge = nudge
+        self.sleep_ahead = sleep_ahead
+        self.block_times = BlockTimeEstimator()
+        self.last_round: int | None = None
+        # (target round, seq, future, nudge); _nudging counts the waiters that may nudge
+        self._waiters: list[tuple[int, int, Future, bool]] = []
+        self._nudging = 0
+        self._listeners = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread: threading.Thread | None = None
+        self._stopped = False
+
+    # ---- registration ----
+
+    def future(self, target_round: int, nudge: bool = True) -> Future:
+        """Future resolved with the last committed round once it is >= target_round; with nudge=False the
+        waiter only watches (it does not make the nudge callable produce blocks)"""
+        fut = Future()
+        with self._cond:
+            if self.last_round is not None and self.last_round >= target_round:
+                fut.set_result(self.last_round)
+                return fut
+            heapq.heappush(self._waiters, (target_round, next(self._seq), fut, nudge))
+            self._nudging += nudge
+            self._ensure_running()
+            self._cond.notify()
+        return fut
+
+    def wait_for(self, target_round: int, timeout: float = None) -> int:
+        return self.future(target_round).result(timeout)
+
+    async def wait(self, target_round: int) -> int:
+        return await asyncio.wrap_future(self.future(target_round))
+
+    def add_listener(self, callback):
+        """callback(last_round) is invoked from the watcher thread on every new round"""
+        with self._cond:
+            self._listeners.append(callback)
+            self._ensure_running()
+            self._cond.notify()
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._waiters)
+
+    def stop(self):
+        """Stops the stream; the rounds still waited for are cancelled (a later wait starts it again)"""
+        with self._cond:
+            self._stopped = True
+            waiters, self._waiters, self._nudging = self._waiters, [], 0
+            self._cond.notify()
+        for _, _, fut, _ in waiters:
+            fut.cancel()
+
+    # ---- stream ----
+
+    def _ensure_running(self):
+        # caller holds self._cond; a stopped thread that has not exited yet just carries on
+        self._stopped = False
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="round-watcher", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        failures = 0
+        while True:
+            with self._cond:
+                # idle (no request to algod) while nobody is waiting
+                while not self._stopped and not self._waiters and not self._listeners:
+                    self._cond.wait()
+                if self._stopped:
+                    self._thread = None
+                    return
+                nudge = self.nudge if self._nudging else None
+                sleep = self._sleep_time()
+                if sleep > 0:
+                    # woken early by a registration for a nearer round, a listener or stop()
+                    self._cond.wait(sleep)
+                    continue
+            try:
+                if self.last_round is None:
+                    status = self.client.status()
+                else:
+                    if nudge is not None:
+                        nudge()
+                    status = self.client.status_after_block(self.last_round)
+                self.block_times.observe_status(status)
+                failures = 0
+            except Exception as err:
+                delay = RETRY_DELAYS[min(failures, len(RETRY_DELAYS) - 1)]
+                failures += 1
+                print(f"Round watcher: status request failed ({err}), retrying in {delay}s")
+                time.sleep(delay)
+                continue
+            self._advance(status["last-round"])
+
+    def _sleep_time(self) -> float:
+        # caller holds self._cond; seconds the stream can stay idle before the earliest waited round
+        if not self.sleep_ahead or self.nudge is not None or self._listeners or self.last_round is None:
+            return 0.0
+        target = self._waiters[0][0]
+        # the long poll wakes on the next block: sleeping only pays when the target is further than that,
+        # and once enough intervals were observed to trust the estimate
+        if target <= self.last_round + 1 or self.block_times.samples < MIN_BLOCK_SAMPLES:
+            return 0.0
+        now = time.time()
+        expected, margin = self.block_times.eta(target - 1)
+        # at most half of the remaining time per sleep, so a change of block time is caught while far away
+        return min(expected - margin - now, (expected - now) / 2)
+
+    def _advance(self, last_round: int):
+        with self._cond:
+            if self.last_round is not None and last_round <= self.last_round:
+                return
+            self.last_round = last_round
+            ready = []
+            while self._waiters and self._waiters[0][0] <= last_round:
+                _, _, fut, nudge = heapq.heappop(self._waiters)
+                self._nudging -= nudge
+                ready.append(fut)
+            listeners = list(self._listeners)
+        for fut in ready:
+            if not fut.cancelled():
+                fut.set_result(last_round)
+        for callback in listeners:
+            # a failing listener must not stop the stream the other waiters depend on
+            try:
+                callback(last_round)
+            except Exception as err:
+                print(f"Round watcher: listener {callback!r} failed on round {last_round} ({err})")
+
+
+_watchers: dict[int, RoundWatcher] = {}
+_watchers_lock = threading.Lock()
+
+
+# The shared watcher of an algod client (one stream per node/client)
+def watcher_for(client: algod.AlgodClient, nudge=None) -> RoundWatcher:
+    with _watchers_lock:
+        watcher = _watchers.get(id(client))
+        if watcher is None or watcher.client is not client:
+            watcher = _watchers[id(client)] = RoundWatcher(client, nudge)
+        elif nudge is not None:
+            watcher.nudge = nudge
+        return watcher
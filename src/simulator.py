@@ -0,0 +1,2250 @@
+# In-process AVM simulator: interprets the generated approval/clear TEAL of BorrowMyNFT against an
+# in-memory ledger (balances, ASA holdings, global state, boxes, rounds, inner transactions) so the contract
+# can be exercised offline, without a sandbox node. Every application call reports its opcode cost.
+import base64
+import hashlib
+import json
+import os
+import time
+from copy import copy
+from dataclasses import dataclass, field
+
+from algosdk import abi, account, encoding
+from algosdk.logic import get_application_address
+from Cryptodome.Hash import SHA512, keccak
+
+path = os.path.dirname(os.path.abspath(__file__))
+
+APPROVAL_PATH = os.path.join(path, "approval.teal")
+CLEAR_PATH = os.path.join(path, "clear.teal")
+CONTRACT_PATH = os.path.join(path, "contract.json")
+MULTI_APPROVAL_PATH = os.path.join(path, "multi_approval.teal")
+MULTI_CLEAR_PATH = os.path.join(path, "multi_clear.teal")
+MULTI_CONTRACT_PATH = os.path.join(path, "multi_contract.json")
+
+# Consensus parameters (AVM v8)
+MIN_TXN_FEE = 1000
+MIN_BALANCE = 100000
+ASSET_MIN_BALANCE = 100000
+APP_PAGE_MIN_BALANCE = 100000
+SCHEMA_MIN_BALANCE = 25000
+SCHEMA_UINT_MIN_BALANCE = 3500
+SCHEMA_BYTES_MIN_BALANCE = 25000
+APP_CALL_BUDGET = 700
+MAX_INNER_TXNS = 16
+MAX_STACK_DEPTH = 1000
+MAX_BYTES_LENGTH = 4096
+MAX_LOG_CALLS = 32
+MAX_LOG_SIZE = 1024
+MAX_KEY_LENGTH = 64
+MAX_KEY_VALUE_LENGTH = 128
+BOX_FLAT_MIN_BALANCE = 2500
+BOX_BYTE_MIN_BALANCE = 400
+MAX_BOX_SIZE = 32768
+BLOCK_TIME = 4
+
+UINT64_MAX = 2 ** 64 - 1
+ZERO_ADDRESS = bytes(32)
+ABI_RETURN_PREFIX = bytes.fromhex("151f7c75")
+
+# OnCompletion values
+NO_OP, OPT_IN, CLOSE_OUT, CLEAR_STATE, UPDATE_APPLICATION, DELETE_APPLICATION = range(6)
+
+TXN_TYPE_ENUMS = {"pay": 1, "keyreg": 2, "acfg": 3, "axfer": 4, "afrz": 5, "appl": 6}
+
+NAMED_INT_CONSTANTS = {
+    "NoOp": NO_OP,
+    "OptIn": OPT_IN,
+    "CloseOut": CLOSE_OUT,
+    "ClearState": CLEAR_STATE,
+    "UpdateApplication": UPDATE_APPLICATION,
+    "DeleteApplication": DELETE_APPLICATION,
+    "unknown": 0,
+    **TXN_TYPE_ENUMS,
+}
+
+# Opcodes whose cost differs from 1 in AVM v8
+OPCODE_COSTS = {
+    "sha256": 35,
+    "keccak256": 130,
+    "sha512_256": 45,
+    "sha3_256": 130,
+    "ed25519verify": 1900,
+    "ed25519verify_bare": 1900,
+    "divmodw": 20,
+    "divw": 1,
+    "expw": 10,
+    "sqrt": 4,
+    "bsqrt": 40,
+    "b+": 10,
+    "b-": 10,
+    "b/": 20,
+    "b*": 20,
+    "b%": 20,
+    "b|": 6,
+    "b&": 6,
+    "b^": 6,
+    "b~": 4,
+}
+
+
+class SimulationError(Exception):
+    """The ledger rejected a transaction group"""
+
+
+class LogicError(SimulationError):
+    """An application program failed or rejected the call"""
+
+    def __init__(self, message, line=None, source_line=None, cost=0):
+        self.line = line
+        self.source_line = source_line
+        self.cost = cost
+        where = f" at line {line}: {source_line}" if line is not None else ""
+        super().__init__(f"logic eval error: {message}{where}")
+
+
+# Parsed TEAL program. Immediates are decoded once at parse time so evaluation only dispatches.
+class Program:
+    def __init__(self, source: str):
+        self.source = source
+        self.lines = source.splitlines()
+        self.version = 1
+        self.instructions: list[tuple[str, tuple, int]] = []
+        self.labels: dict[str, int] = {}
+        self.bytecode: bytes | None = None
+        self._parse()
+
+    def _parse(self):
+        for line_no, line in enumerate(self.lines, start=1):
+            tokens = _tokenize(line)
+            if not tokens:
+                continue
+            if tokens[0] == "#pragma":
+                if tokens[1] == "version":
+                    self.version = int(tokens[2])
+                continue
+            if tokens[0].endswith(":") and len(tokens) == 1:
+                self.labels[tokens[0][:-1]] = len(self.instructions)
+                continue
+            op, args = tokens[0], tokens[1:]
+            self.instructions.append((op, _parse_immediates(op, args), line_no))
+        for op, imm, line_no in self.instructions:
+            if op in ("b", "bz", "bnz", "callsub") and imm[0] not in self.labels:
+                raise SimulationError(f"unknown label {imm[0]} at line {line_no}")
+
+    def source_line(self, line_no):
+        return self.lines[line_no - 1].strip()
+
+
+def _tokenize(line: str) -> list[str]:
+    tokens = []
+    i, n = 0, len(line)
+    while i < n:
+        c = line[i]
+        if c in " \t":
+            i += 1
+        elif line.startswith("//", i):
+            break
+        elif c == '"':
+            j = i + 1
+            while j < n and line[j] != '"':
+                j += 2 if line[j] == "\\" else 1
+            tokens.append(line[i:j + 1])
+            i = j + 1
+        else:
+            j = i
+            while j < n and line[j] not in " \t":
+                j += 1
+            tokens.append(line[i:j])
+            i = j
+    return tokens
+
+
+def _parse_int(token: str) -> int:
+    if token in NAMED_INT_CONSTANTS:
+        return NAMED_INT_CONSTANTS[token]
+    if token.startswith(("0x", "0X")):
+        return int(token, 16)
+    if token.startswith("0") and len(token) > 1:
+        return int(token, 8)
+    return int(token)
+
+
+def _parse_bytes(args: list[str]) -> tuple[bytes, int]:
+    # returns the decoded constant and the number of tokens consumed
+    token = args[0]
+    if token.startswith(("0x", "0X")):
+        return bytes.fromhex(token[2:]), 1
+    if token.startswith('"'):
+        return _unescape(token[1:-1]), 1
+    for prefix in ("base64(", "b64("):
+        if token.startswith(prefix):
+            return base64.b64decode(token[len(prefix):-1]), 1
+    for prefix in ("base32(", "b32("):
+        if token.startswith(prefix):
+            return _b32decode(token[len(prefix):-1]), 1
+    if token in ("base64", "b64"):
+        return base64.b64decode(args[1]), 2
+    if token in ("base32", "b32"):
+        return _b32decode(args[1]), 2
+    raise SimulationError(f"cannot parse byte constant {token}")
+
+
+def _b32decode(value):
+    return base64.b32decode(value + "=" * (-len(value) % 8))
+
+
+def _unescape(value: str) -> bytes:
+    out = bytearray()
+    i = 0
+    while i < len(value):
+        c = value[i]
+        if c == "\\":
+            nxt = value[i + 1]
+            if nxt == "x":
+                out.append(int(value[i + 2:i + 4], 16))
+                i += 4
+                continue
+            out.extend({"n": b"\n", "r": b"\r", "t": b"\t", "\\": b"\\", '"': b'"'}[nxt])
+            i += 2
+            continue
+        out.extend(c.encode())
+        i += 1
+    return bytes(out)
+
+
+def _parse_immediates(op: str, args: list[str]) -> tuple:
+    match op:
+        case "intcblock":
+            return tuple(_parse_int(a) for a in args)
+        case "bytecblock":
+            values = []
+            while args:
+                value, used = _parse_bytes(args)
+                values.append(value)
+                args = args[used:]
+            return tuple(values)
+        case "pushint" | "int":
+            return (_parse_int(args[0]),)
+        case "pushbytes" | "byte":
+            return (_parse_bytes(args)[0],)
+        case "addr":
+            return (encoding.decode_address(args[0]),)
+        case "method":
+            return (abi.Method.from_signature(_unescape(args[0][1:-1]).decode()).get_selector(),)
+        case "intc" | "bytec" | "arg" | "load" | "store" | "dig" | "cover" | "uncover" | "gload" | "gloads" | "gaid":
+            return tuple(int(a) for a in args)
+        case "extract" | "substring":
+            return tuple(int(a) for a in args)
+        case "txn" | "gtxns" | "itxn" | "txnas" | "gtxnsas" | "itxnas":
+            return (args[0],) + tuple(int(a) for a in args[1:])
+        case "txna" | "gtxnsa" | "itxna":
+            return (args[0], int(args[1]))
+        case "gtxn" | "gtxnas" | "gitxn" | "gitxnas":
+            return (int(args[0]), args[1]) + tuple(int(a) for a in args[2:])
+        case "gtxna" | "gitxna":
+            return (int(args[0]), args[1], int(args[2]))
+        case _:
+            return tuple(args)
+
+
+def _address(value: str | bytes) -> bytes:
+    return value if isinstance(value, bytes) else encoding.decode_address(value)
+
+
+def _address_str(value: str | bytes) -> str:
+    return value if isinstance(value, str) else encoding.encode_address(value)
+
+
+def _sha512_256(data: bytes) -> bytes:
+    return SHA512.new(data, truncate="256").digest()
+
+
+@dataclass
+class Txn:
+    type: str
+    sender: str
+    fee: int = MIN_TXN_FEE
+    first_valid: int | None = None
+    last_valid: int | None = None
+    note: bytes = b""
+    lease: bytes = ZERO_ADDRESS
+    rekey_to: str | None = None
+    group: bytes = ZERO_ADDRESS
+    txid: str | None = None
+    # pay
+    receiver: str | None = None
+    amount: int = 0
+    close_remainder_to: str | None = None
+    # axfer
+    xfer_asset: int = 0
+    asset_amount: int = 0
+    asset_sender: str | None = None
+    asset_receiver: str | None = None
+    asset_close_to: str | None = None
+    # acfg
+    config_asset: int = 0
+    total: int = 0
+    decimals: int = 0
+    default_frozen: bool = False
+    unit_name: bytes = b""
+    asset_name: bytes = b""
+    url: bytes = b""
+    metadata_hash: bytes = b""
+    manager: str | None = None
+    reserve: str | None = None
+    freeze: str | None = None
+    clawback: str | None = None
+    # appl
+    application_id: int = 0
+    on_completion: int = NO_OP
+    app_args: list[bytes] = field(default_factory=list)
+    accounts: list[str] = field(default_factory=list)
+    foreign_assets: list[int] = field(default_factory=list)
+    foreign_apps: list[int] = field(default_factory=list)
+    # (app id, box name); app id 0 is the called app
+    boxes: list[tuple[int, bytes]] = field(default_factory=list)
+    approval_program: Program | None = None
+    clear_program: Program | None = None
+    global_num_uint: int = 0
+    global_num_byte_slice: int = 0
+    local_num_uint: int = 0
+    local_num_byte_slice: int = 0
+    extra_pages: int = 0
+
+    def get_txid(self) -> str:
+        if self.txid is None:
+            digest = _sha512_256(repr(self).encode() + os.urandom(8))
+            self.txid = base64.b32encode(digest).decode().rstrip("=")
+        return self.txid
+
+
+@dataclass
+class TxnResult:
+    txn: Txn
+    confirmed_round: int = 0
+    cost: int = 0
+    logs: list[bytes] = field(default_factory=list)
+    inner_txns: list["TxnResult"] = field(default_factory=list)
+    created_app_id: int | None = None
+    created_asset_id: int | None = None
+
+    @property
+    def inner_txn_count(self) -> int:
+        return sum(1 + inner.inner_txn_count for inner in self.inner_txns)
+
+
+@dataclass
+class AccountData:
+    address: str
+    balance: int = 0
+    assets: dict[int, int] = field(default_factory=dict)
+    created_assets: set[int] = field(default_factory=set)
+    created_apps: set[int] = field(default_factory=set)
+    opted_in_apps: dict[int, dict[bytes, int | bytes]] = field(default_factory=dict)
+    total_schema_uints: int = 0
+    total_schema_bytes: int = 0
+    total_extra_pages: int = 0
+    total_local_uints: int = 0
+    total_local_bytes: int = 0
+    total_boxes: int = 0
+    total_box_bytes: int = 0
+
+    def clone(self):
+        c = copy(self)
+        c.assets = dict(self.assets)
+        c.created_assets = set(self.created_assets)
+        c.created_apps = set(self.created_apps)
+        c.opted_in_apps = {k: dict(v) for k, v in self.opted_in_apps.items()}
+        return c
+
+
+@dataclass
+class AssetData:
+    id: int
+    creator: str
+    total: int
+    decimals: int = 0
+    default_frozen: bool = False
+    unit_name: bytes = b""
+    name: bytes = b""
+    url: bytes = b""
+    metadata_hash: bytes = b""
+    manager: str | None = None
+    reserve: str | None = None
+    freeze: str | None = None
+    clawback: str | None = None
+
+    def clone(self):
+        return copy(self)
+
+
+@dataclass
+class AppData:
+    id: int
+    creator: str
+    approval: Program
+    clear: Program
+    global_state: dict[bytes, int | bytes] = field(default_factory=dict)
+    boxes: dict[bytes, bytes] = field(default_factory=dict)
+    global_num_uint: int = 0
+    global_num_byte_slice: int = 0
+    local_num_uint: int = 0
+    local_num_byte_slice: int = 0
+    extra_pages: int = 0
+
+    @property
+    def address(self) -> str:
+        return get_application_address(self.id)
+
+    def clone(self):
+        c = copy(self)
+        c.global_state = dict(self.global_state)
+        c.boxes = dict(self.boxes)
+        return c
+
+
+# In-memory ledger. submit() evaluates a group atomically in round `round + 1`; in dev mode (the sandbox
+# default) each accepted group produces its own block, otherwise blocks are produced by advance().
+class Ledger:
+    def __init__(self, dev_mode: bool = True, min_fee: int = MIN_TXN_FEE, start_round: int = 1):
+        self.dev_mode = dev_mode
+        self.min_fee = min_fee
+        self.round = start_round
+        self.timestamp = int(time.time())
+        self.accounts: dict[str, AccountData] = {}
+        self.assets: dict[int, AssetData] = {}
+        self.apps: dict[int, AppData] = {}
+        self._next_id = 1000
+        self._journal: dict | None = None
+
+    # ---- account helpers ----
+
+    def new_account(self, balance: int = 0) -> tuple[str, str]:
+        private_key, address = account.generate_account()
+        self.fund(address, balance)
+        return private_key, address
+
+    def fund(self, address: str, amount: int):
+        self._account(address).balance += amount
+
+    def balance(self, address: str) -> int:
+        acct = self.accounts.get(address)
+        return acct.balance if acct else 0
+
+    def asset_balance(self, address: str, asset_id: int) -> int | None:
+        acct = self.accounts.get(address)
+        return acct.assets.get(asset_id) if acct else None
+
+    def min_balance(self, address: str) -> int:
+        acct = self.accounts.get(address)
+        if acct is None:
+            return 0
+        return (
+            MIN_BALANCE
+            + ASSET_MIN_BALANCE * len(acct.assets)
+            + APP_PAGE_MIN_BALANCE * (len(acct.created_apps) + acct.total_extra_pages)
+            + (SCHEMA_MIN_BALANCE + SCHEMA_UINT_MIN_BALANCE) * (acct.total_schema_uints + acct.total_local_uints)
+            + (SCHEMA_MIN_BALANCE + SCHEMA_BYTES_MIN_BALANCE) * (acct.total_schema_bytes + acct.total_local_bytes)
+            + APP_PAGE_MIN_BALANCE * len(acct.opted_in_apps)
+            + BOX_FLAT_MIN_BALANCE * acct.total_boxes
+            + BOX_BYTE_MIN_BALANCE * acct.total_box_bytes
+        )
+
+    def global_state(self, app_id: int) -> dict[bytes, int | bytes]:
+        return dict(self.apps[app_id].global_state)
+
+    def boxes(self, app_id: int) -> dict[bytes, bytes]:
+        return dict(self.apps[app_id].boxes)
+
+    def advance(self, rounds: int = 1):
+        self.round += rounds
+        self.timestamp += BLOCK_TIME * rounds
+
+    # ---- group evaluation ----
+
+    def submit(self, group: list[Txn]) -> list[TxnResult]:
+        if not group or len(group) > 16:
+            raise SimulationError("transaction group must contain between 1 and 16 transactions")
+        eval_round = self.round + 1
+        group_id = _sha512_256(b"TG" + b"".join(t.get_txid().encode() for t in group)) if len(group) > 1 else ZERO_ADDRESS
+        for txn in group:
+            txn.group = group_id
+            if txn.first_valid is not None and eval_round < txn.first_valid:
+                raise SimulationError(f"txn {txn.get_txid()} not valid before round {txn.first_valid}")
+            if txn.last_valid is not None and eval_round > txn.last_valid:
+                raise SimulationError(f"txn {txn.get_txid()} dead: round {eval_round} outside its validity window")
+
+        fee_credit = sum(t.fee for t in group) - self.min_fee * len(group)
+        if fee_credit < 0:
+            raise SimulationError(f"fee too small: group pays {sum(t.fee for t in group)}, "
+                                  f"requires {self.min_fee * len(group)}")
+        app_calls = sum(1 for t in group if t.type == "appl")
+        self._group = _GroupContext(
+            txns=group,
+            fee_credit=fee_credit,
+            budget=APP_CALL_BUDGET * app_calls,
+            inner_left=MAX_INNER_TXNS * app_calls,
+            round=eval_round,
+            box_refs={(t.application_id if app_id == 0 else app_id, name)
+                      for t in group if t.type == "appl" for app_id, name in t.boxes},
+        )
+
+        self._journal = {}
+        try:
+            results = []
+            for index, txn in enumerate(group):
+                result = TxnResult(txn=txn, confirmed_round=eval_round)
+                touched: set[str] = set()
+                self._apply(txn, result, index, touched)
+                self._check_min_balances(touched)
+                results.append(result)
+        except Exception:
+            self._rollback()
+            raise
+        finally:
+            self._journal = None
+            self._group = None
+
+        if self.dev_mode:
+            self.advance()
+        return results
+
+    def _rollback(self):
+        for (kind, key), original in self._journal.items():
+            table = {"account": self.accounts, "asset": self.assets, "app": self.apps}[kind]
+            if original is None:
+                table.pop(key, None)
+            else:
+                table[key] = original
+
+    def _touch(self, kind, key, table):
+        if self._journal is not None and (kind, key) not in self._journal:
+            existing = table.get(key)
+            self._journal[(kind, key)] = existing.clone() if existing is not None else None
+
+    def _account(self, address: str) -> AccountData:
+        self._touch("account", address, self.accounts)
+        acct = self.accounts.get(address)
+        if acct is None:
+            acct = self.accounts[address] = AccountData(address=address)
+        return acct
+
+    def _asset(self, asset_id: int) -> AssetData:
+        if asset_id not in self.assets:
+            raise SimulationError(f"asset {asset_id} does not exist")
+        self._touch("asset", asset_id, self.assets)
+        return self.assets[asset_id]
+
+    def _app(self, app_id: int) -> AppData:
+        if app_id not in self.apps:
+            raise SimulationError(f"application {app_id} does not exist")
+        self._touch("app", app_id, self.apps)
+        return self.apps[app_id]
+
+    def _new_id(self) -> int:
+        self._next_id += 1
+        return self._next_id
+
+    def _check_min_balances(self, touched: set[str]):
+        for address in touched:
+            acct = self.accounts.get(address)
+            if acct is None:
+                continue
+            required = self.min_balance(address)
+            if acct.balance < required and not (acct.balance == 0 and not acct.assets and not acct.created_apps):
+                raise SimulationError(f"account {address} balance {acct.balance} below min {required}")
+
+    def _apply(self, txn: Txn, result: TxnResult, index: int, touched: set[str], caller: "Evaluator" = None):
+        sender = self._account(txn.sender)
+        touched.add(txn.sender)
+        if sender.balance < txn.fee:
+            raise SimulationError(f"account {txn.sender} cannot pay fee {txn.fee}")
+        sender.balance -= txn.fee
+
+        match txn.type:
+            case "pay":
+                self._pay(txn.sender, txn.receiver, txn.amount, touched)
+                if txn.close_remainder_to:
+                    self._pay(txn.sender, txn.close_remainder_to, sender.balance, touched)
+                    del self.accounts[txn.sender]
+            case "axfer":
+                self._asset_transfer(txn, touched)
+            case "acfg":
+                self._asset_config(txn, result, touched)
+            case "appl":
+                self._app_call(txn, result, index, touched, caller)
+            case _:
+                raise SimulationError(f"unsupported transaction type {txn.type}")
+
+    def _pay(self, sender: str, receiver: str, amount: int, touched: set[str]):
+        source = self._account(sender)
+        if source.balance < amount:
+            raise SimulationError(f"overspend: account {sender} balance {source.balance} cannot pay {amount}")
+        source.balance -= amount
+        self._account(receiver).balance += amount
+        touched.add(receiver)
+
+    def _asset_transfer(self, txn: Txn, touched: set[str]):
+        asset = self._asset(txn.xfer_asset)
+        source_address = txn.asset_sender or txn.sender
+        if txn.asset_sender and txn.sender != asset.clawback:
+            raise SimulationError("only the clawback address can revoke assets")
+        source = self._account(source_address)
+        receiver = self._account(txn.asset_receiver)
+        touched.update((source_address, txn.asset_receiver))
+        # opt-in
+        if txn.asset_receiver == source_address and txn.asset_amount == 0 and txn.xfer_asset not in source.assets:
+            source.assets[txn.xfer_asset] = 0
+            return
+        if txn.xfer_asset not in source.assets:
+            raise SimulationError(f"account {source_address} is not opted in to asset {txn.xfer_asset}")
+        if txn.xfer_asset not in receiver.assets:
+            raise SimulationError(f"receiver {txn.asset_receiver} is not opted in to asset {txn.xfer_asset}")
+        if source.assets[txn.xfer_asset] < txn.asset_amount:
+            raise SimulationError(f"underflow on asset {txn.xfer_asset}: {source_address} holds "
+                                  f"{source.assets[txn.xfer_asset]}, tried to send {txn.asset_amount}")
+        source.assets[txn.xfer_asset] -= txn.asset_amount
+        receiver.assets[txn.xfer_asset] += txn.asset_amount
+        if txn.asset_close_to:
+            if source_address == asset.creator:
+                raise SimulationError("cannot close asset holding of its creator")
+            close_to = self._account(txn.asset_close_to)
+            if txn.xfer_asset not in close_to.assets:
+                raise SimulationError(f"close-to {txn.asset_close_to} is not opted in to asset {txn.xfer_asset}")
+            touched.add(txn.asset_close_to)
+            close_to.assets[txn.xfer_asset] += source.assets.pop(txn.xfer_asset)
+
+    def _asset_config(self, txn: Txn, result: TxnResult, touched: set[str]):
+        if txn.config_asset == 0:
+            asset_id = self._new_id()
+            self._touch("asset", asset_id, self.assets)
+            self.assets[asset_id] = AssetData(
+                id=asset_id,
+                creator=txn.sender,
+                total=txn.total,
+                decimals=txn.decimals,
+                default_frozen=txn.default_frozen,
+                unit_name=txn.unit_name,
+                name=txn.asset_name,
+                url=txn.url,
+                metadata_hash=txn.metadata_hash,
+                manager=txn.manager,
+                reserve=txn.reserve,
+                freeze=txn.freeze,
+                clawback=txn.clawback,
+            )
+            creator = self._account(txn.sender)
+            creator.assets[asset_id] = txn.total
+            creator.created_assets.add(asset_id)
+            result.created_asset_id = asset_id
+            return
+        asset = self._asset(txn.config_asset)
+        if txn.sender != asset.manager:
+            raise SimulationError(f"only the manager can reconfigure asset {asset.id}")
+        creator = self._account(asset.creator)
+        touched.add(asset.creator)
+        if txn.manager is None and txn.reserve is None and txn.freeze is None and txn.clawback is None:
+            if creator.assets.get(asset.id) != asset.total:
+                raise SimulationError(f"cannot destroy asset {asset.id} while units are outstanding")
+            del creator.assets[asset.id]
+            creator.created_assets.discard(asset.id)
+            del self.assets[asset.id]
+            return
+        asset.manager, asset.reserve, asset.freeze, asset.clawback = txn.manager, txn.reserve, txn.freeze, txn.clawback
+
+    def _app_call(self, txn: Txn, result: TxnResult, index: int, touched: set[str], caller: "Evaluator"):
+        if txn.application_id == 0:
+            app_id = self._new_id()
+            self._touch("app", app_id, self.apps)
+            app = self.apps[app_id] = AppData(
+                id=app_id,
+                creator=txn.sender,
+                approval=txn.approval_program,
+                clear=txn.clear_program,
+                global_num_uint=txn.global_num_uint,
+                global_num_byte_slice=txn.global_num_byte_slice,
+                local_num_uint=txn.local_num_uint,
+                local_num_byte_slice=txn.local_num_byte_slice,
+                extra_pages=txn.extra_pages,
+            )
+            creator = self._account(txn.sender)
+            creator.created_apps.add(app_id)
+            creator.total_schema_uints += txn.global_num_uint
+            creator.total_schema_bytes += txn.global_num_byte_slice
+            creator.total_extra_pages += txn.extra_pages
+            result.created_app_id = app_id
+        else:
+            app = self._app(txn.application_id)
+        if txn.on_completion == OPT_IN:
+            acct = self._account(txn.sender)
+            acct.opted_in_apps.setdefault(app.id, {})
+            acct.total_local_uints += app.local_num_uint
+            acct.total_local_bytes += app.local_num_byte_slice
+        program = app.clear if txn.on_completion == CLEAR_STATE else app.approval
+        evaluator = Evaluator(self, app, txn, index, result, touched, caller)
+        approved = evaluator.run(program)
+        if not approved and txn.on_completion != CLEAR_STATE:
+            raise LogicError("rejected by ApprovalProgram", cost=result.cost)
+        evaluator.check_schema()
+        if txn.on_completion in (CLOSE_OUT, CLEAR_STATE):
+            acct = self._account(txn.sender)
+            acct.opted_in_apps.pop(app.id, None)
+            acct.total_local_uints -= app.local_num_uint
+            acct.total_local_bytes -= app.local_num_byte_slice
+        elif txn.on_completion == DELETE_APPLICATION:
+            creator = self._account(app.creator)
+            creator.created_apps.discard(app.id)
+            creator.total_schema_uints -= app.global_num_uint
+            creator.total_schema_bytes -= app.global_num_byte_slice
+            creator.total_extra_pages -= app.extra_pages
+            touched.add(app.creator)
+            del self.apps[app.id]
+
+
+@dataclass
+class _GroupContext:
+    txns: list[Txn]
+    fee_credit: int
+    budget: int
+    inner_left: int
+    round: int
+    box_refs: set[tuple[int, bytes]] = field(default_factory=set)
+    cost_used: int = 0
+    scratch: dict[int, list] = field(default_factory=dict)
+
+
+# Evaluates one application call. Opcode handlers are methods named op_<name>; names that are not
+# valid identifiers are mapped in _OP_ALIASES.
+class Evaluator:
+    def __init__(self, ledger: Ledger, app: AppData, txn: Txn, index: int, result: TxnResult,
+                 touched: set[str], caller: "Evaluator" = None):
+        self.ledger = ledger
+        self.group: _GroupContext = ledger._group
+        self.app = app
+        self.txn = txn
+        self.index = index
+        self.result = result
+        self.touched = touched
+        self.caller = caller
+        self.stack: list[int | bytes] = []
+        self.scratch: list[int | bytes] = [0] * 256
+        self.intc: tuple = ()
+        self.bytec: tuple = ()
+        self.callstack: list[int] = []
+        self.inner_group: list[Txn] | None = None
+        self.last_inner: list[TxnResult] = []
+        self.log_size = 0
+        self.cost = 0
+
+    # ---- driver ----
+
+    def run(self, program: Program) -> bool:
+        self.program = program
+        instructions = program.instructions
+        pc = 0
+        try:
+            while pc < len(instructions):
+                op, imm, line = instructions[pc]
+                self.pc, self.line = pc, line
+                op_cost = OPCODE_COSTS.get(op, 1)
+                self.cost += op_cost
+                self.group.cost_used += op_cost
+                if self.group.cost_used > self.group.budget:
+                    raise self._fail("dynamic cost budget exceeded")
+                handler = getattr(self, "op_" + _OP_ALIASES.get(op, op), None)
+                if handler is None:
+                    raise self._fail(f"unsupported opcode {op}")
+                jump = handler(*imm)
+                if jump is _STOP:
+                    break
+                if len(self.stack) > MAX_STACK_DEPTH:
+                    raise self._fail("stack overflow")
+                pc = jump if jump is not None else pc + 1
+        except LogicError:
+            raise
+        except (IndexError, TypeError, ValueError, KeyError, SimulationError) as e:
+            raise self._fail(str(e) or type(e).__name__) from e
+        finally:
+            self.result.cost += self.cost
+        if self.caller is None:
+            self.group.scratch[self.index] = self.scratch
+        if len(self.stack) != 1:
+            raise self._fail(f"stack must contain exactly one value at the end, found {len(self.stack)}")
+        value = self.stack[0]
+        if isinstance(value, bytes):
+            raise self._fail("stack finished with bytes, not int")
+        return value != 0
+
+    def _fail(self, message) -> LogicError:
+        line = getattr(self, "line", None)
+        source = self.program.source_line(line) if line is not None else None
+        return LogicError(message, line, source, self.cost)
+
+    def check_schema(self):
+        uints = sum(1 for v in self.app.global_state.values() if isinstance(v, int))
+        byte_slices = len(self.app.global_state) - uints
+        if uints > self.app.global_num_uint or byte_slices > self.app.global_num_byte_slice:
+            raise LogicError(f"store integer count {uints}/bytes count {byte_slices} exceeds schema "
+                             f"{self.app.global_num_uint}/{self.app.global_num_byte_slice}", cost=self.cost)
+
+    # ---- stack helpers ----
+
+    def _pop(self):
+        return self.stack.pop()
+
+    def _pop_int(self) -> int:
+        value = self.stack.pop()
+        if not isinstance(value, int):
+            raise self._fail("expected uint64, got bytes")
+        return value
+
+    def _pop_bytes(self) -> bytes:
+        value = self.stack.pop()
+        if not isinstance(value, bytes):
+            raise self._fail("expected bytes, got uint64")
+        return value
+
+    def _push_int(self, value: int):
+        if value < 0 or value > UINT64_MAX:
+            raise self._fail("uint64 overflow" if value > 0 else "uint64 underflow")
+        self.stack.append(value)
+
+    def _push_bytes(self, value: bytes):
+        if len(value) > MAX_BYTES_LENGTH:
+            raise self._fail("byte slice too long")
+        self.stack.append(value)
+
+    def _binary_int(self, fn):
+        b = self._pop_int()
+        a = self._pop_int()
+        self._push_int(fn(a, b))
+
+    # ---- resource resolution ----
+
+    def _available_accounts(self) -> list[str]:
+        accounts = [self.txn.sender, *self.txn.accounts, self.app.address]
+        accounts.extend(get_application_address(a) for a in self.txn.foreign_apps)
+        return accounts
+
+    def _resolve_account(self, ref: int | bytes) -> str:
+        if isinstance(ref, int):
+            if ref == 0:
+                return self.txn.sender
+            if ref <= len(self.txn.accounts):
+                return self.txn.accounts[ref - 1]
+            raise self._fail(f"invalid Account reference {ref}")
+        address = encoding.encode_address(ref)
+        if address not in self._available_accounts():
+            raise self._fail(f"unavailable Account {address}")
+        return address
+
+    def _resolve_asset(self, ref: int) -> int:
+        if ref < len(self.txn.foreign_assets):
+            return self.txn.foreign_assets[ref]
+        if ref in self.txn.foreign_assets:
+            return ref
+        raise self._fail(f"unavailable Asset {ref}")
+
+    def _resolve_app(self, ref: int) -> int:
+        if ref == 0:
+            return self.app.id
+        if ref <= len(self.txn.foreign_apps):
+            return self.txn.foreign_apps[ref - 1]
+        if ref in self.txn.foreign_apps or ref == self.app.id:
+            return ref
+        raise self._fail(f"unavailable App {ref}")
+
+    # ---- transaction fields ----
+
+    def _txn_field(self, txn: Txn, name: str, index: int | None = None, group_index: int = 0,
+                   result: TxnResult = None):
+        match name:
+            case "Sender":
+                return _address(txn.sender)
+            case "Fee":
+                return txn.fee
+            case "FirstValid":
+                return txn.first_valid or 0
+            case "LastValid":
+                return txn.last_valid or 0
+            case "Note":
+                return txn.note
+            case "Lease":
+                return txn.lease
+            case "Receiver":
+                return _address(txn.receiver) if txn.receiver else ZERO_ADDRESS
+            case "Amount":
+                return txn.amount
+            case "CloseRemainderTo":
+                return _address(txn.close_remainder_to) if txn.close_remainder_to else ZERO_ADDRESS
+            case "Type":
+                return txn.type.encode()
+            case "TypeEnum":
+                return TXN_TYPE_ENUMS[txn.type]
+            case "XferAsset":
+                return txn.xfer_asset
+            case "AssetAmount":
+                return txn.asset_amount
+            case "AssetSender":
+                return _address(txn.asset_sender) if txn.asset_sender else ZERO_ADDRESS
+            case "AssetReceiver":
+                return _address(txn.asset_receiver) if txn.asset_receiver else ZERO_ADDRESS
+            case "AssetCloseTo":
+                return _address(txn.asset_close_to) if txn.asset_close_to else ZERO_ADDRESS
+            case "GroupIndex":
+                return group_index
+            case "TxID":
+                return base64.b32decode(txn.get_txid() + "====")
+            case "ApplicationID":
+                return txn.application_id
+            case "OnCompletion":
+                return txn.on_completion
+            case "ApplicationArgs":
+                return txn.app_args[index]
+            case "NumAppArgs":
+                return len(txn.app_args)
+            case "Accounts":
+                return _address(txn.sender) if index == 0 else _address(txn.accounts[index - 1])
+            case "NumAccounts":
+                return len(txn.accounts)
+            case "Assets":
+                return txn.foreign_assets[index]
+            case "NumAssets":
+                return len(txn.foreign_assets)
+            case "Applications":
+                return self.app.id if index == 0 else txn.foreign_apps[index - 1]
+            case "NumApplications":
+                return len(txn.foreign_apps)
+            case "ApprovalProgram":
+                return _program_bytes(txn.approval_program)
+            case "ClearStateProgram":
+                return _program_bytes(txn.clear_program)
+            case "RekeyTo":
+                return _address(txn.rekey_to) if txn.rekey_to else ZERO_ADDRESS
+            case "ConfigAsset":
+                return txn.config_asset
+            case "ConfigAssetTotal":
+                return txn.total
+            case "ConfigAssetDecimals":
+                return txn.decimals
+            case "ConfigAssetDefaultFrozen":
+                return int(txn.default_frozen)
+            case "ConfigAssetUnitName":
+                return txn.unit_name
+            case "ConfigAssetName":
+                return txn.asset_name
+            case "ConfigAssetURL":
+                return txn.url
+            case "ConfigAssetMetadataHash":
+                return txn.metadata_hash
+            case "ConfigAssetManager":
+                return _address(txn.manager) if txn.manager else ZERO_ADDRESS
+            case "ConfigAssetReserve":
+                return _address(txn.reserve) if txn.reserve else ZERO_ADDRESS
+            case "ConfigAssetFreeze":
+                return _address(txn.freeze) if txn.freeze else ZERO_ADDRESS
+            case "ConfigAssetClawback":
+                return _address(txn.clawback) if txn.clawback else ZERO_ADDRESS
+            case "GlobalNumUint":
+                return txn.global_num_uint
+            case "GlobalNumByteSlice":
+                return txn.global_num_byte_slice
+            case "LocalNumUint":
+                return txn.local_num_uint
+            case "LocalNumByteSlice":
+                return txn.local_num_byte_slice
+            case "ExtraProgramPages":
+                return txn.extra_pages
+            case "GroupID":
+                return txn.group
+            case "Logs":
+                return result.logs[index]
+            case "NumLogs":
+                return len(result.logs)
+            case "LastLog":
+                return result.logs[-1] if result.logs else b""
+            case "CreatedAssetID":
+                return result.created_asset_id or 0
+            case "CreatedApplicationID":
+                return result.created_app_id or 0
+        raise self._fail(f"unsupported txn field {name}")
+
+    # ---- flow control ----
+
+    def op_err(self):
+        raise self._fail("err opcode executed")
+
+    def op_b(self, label):
+        return self.program.labels[label]
+
+    def op_bz(self, label):
+        return self.program.labels[label] if self._pop_int() == 0 else None
+
+    def op_bnz(self, label):
+        return self.program.labels[label] if self._pop_int() != 0 else None
+
+    def op_return(self):
+        value = self.stack.pop()
+        self.stack = [value]
+        return _STOP
+
+    def op_assert(self):
+        if self._pop_int() == 0:
+            raise self._fail("assert failed")
+
+    def op_callsub(self, label):
+        self.callstack.append(self.pc + 1)
+        return self.program.labels[label]
+
+    def op_retsub(self):
+        if not self.callstack:
+            raise self._fail("retsub with empty callstack")
+        return self.callstack.pop()
+
+    # ---- constants ----
+
+    def op_intcblock(self, *values):
+        self.intc = values
+
+    def op_bytecblock(self, *values):
+        self.bytec = values
+
+    def op_intc(self, i):
+        self.stack.append(self.intc[i])
+
+    def op_intc_0(self):
+        self.stack.append(self.intc[0])
+
+    def op_intc_1(self):
+        self.stack.append(self.intc[1])
+
+    def op_intc_2(self):
+        self.stack.append(self.intc[2])
+
+    def op_intc_3(self):
+        self.stack.append(self.intc[3])
+
+    def op_bytec(self, i):
+        self.stack.append(self.bytec[i])
+
+    def op_bytec_0(self):
+        self.stack.append(self.bytec[0])
+
+    def op_bytec_1(self):
+        self.stack.append(self.bytec[1])
+
+    def op_bytec_2(self):
+        self.stack.append(self.bytec[2])
+
+    def op_bytec_3(self):
+        self.stack.append(self.bytec[3])
+
+    def op_pushint(self, value):
+        self.stack.append(value)
+
+    def op_pushbytes(self, value):
+        self.stack.append(value)
+
+    # ---- stack manipulation ----
+
+    def op_pop(self):
+        self.stack.pop()
+
+    def op_dup(self):
+        self.stack.append(self.stack[-1])
+
+    def op_dup2(self):
+        self.stack.extend(self.stack[-2:])
+
+    def op_dig(self, n):
+        self.stack.append(self.stack[-1 - n])
+
+    def op_swap(self):
+        self.stack[-1], self.stack[-2] = self.stack[-2], self.stack[-1]
+
+    def op_select(self):
+        c = self._pop_int()
+        b = self._pop()
+        a = self._pop()
+        self.stack.append(b if c != 0 else a)
+
+    def op_cover(self, n):
+        value = self.stack.pop()
+        self.stack.insert(len(self.stack) - n, value)
+
+    def op_uncover(self, n):
+        self.stack.append(self.stack.pop(-1 - n))
+
+    # ---- arithmetic and logic ----
+
+    def op_add(self):
+        self._binary_int(lambda a, b: a + b)
+
+    def op_sub(self):
+        self._binary_int(lambda a, b: a - b)
+
+    def op_mul(self):
+        self._binary_int(lambda a, b: a * b)
+
+    def op_div(self):
+        b = self._pop_int()
+        a = self._pop_int()
+        if b == 0:
+            raise self._fail("/ 0")
+        self.stack.append(a // b)
+
+    def op_mod(self):
+        b = self._pop_int()
+        a = self._pop_int()
+        if b == 0:
+            raise self._fail("% 0")
+        self.stack.append(a % b)
+
+    def op_lt(self):
+        self._binary_int(lambda a, b: int(a < b))
+
+    def op_gt(self):
+        self._binary_int(lambda a, b: int(a > b))
+
+    def op_le(self):
+        self._binary_int(lambda a, b: int(a <= b))
+
+    def op_ge(self):
+        self._binary_int(lambda a, b: int(a >= b))
+
+    def op_and(self):
+        self._binary_int(lambda a, b: int(a != 0 and b != 0))
+
+    def op_or(self):
+        self._binary_int(lambda a, b: int(a != 0 or b != 0))
+
+    def op_eq(self):
+        b = self._pop()
+        a = self._pop()
+        if type(a) is not type(b):
+            raise self._fail("cannot compare uint64 to bytes")
+        self.stack.append(int(a == b))
+
+    def op_neq(self):
+        self.op_eq()
+        self.stack[-1] = 1 - self.stack[-1]
+
+    def op_not(self):
+        self.stack.append(int(self._pop_int() == 0))
+
+    def op_bitor(self):
+        self._binary_int(lambda a, b: a | b)
+
+    def op_bitand(self):
+        self._binary_int(lambda a, b: a & b)
+
+    def op_bitxor(self):
+        self._binary_int(lambda a, b: a ^ b)
+
+    def op_bitnot(self):
+        self.stack.append(UINT64_MAX ^ self._pop_int())
+
+    def op_mulw(self):
+        b = self._pop_int()
+        a = self._pop_int()
+        product = a * b
+        self.stack.extend((product >> 64, product & UINT64_MAX))
+
+    def op_addw(self):
+        b = self._pop_int()
+        a = self._pop_int()
+        total = a + b
+        self.stack.extend((total >> 64, total & UINT64_MAX))
+
+    def op_divmodw(self):
+        d_lo = self._pop_int()
+        d_hi = self._pop_int()
+        n_lo = self._pop_int()
+        n_hi = self._pop_int()
+        divisor = (d_hi << 64) | d_lo
+        if divisor == 0:
+            raise self._fail("/ 0")
+        q, r = divmod((n_hi << 64) | n_lo, divisor)
+        self.stack.extend((q >> 64, q & UINT64_MAX, r >> 64, r & UINT64_MAX))
+
+    def op_divw(self):
+        c = self._pop_int()
+        lo = self._pop_int()
+        hi = self._pop_int()
+        if c == 0:
+            raise self._fail("/ 0")
+        self._push_int(((hi << 64) | lo) // c)
+
+    def op_exp(self):
+        b = self._pop_int()
+        a = self._pop_int()
+        if a == 0 and b == 0:
+            raise self._fail("0^0 is undefined")
+        self._push_int(a ** b)
+
+    def op_shl(self):
+        b = self._pop_int()
+        a = self._pop_int()
+        self.stack.append((a << b) & UINT64_MAX)
+
+    def op_shr(self):
+        b = self._pop_int()
+        a = self._pop_int()
+        self.stack.append(a >> b)
+
+    def op_sqrt(self):
+        from math import isqrt
+        self.stack.append(isqrt(self._pop_int()))
+
+    def op_bitlen(self):
+        value = self._pop()
+        self.stack.append((int.from_bytes(value, "big") if isinstance(value, bytes) else value).bit_length())
+
+    # ---- bytes ----
+
+    def op_len(self):
+        self.stack.append(len(self._pop_bytes()))
+
+    def op_itob(self):
+        self.stack.append(self._pop_int().to_bytes(8, "big"))
+
+    def op_btoi(self):
+        value = self._pop_bytes()
+        if len(value) > 8:
+            raise self._fail("btoi arg too long")
+        self.stack.append(int.from_bytes(value, "big"))
+
+    def op_concat(self):
+        b = self._pop_bytes()
+        a = self._pop_bytes()
+        self._push_bytes(a + b)
+
+    def op_substring(self, start, end):
+        value = self._pop_bytes()
+        if start > end or end > len(value):
+            raise self._fail("substring range beyond length of string")
+        self.stack.append(value[start:end])
+
+    def op_substring3(self):
+        end = self._pop_int()
+        start = self._pop_int()
+        value = self._pop_bytes()
+        if start > end or end > len(value):
+            raise self._fail("substring range beyond length of string")
+        self.stack.append(value[start:end])
+
+    def op_extract(self, start, length):
+        value = self._pop_bytes()
+        end = len(value) if length == 0 else start + length
+        if start > len(value) or end > len(value):
+            raise self._fail("extraction range beyond length of string")
+        self.stack.append(value[start:end])
+
+    def op_extract3(self):
+        length = self._pop_int()
+        start = self._pop_int()
+        value = self._pop_bytes()
+        if start + length > len(value):
+            raise self._fail("extraction range beyond length of string")
+        self.stack.append(value[start:start + length])
+
+    def _extract_uint(self, size):
+        start = self._pop_int()
+        value = self._pop_bytes()
+        if start + size > len(value):
+            raise self._fail("extraction range beyond length of string")
+        self.stack.append(int.from_bytes(value[start:start + size], "big"))
+
+    def op_extract_uint16(self):
+        self._extract_uint(2)
+
+    def op_extract_uint32(self):
+        self._extract_uint(4)
+
+    def op_extract_uint64(self):
+        self._extract_uint(8)
+
+    def op_replace2(self, start):
+        replacement = self._pop_bytes()
+        value = self._pop_bytes()
+        if int(start) + len(replacement) > len(value):
+            raise self._fail("replacement end exceeds original length")
+        start = int(start)
+        self.stack.append(value[:start] + replacement + value[start + len(replacement):])
+
+    def op_replace3(self):
+        replacement = self._pop_bytes()
+        start = self._pop_int()
+        value = self._pop_bytes()
+        if start + len(replacement) > len(value):
+            raise self._fail("replacement end exceeds original length")
+        self.stack.append(value[:start] + replacement + value[start + len(replacement):])
+
+    def op_getbyte(self):
+        i = self._pop_int()
+        value = self._pop_bytes()
+        self.stack.append(value[i])
+
+    def op_setbyte(self):
+        b = self._pop_int()
+        i = self._pop_int()
+        value = bytearray(self._pop_bytes())
+        if b > 255:
+            raise self._fail("setbyte value > 255")
+        value[i] = b
+        self.stack.append(bytes(value))
+
+    def op_getbit(self):
+        i = self._pop_int()
+        value = self._pop()
+        if isinstance(value, int):
+            if i > 63:
+                raise self._fail("getbit index > 63")
+            self.stack.append((value >> i) & 1)
+        else:
+            self.stack.append((value[i // 8] >> (7 - i % 8)) & 1)
+
+    def op_setbit(self):
+        bit = self._pop_int()
+        i = self._pop_int()
+        value = self._pop()
+        if bit > 1:
+            raise self._fail("setbit value > 1")
+        if isinstance(value, int):
+            self.stack.append((value & ~(1 << i)) | (bit << i))
+        else:
+            data = bytearray(value)
+            mask = 1 << (7 - i % 8)
+            data[i // 8] = (data[i // 8] | mask) if bit else (data[i // 8] & ~mask)
+            self.stack.append(bytes(data))
+
+    def op_bzero(self):
+        self._push_bytes(bytes(self._pop_int()))
+
+    def op_bytes_eq(self):
+        b = self._pop_bytes()
+        a = self._pop_bytes()
+        self.stack.append(int(int.from_bytes(a, "big") == int.from_bytes(b, "big")))
+
+    def op_sha256(self):
+        self.stack.append(hashlib.sha256(self._pop_bytes()).digest())
+
+    def op_sha512_256(self):
+        self.stack.append(_sha512_256(self._pop_bytes()))
+
+    def op_keccak256(self):
+        self.stack.append(keccak.new(data=self._pop_bytes(), digest_bits=256).digest())
+
+    def op_sha3_256(self):
+        self.stack.append(hashlib.sha3_256(self._pop_bytes()).digest())
+
+    # ---- scratch space ----
+
+    def op_load(self, i):
+        self.stack.append(self.scratch[i])
+
+    def op_store(self, i):
+        self.scratch[i] = self.stack.pop()
+
+    def op_loads(self):
+        self.stack.append(self.scratch[self._pop_int()])
+
+    def op_stores(self):
+        value = self.stack.pop()
+        self.scratch[self._pop_int()] = value
+
+    def op_gload(self, t, i):
+        self.stack.append(self._group_scratch(t)[i])
+
+    def op_gloads(self, i):
+        self.stack.append(self._group_scratch(self._pop_int())[i])
+
+    def _group_scratch(self, t):
+        if t >= self.index or t not in self.group.scratch:
+            raise self._fail(f"can't read scratch of transaction {t}")
+        return self.group.scratch[t]
+
+    # ---- transaction and global fields ----
+
+    def op_txn(self, name, index=None):
+        self.stack.append(self._txn_field(self.txn, name, index, self.index, self.result))
+
+    def op_txna(self, name, index):
+        self.op_txn(name, index)
+
+    def op_txnas(self, name):
+        self.op_txn(name, self._pop_int())
+
+    def _group_txn(self, t) -> Txn:
+        if self.caller is not None:
+            raise self._fail("inner application calls cannot inspect the outer group")
+        if t >= len(self.group.txns):
+            raise self._fail(f"gtxn lookup TxnGroup[{t}] but it only has {len(self.group.txns)}")
+        return self.group.txns[t]
+
+    def op_gtxn(self, t, name, index=None):
+        self.stack.append(self._txn_field(self._group_txn(t), name, index, t))
+
+    def op_gtxna(self, t, name, index):
+        self.op_gtxn(t, name, index)
+
+    def op_gtxnas(self, t, name):
+        self.op_gtxn(t, name, self._pop_int())
+
+    def op_gtxns(self, name, index=None):
+        self.op_gtxn(self._pop_int(), name, index)
+
+    def op_gtxnsa(self, name, index):
+        self.op_gtxns(name, index)
+
+    def op_gtxnsas(self, name):
+        i = self._pop_int()
+        self.op_gtxn(self._pop_int(), name, i)
+
+    def op_global(self, name):
+        match name:
+            case "MinTxnFee":
+                value = self.ledger.min_fee
+            case "MinBalance":
+                value = MIN_BALANCE
+            case "MaxTxnLife":
+                value = 1000
+            case "ZeroAddress":
+                value = ZERO_ADDRESS
+            case "GroupSize":
+                value = len(self.group.txns) if self.caller is None else 1
+            case "LogicSigVersion":
+                value = 8
+            case "Round":
+                value = self.group.round
+            case "LatestTimestamp":
+                value = self.ledger.timestamp
+            case "CurrentApplicationID":
+                value = self.app.id
+            case "CreatorAddress":
+                value = _address(self.app.creator)
+            case "CurrentApplicationAddress":
+                value = _address(self.app.address)
+            case "GroupID":
+                value = self.txn.group
+            case "OpcodeBudget":
+                value = self.group.budget - self.group.cost_used
+            case "CallerApplicationID":
+                value = self.caller.app.id if self.caller else 0
+            case "CallerApplicationAddress":
+                value = _address(self.caller.app.address) if self.caller else ZERO_ADDRESS
+            case _:
+                raise self._fail(f"unsupported global field {name}")
+        self.stack.append(value)
+
+    # ---- state access ----
+
+    def op_app_global_get(self):
+        key = self._pop_bytes()
+        self.stack.append(self.app.global_state.get(key, 0))
+
+    def op_app_global_get_ex(self):
+        key = self._pop_bytes()
+        app_id = self._resolve_app(self._pop_int())
+        state = self.ledger.apps[app_id].global_state if app_id in self.ledger.apps else {}
+        self.stack.extend((state.get(key, 0), int(key in state)))
+
+    def op_app_global_put(self):
+        value = self._pop()
+        key = self._pop_bytes()
+        self._check_key_value(key, value)
+        self.ledger._touch("app", self.app.id, self.ledger.apps)
+        self.app = self.ledger.apps[self.app.id]
+        self.app.global_state[key] = value
+
+    def op_app_global_del(self):
+        key = self._pop_bytes()
+        self.ledger._touch("app", self.app.id, self.ledger.apps)
+        self.app = self.ledger.apps[self.app.id]
+        self.app.global_state.pop(key, None)
+
+    def _local_state(self, ref) -> dict:
+        address = self._resolve_account(ref)
+        acct = self.ledger.accounts.get(address)
+        if acct is None or self.app.id not in acct.opted_in_apps:
+            raise self._fail(f"account {address} has not opted in to application {self.app.id}")
+        return self.ledger._account(address).opted_in_apps[self.app.id]
+
+    def op_app_local_get(self):
+        key = self._pop_bytes()
+        self.stack.append(self._local_state(self._pop()).get(key, 0))
+
+    def op_app_local_put(self):
+        value = self._pop()
+        key = self._pop_bytes()
+        self._check_key_value(key, value)
+        self._local_state(self._pop())[key] = value
+
+    def op_app_local_del(self):
+        key = self._pop_bytes()
+        self._local_state(self._pop()).pop(key, None)
+
+    def op_app_opted_in(self):
+        app_id = self._resolve_app(self._pop_int())
+        acct = self.ledger.accounts.get(self._resolve_account(self._pop()))
+        self.stack.append(int(acct is not None and app_id in acct.opted_in_apps))
+
+    def _check_key_value(self, key, value):
+        if len(key) > MAX_KEY_LENGTH:
+            raise self._fail("key too long")
+        if isinstance(value, bytes) and len(key) + len(value) > MAX_KEY_VALUE_LENGTH:
+            raise self._fail("key/value total too long")
+
+    # Boxes of the current app. A box must be referenced by a transaction of the group; creating a box adds
+    # its minimum balance to the app account
+    def _box_name(self) -> bytes:
+        name = self._pop_bytes()
+        if not 0 < len(name) <= MAX_KEY_LENGTH:
+            raise self._fail("box names must be 1 to 64 bytes")
+        if (self.app.id, name) not in self.group.box_refs:
+            raise self._fail(f"invalid Box reference {name.hex()}")
+        return name
+
+    def _box(self, name: bytes) -> bytes:
+        box = self.app.boxes.get(name)
+        if box is None:
+            raise self._fail(f"no such box {name.hex()}")
+        return box
+
+    def _box_write(self, name: bytes, value: bytes | None):
+        self.ledger._touch("app", self.app.id, self.ledger.apps)
+        self.app = self.ledger.apps[self.app.id]
+        created = name not in self.app.boxes
+        if value is None or created:
+            acct = self.ledger._account(self.app.address)
+            delta = -1 if value is None else 1
+            size = len(self.app.boxes[name]) if value is None else len(value)
+            acct.total_boxes += delta
+            acct.total_box_bytes += delta * (len(name) + size)
+            self.touched.add(self.app.address)
+        if value is None:
+            del self.app.boxes[name]
+        else:
+            self.app.boxes[name] = value
+
+    def op_box_create(self):
+        size = self._pop_int()
+        name = self._box_name()
+        if size > MAX_BOX_SIZE:
+            raise self._fail(f"box size {size} too large")
+        box = self.app.boxes.get(name)
+        if box is not None and len(box) != size:
+            raise self._fail(f"box {name.hex()} already exists with size {len(box)}")
+        if box is None:
+            self._box_write(name, bytes(size))
+        self.stack.append(int(box is None))
+
+    def op_box_extract(self):
+        length = self._pop_int()
+        start = self._pop_int()
+        box = self._box(self._box_name())
+        if start + length > len(box):
+            raise self._fail("box_extract range beyond box")
+        self._push_bytes(box[start:start + length])
+
+    def op_box_replace(self):
+        value = self._pop_bytes()
+        start = self._pop_int()
+        name = self._box_name()
+        box = self._box(name)
+        if start + len(value) > len(box):
+            raise self._fail("box_replace range beyond box")
+        self._box_write(name, box[:start] + value + box[start + len(value):])
+
+    def op_box_del(self):
+        name = self._box_name()
+        exists = name in self.app.boxes
+        if exists:
+            self._box_write(name, None)
+        self.stack.append(int(exists))
+
+    def op_box_len(self):
+        box = self.app.boxes.get(self._box_name())
+        self.stack.extend((len(box), 1) if box is not None else (0, 0))
+
+    def op_box_get(self):
+        box = self.app.boxes.get(self._box_name())
+        self.stack.extend((box, 1) if box is not None else (b"", 0))
+
+    def op_box_put(self):
+        value = self._pop_bytes()
+        name = self._box_name()
+        box = self.app.boxes.get(name)
+        if box is not None and len(box) != len(value):
+            raise self._fail(f"box_put wrong size {len(box)} != {len(value)}")
+        self._box_write(name, value)
+
+    def op_balance(self):
+        self.stack.append(self.ledger.balance(self._resolve_account(self._pop())))
+
+    def op_min_balance(self):
+        self.stack.append(self.ledger.min_balance(self._resolve_account(self._pop())))
+
+    def op_asset_holding_get(self, name):
+        asset_id = self._resolve_asset(self._pop_int())
+        address = self._resolve_account(self._pop())
+        held = self.ledger.asset_balance(address, asset_id)
+        if held is None:
+            self.stack.extend((0, 0))
+        elif name == "AssetBalance":
+            self.stack.extend((held, 1))
+        elif name == "AssetFrozen":
+            self.stack.extend((0, 1))
+        else:
+            raise self._fail(f"unsupported asset holding field {name}")
+
+    def op_asset_params_get(self, name):
+        asset_id = self._resolve_asset(self._pop_int())
+        asset = self.ledger.assets.get(asset_id)
+        if asset is None:
+            self.stack.extend((0, 0))
+            return
+        addr = lambda a: _address(a) if a else ZERO_ADDRESS
+        value = {
+            "AssetTotal": asset.total,
+            "AssetDecimals": asset.decimals,
+            "AssetDefaultFrozen": int(asset.default_frozen),
+            "AssetUnitName": asset.unit_name,
+            "AssetName": asset.name,
+            "AssetURL": asset.url,
+            "AssetMetadataHash": asset.metadata_hash,
+            "AssetManager": addr(asset.manager),
+            "AssetReserve": addr(asset.reserve),
+            "AssetFreeze": addr(asset.freeze),
+            "AssetClawback": addr(asset.clawback),
+            "AssetCreator": addr(asset.creator),
+        }[name]
+        self.stack.extend((value, 1))
+
+    def op_app_params_get(self, name):
+        app_id = self._resolve_app(self._pop_int())
+        app = self.ledger.apps.get(app_id)
+        if app is None:
+            self.stack.extend((0, 0))
+            return
+        value = {
+            "AppApprovalProgram": _program_bytes(app.approval),
+            "AppClearStateProgram": _program_bytes(app.clear),
+            "AppGlobalNumUint": app.global_num_uint,
+            "AppGlobalNumByteSlice": app.global_num_byte_slice,
+            "AppLocalNumUint": app.local_num_uint,
+            "AppLocalNumByteSlice": app.local_num_byte_slice,
+            "AppExtraProgramPages": app.extra_pages,
+            "AppCreator": _address(app.creator),
+            "AppAddress": _address(app.address),
+        }[name]
+        self.stack.extend((value, 1))
+
+    def op_acct_params_get(self, name):
+        address = self._resolve_account(self._pop())
+        acct = self.ledger.accounts.get(address)
+        if acct is None:
+            self.stack.extend((0, 0))
+            return
+        value = {
+            "AcctBalance": acct.balance,
+            "AcctMinBalance": self.ledger.min_balance(address),
+            "AcctAuthAddr": ZERO_ADDRESS,
+        }[name]
+        self.stack.extend((value, 1))
+
+    def op_log(self):
+        value = self._pop_bytes()
+        self.log_size += len(value)
+        if len(self.result.logs) >= MAX_LOG_CALLS or self.log_size > MAX_LOG_SIZE:
+            raise self._fail("too many log calls or log size exceeded")
+        self.result.logs.append(value)
+
+    # ---- inner transactions ----
+
+    def op_itxn_begin(self):
+        if self.inner_group is not None:
+            raise self._fail("itxn_begin without itxn_submit")
+        self.inner_group = [self._new_inner()]
+
+    def op_itxn_next(self):
+        if self.inner_group is None:
+            raise self._fail("itxn_next without itxn_begin")
+        self.inner_group.append(self._new_inner())
+
+    def _new_inner(self) -> Txn:
+        if self.group.inner_left <= 0:
+            raise self._fail("too many inner transactions")
+        self.group.inner_left -= 1
+        # fee defaults to the minimum that the pooled credit cannot cover
+        return Txn(type="pay", sender=self.app.address, fee=max(0, self.ledger.min_fee - self.group.fee_credit))
+
+    def op_itxn_field(self, name):
+        if self.inner_group is None:
+            raise self._fail("itxn_field without itxn_begin")
+        txn = self.inner_group[-1]
+        value = self._pop()
+        address_fields = {
+            "Sender": "sender", "Receiver": "receiver", "CloseRemainderTo": "close_remainder_to",
+            "AssetSender": "asset_sender", "AssetReceiver": "asset_receiver", "AssetCloseTo": "asset_close_to",
+            "ConfigAssetManager": "manager", "ConfigAssetReserve": "reserve", "ConfigAssetFreeze": "freeze",
+            "ConfigAssetClawback": "clawback", "RekeyTo": "rekey_to",
+        }
+        plain_fields = {
+            "Fee": "fee", "Amount": "amount", "AssetAmount": "asset_amount", "Note": "note",
+            "ApplicationID": "application_id", "OnCompletion": "on_completion", "ConfigAsset": "config_asset",
+            "ConfigAssetTotal": "total", "ConfigAssetDecimals": "decimals", "ConfigAssetUnitName": "unit_name",
+            "ConfigAssetName": "asset_name", "ConfigAssetURL": "url", "ConfigAssetMetadataHash": "metadata_hash",
+        }
+        if name in address_fields:
+            if len(value) != 32:
+                raise self._fail(f"{name} must be a 32 byte address")
+            address = encoding.encode_address(value)
+            if name == "Sender" and address != self.app.address:
+                raise self._fail("inner transaction sender must be the application address")
+            if name in ("Receiver", "CloseRemainderTo", "AssetReceiver", "AssetCloseTo", "AssetSender"):
+                address = self._resolve_account(value)
+            setattr(txn, address_fields[name], address)
+        elif name in plain_fields:
+            setattr(txn, plain_fields[name], value)
+        elif name == "TypeEnum":
+            txn.type = {v: k for k, v in TXN_TYPE_ENUMS.items()}[value]
+        elif name == "Type":
+            txn.type = value.decode()
+        elif name == "XferAsset":
+            txn.xfer_asset = self._resolve_asset(value)
+        elif name == "ConfigAssetDefaultFrozen":
+            txn.default_frozen = bool(value)
+        elif name == "ApplicationArgs":
+            txn.app_args.append(value)
+        elif name == "Accounts":
+            txn.accounts.append(self._resolve_account(value))
+        elif name == "Assets":
+            txn.foreign_assets.append(self._resolve_asset(value))
+        elif name == "Applications":
+            txn.foreign_apps.append(self._resolve_app(value))
+        else:
+            raise self._fail(f"unsupported itxn field {name}")
+
+    def op_itxn_submit(self):
+        if not self.inner_group:
+            raise self._fail("itxn_submit without itxn_begin")
+        group, self.inner_group = self.inner_group, None
+        self.last_inner = []
+        for inner in group:
+            if inner.fee < self.ledger.min_fee:
+                self.group.fee_credit -= self.ledger.min_fee - inner.fee
+                if self.group.fee_credit < 0:
+                    raise self._fail("fee too small: the group does not cover the inner transaction fees")
+            result = TxnResult(txn=inner, confirmed_round=self.group.round)
+            self.ledger._apply(inner, result, 0, self.touched, caller=self)
+            self.result.inner_txns.append(result)
+            self.last_inner.append(result)
+
+    def op_itxn(self, name, index=None):
+        if not self.last_inner:
+            raise self._fail("no inner transaction available")
+        last = self.last_inner[-1]
+        self.stack.append(self._txn_field(last.txn, name, index, result=last))
+
+    def op_itxna(self, name, index):
+        self.op_itxn(name, index)
+
+    def op_gitxn(self, t, name, index=None):
+        inner = self.last_inner[t]
+        self.stack.append(self._txn_field(inner.txn, name, index, result=inner))
+
+    def op_gitxna(self, t, name, index):
+        self.op_gitxn(t, name, index)
+
+
+_STOP = object()
+
+_OP_ALIASES = {
+    "+": "add", "-": "sub", "*": "mul", "/": "div", "%": "mod",
+    "<": "lt", ">": "gt", "<=": "le", ">=": "ge", "&&": "and", "||": "or",
+    "==": "eq", "!=": "neq", "!": "not", "|": "bitor", "&": "bitand", "^": "bitxor", "~": "bitnot",
+    "b==": "bytes_eq", "int": "pushint", "byte": "pushbytes", "addr": "pushbytes", "method": "pushbytes",
+}
+
+
+def _program_bytes(program: Program | None) -> bytes:
+    if program is None:
+        return b""
+    return program.bytecode if program.bytecode is not None else program.source.encode()
+
+
+_program_cache: dict[str, Program] = {}
+
+
+# ---- assembler ----
+# Byte encoding of AVM v8 programs, used to report program sizes (what algod's /v2/teal/compile returns)
+
+OPCODES = {
+    "err": 0x00, "sha256": 0x01, "keccak256": 0x02, "sha512_256": 0x03, "ed25519verify": 0x04,
+    "ecdsa_verify": 0x05, "ecdsa_pk_decompress": 0x06, "ecdsa_pk_recover": 0x07,
+    "+": 0x08, "-": 0x09, "/": 0x0a, "*": 0x0b, "<": 0x0c, ">": 0x0d, "<=": 0x0e, ">=": 0x0f,
+    "&&": 0x10, "||": 0x11, "==": 0x12, "!=": 0x13, "!": 0x14, "len": 0x15, "itob": 0x16, "btoi": 0x17,
+    "%": 0x18, "|": 0x19, "&": 0x1a, "^": 0x1b, "~": 0x1c, "mulw": 0x1d, "addw": 0x1e, "divmodw": 0x1f,
+    "intcblock": 0x20, "intc": 0x21, "intc_0": 0x22, "intc_1": 0x23, "intc_2": 0x24, "intc_3": 0x25,
+    "bytecblock": 0x26, "bytec": 0x27, "bytec_0": 0x28, "bytec_1": 0x29, "bytec_2": 0x2a, "bytec_3": 0x2b,
+    "arg": 0x2c, "arg_0": 0x2d, "arg_1": 0x2e, "arg_2": 0x2f, "arg_3": 0x30,
+    "txn": 0x31, "global": 0x32, "gtxn": 0x33, "load": 0x34, "store": 0x35, "txna": 0x36, "gtxna": 0x37,
+    "gtxns": 0x38, "gtxnsa": 0x39, "gload": 0x3a, "gloads": 0x3b, "gaid": 0x3c, "gaids": 0x3d,
+    "loads": 0x3e, "stores": 0x3f,
+    "bnz": 0x40, "bz": 0x41, "b": 0x42, "return": 0x43, "assert": 0x44,
+    "pop": 0x48, "dup": 0x49, "dup2": 0x4a, "dig": 0x4b, "swap": 0x4c, "select": 0x4d, "cover": 0x4e,
+    "uncover": 0x4f, "concat": 0x50, "substring": 0x51, "substring3": 0x52, "getbit": 0x53, "setbit": 0x54,
+    "getbyte": 0x55, "setbyte": 0x56, "extract": 0x57, "extract3": 0x58, "extract_uint16": 0x59,
+    "extract_uint32": 0x5a, "extract_uint64": 0x5b, "replace2": 0x5c, "replace3": 0x5d,
+    "base64_decode": 0x5e, "json_ref": 0x5f,
+    "balance": 0x60, "app_opted_in": 0x61, "app_local_get": 0x62, "app_local_get_ex": 0x63,
+    "app_global_get": 0x64, "app_global_get_ex": 0x65, "app_local_put": 0x66, "app_global_put": 0x67,
+    "app_local_del": 0x68, "app_global_del": 0x69,
+    "asset_holding_get": 0x70, "asset_params_get": 0x71, "app_params_get": 0x72, "acct_params_get": 0x73,
+    "min_balance": 0x78, "pushbytes": 0x80, "pushint": 0x81, "ed25519verify_bare": 0x84,
+    "callsub": 0x88, "retsub": 0x89,
+    "shl": 0x90, "shr": 0x91, "sqrt": 0x92, "bitlen": 0x93, "exp": 0x94, "expw": 0x95, "bsqrt": 0x96,
+    "divw": 0x97, "sha3_256": 0x98,
+    "b+": 0xa0, "b-": 0xa1, "b/": 0xa2, "b*": 0xa3, "b<": 0xa4, "b>": 0xa5, "b<=": 0xa6, "b>=": 0xa7,
+    "b==": 0xa8, "b!=": 0xa9, "b%": 0xaa, "b|": 0xab, "b&": 0xac, "b^": 0xad, "b~": 0xae, "bzero": 0xaf,
+    "log": 0xb0, "itxn_begin": 0xb1, "itxn_field": 0xb2, "itxn_submit": 0xb3, "itxn": 0xb4, "itxna": 0xb5,
+    "itxn_next": 0xb6, "gitxn": 0xb7, "gitxna": 0xb8, "box_create": 0xb9, "box_extract": 0xba,
+    "box_replace": 0xbb, "box_del": 0xbc, "box_len": 0xbd, "box_get": 0xbe, "box_put": 0xbf,
+    "txnas": 0xc0, "gtxnas": 0xc1, "gtxnsas": 0xc2, "args": 0xc3, "gloadss": 0xc4, "itxnas": 0xc5,
+    "gitxnas": 0xc6, "vrf_verify": 0xd0, "block": 0xd1,
+}
+
+TXN_FIELDS = [
+    "Sender", "Fee", "FirstValid", "FirstValidTime", "LastValid", "Note", "Lease", "Receiver", "Amount",
+    "CloseRemainderTo", "VotePK", "SelectionPK", "VoteFirst", "VoteLast", "VoteKeyDilution", "Type", "TypeEnum",
+    "XferAsset", "AssetAmount", "AssetSender", "AssetReceiver", "AssetCloseTo", "GroupIndex", "TxID",
+    "ApplicationID", "OnCompletion", "ApplicationArgs", "NumAppArgs", "Accounts", "NumAccounts",
+    "ApprovalProgram", "ClearStateProgram", "RekeyTo", "ConfigAsset", "ConfigAssetTotal", "ConfigAssetDecimals",
+    "ConfigAssetDefaultFrozen", "ConfigAssetUnitName", "ConfigAssetName", "ConfigAssetURL",
+    "ConfigAssetMetadataHash", "ConfigAssetManager", "ConfigAssetReserve", "ConfigAssetFreeze",
+    "ConfigAssetClawback", "FreezeAsset", "FreezeAssetAccount", "FreezeAssetFrozen", "Assets", "NumAssets",
+    "Applications", "NumApplications", "GlobalNumUint", "GlobalNumByteSlice", "LocalNumUint",
+    "LocalNumByteSlice", "ExtraProgramPages", "Nonparticipation", "Logs", "NumLogs", "CreatedAssetID",
+    "CreatedApplicationID", "LastLog", "StateProofPK", "ApprovalProgramPages", "NumApprovalProgramPages",
+    "ClearStateProgramPages", "NumClearStateProgramPages",
+]
+
+# Immediate field names, per opcode, encoded as their index in these lists
+FIELD_GROUPS = {
+    "global": [
+        "MinTxnFee", "MinBalance", "MaxTxnLife", "ZeroAddress", "GroupSize", "LogicSigVersion", "Round",
+        "LatestTimestamp", "CurrentApplicationID", "CreatorAddress", "CurrentApplicationAddress", "GroupID",
+        "OpcodeBudget", "CallerApplicationID", "CallerApplicationAddress",
+    ],
+    "asset_holding_get": ["AssetBalance", "AssetFrozen"],
+    "asset_params_get": [
+        "AssetTotal", "AssetDecimals", "AssetDefaultFrozen", "AssetUnitName", "AssetName", "AssetURL",
+        "AssetMetadataHash", "AssetManager", "AssetReserve", "AssetFreeze", "AssetClawback", "AssetCreator",
+    ],
+    "app_params_get": [
+        "AppApprovalProgram", "AppClearStateProgram", "AppGlobalNumUint", "AppGlobalNumByteSlice",
+        "AppLocalNumUint", "AppLocalNumByteSlice", "AppExtraProgramPages", "AppCreator", "AppAddress",
+    ],
+    "acct_params_get": ["AcctBalance", "AcctMinBalance", "AcctAuthAddr"],
+    "base64_decode": ["URLEncoding", "StdEncoding"],
+    "json_ref": ["JSONString", "JSONUint64", "JSONObject"],
+    "ecdsa_verify": ["Secp256k1", "Secp256r1"],
+    "ecdsa_pk_decompress": ["Secp256k1", "Secp256r1"],
+    "ecdsa_pk_recover": ["Secp256k1", "Secp256r1"],
+    "vrf_verify": ["VrfAlgorand"],
+    "block": ["BlkSeed", "BlkTimestamp"],
+}
+
+# Array forms picked by the assembler when a txn-like opcode gets an extra index immediate
+_ARRAY_FORMS = {"txn": "txna", "gtxn": "gtxna", "gtxns": "gtxnsa", "itxn": "itxna", "gitxn": "gitxna"}
+_BRANCHES = ("b", "bz", "bnz", "callsub")
+
+
+def _varuint(value: int) -> bytes:
+    out = bytearray()
+    while value >= 0x80:
+        out.append(value & 0x7f | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _field_index(op: str, name) -> int:
+    if isinstance(name, int):
+        return name
+    names = FIELD_GROUPS.get(op, TXN_FIELDS)
+    if name not in names:
+        raise SimulationError(f"unknown field {name} for {op}")
+    return names.index(name)
+
+
+def _encode(op: str, imm: tuple) -> tuple[int, bytes]:
+    # returns the opcode and its immediates (branch targets are patched afterwards)
+    match op:
+        case _ if op in _BRANCHES:
+            return OPCODES[op], b""
+        case "int":
+            return OPCODES["pushint"], _varuint(imm[0])
+        case "byte" | "addr" | "method":
+            return OPCODES["pushbytes"], _varuint(len(imm[0])) + imm[0]
+        case "pushint":
+            return OPCODES[op], _varuint(imm[0])
+        case "pushbytes":
+            return OPCODES[op], _varuint(len(imm[0])) + imm[0]
+        case "intcblock":
+            return OPCODES[op], _varuint(len(imm)) + b"".join(_varuint(v) for v in imm)
+        case "bytecblock":
+            return OPCODES[op], _varuint(len(imm)) + b"".join(_varuint(len(v)) + v for v in imm)
+        case "replace":
+            return (OPCODES["replace2"], bytes([int(imm[0])])) if imm else (OPCODES["replace3"], b"")
+        case "txn" | "gtxn" | "gtxns" | "itxn" | "gitxn" | "txna" | "gtxna" | "gtxnsa" | "itxna" | "gitxna" \
+                | "txnas" | "gtxnas" | "gtxnsas" | "itxnas" | "gitxnas" | "itxn_field":
+            group = op in ("gtxn", "gtxna", "gtxnas", "gitxn", "gitxna", "gitxnas")
+            args = list(imm)
+            prefix = [int(args.pop(0))] if group else []
+            name = args.pop(0)
+            if args and op in _ARRAY_FORMS:
+                op = _ARRAY_FORMS[op]
+            return OPCODES[op], bytes(prefix + [_field_index("txn", name)] + [int(a) for a in args])
+        case _ if op in FIELD_GROUPS:
+            return OPCODES[op], bytes([_field_index(op, imm[0])])
+        case _:
+            if op not in OPCODES:
+                raise SimulationError(f"cannot assemble {op}")
+            return OPCODES[op], bytes(int(a) for a in imm)
+
+
+def assemble(program: Program) -> bytes:
+    """Bytecode of a parsed program. Branch offsets are 2 bytes, relative to the next instruction."""
+    if program.bytecode is not None:
+        return program.bytecode
+    encoded = [_encode(op, imm) for op, imm, _ in program.instructions]
+    offsets, pc = [], len(_varuint(program.version))
+    for (op, imm, _), (_, immediates) in zip(program.instructions, encoded):
+        offsets.append(pc)
+        pc += 1 + (2 if op in _BRANCHES else len(immediates))
+    offsets.append(pc)
+    out = bytearray(_varuint(program.version))
+    for i, ((op, imm, line_no), (opcode, immediates)) in enumerate(zip(program.instructions, encoded)):
+        out.append(opcode)
+        if op in _BRANCHES:
+            delta = offsets[program.labels[imm[0]]] - offsets[i + 1]
+            if not -0x8000 <= delta < 0x8000:
+                raise SimulationError(f"branch to {imm[0]} too far at line {line_no}")
+            out += (delta & 0xffff).to_bytes(2, "big")
+        else:
+            out += immediates
+    program.bytecode = bytes(out)
+    return program.bytecode
+
+
+# Parse (once per source text) a TEAL program, ready to be evaluated
+def load_program(source: str) -> Program:
+    program = _program_cache.get(source)
+    if program is None:
+        program = Program(source)
+        _program_cache[source] = program
+    return program
+
+
+@dataclass
+class CallResult:
+    method: str
+    tx_id: str
+    cost: int
+    inner_txn_count: int
+    return_value: object
+    fee: int
+    results: list[TxnResult]
+
+
+# ABI-aware wrapper that deploys the BorrowMyNFT programs on a Ledger and calls its methods, in the
+# same shape as beaker's ApplicationClient.call (transaction arguments are passed as Txn objects).
+class SimulatedApp:
+    def __init__(self, ledger: Ledger, approval_path=APPROVAL_PATH, clear_path=CLEAR_PATH,
+                 contract_path=CONTRACT_PATH, app_id: int = 0):
+        self.ledger = ledger
+        with open(approval_path) as f:
+            self.approval = load_program(f.read())
+        with open(clear_path) as f:
+            self.clear = load_program(f.read())
+        with open(contract_path) as f:
+            spec = json.load(f)
+        self.contract = abi.Contract.undictify(spec["contract"])
+        self.methods = {m.name: m for m in self.contract.methods}
+        # declared values take one slot each, reserved ones max_keys slots (as beaker does)
+        schema = spec["schema"]["global"]
+        slots = [(v["type"], 1) for v in schema["declared"].values()]
+        slots += [(v["type"], v["max_keys"]) for v in schema.get("reserved", {}).values()]
+        self.global_num_uint = sum(n for t, n in slots if t == "uint64")
+        self.global_num_byte_slice = sum(n for t, n in slots if t == "bytes")
+        self.app_id = app_id
+        self.calls: list[CallResult] = []
+
+    @property
+    def app_addr(self) -> str:
+        return get_application_address(self.app_id)
+
+    def build_create(self, sender: str, fee: int = MIN_TXN_FEE) -> Txn:
+        return Txn(
+            type="appl",
+            sender=sender,
+            fee=fee,
+            application_id=0,
+            approval_program=self.approval,
+            clear_program=self.clear,
+            global_num_uint=self.global_num_uint,
+            global_num_byte_slice=self.global_num_byte_slice,
+        )
+
+    def create(self, sender: str, fee: int = MIN_TXN_FEE) -> int:
+        results = self.ledger.submit([self.build_create(sender, fee)])
+        self.app_id = results[0].created_app_id
+        self.calls.append(self._call_result("create", results))
+        return self.app_id
+
+    def delete(self, sender: str, fee: int = MIN_TXN_FEE) -> CallResult:
+        txn = Txn(type="appl", sender=sender, fee=fee, application_id=self.app_id,
+                  on_completion=DELETE_APPLICATION)
+        result = self._call_result("delete", self.ledger.submit([txn]))
+        self.calls.append(result)
+        return result
+
+    def build_call(self, method: str, sender: str, fee: int = MIN_TXN_FEE, accounts: list[str] = None,
+                   foreign_assets: list[int] = None, foreign_apps: list[int] = None, note: bytes = b"",
+                   first_valid: int = None, last_valid: int = None, boxes: list[tuple[int, bytes]] = None,
+                   **kwargs) -> list[Txn]:
+        spec = self.methods[method]
+        accounts = list(accounts or [])
+        foreign_assets = list(foreign_assets or [])
+        foreign_apps = list(foreign_apps or [])
+        group: list[Txn] = []
+        app_args = [spec.get_selector()]
+        for arg in spec.args:
+            if arg.name not in kwargs:
+                raise SimulationError(f"Unspecified argument: {arg.name}")
+            value = kwargs[arg.name]
+            if abi.is_abi_transaction_type(arg.type):
+                group.append(value)
+            elif arg.type == abi.ABIReferenceType.ASSET:
+                if value not in foreign_assets:
+                    foreign_assets.append(value)
+                app_args.append(foreign_assets.index(value).to_bytes(1, "big"))
+            elif arg.type == abi.ABIReferenceType.ACCOUNT:
+                if value != sender and value not in accounts:
+                    accounts.append(value)
+                index = 0 if value == sender else accounts.index(value) + 1
+                app_args.append(index.to_bytes(1, "big"))
+            elif arg.type == abi.ABIReferenceType.APPLICATION:
+                if value not in foreign_apps:
+                    foreign_apps.append(value)
+                app_args.append((foreign_apps.index(value) + 1).to_bytes(1, "big"))
+            else:
+                app_args.append(arg.type.encode(value))
+        group.append(Txn(
+            type="appl",
+            sender=sender,
+            fee=fee,
+            application_id=self.app_id,
+            app_args=app_args,
+            accounts=accounts,
+            foreign_assets=foreign_assets,
+            foreign_apps=foreign_apps,
+            boxes=list(boxes or []),
+            note=note,
+            first_valid=first_valid,
+            last_valid=last_valid,
+        ))
+        return group
+
+    def call(self, method: str, sender: str, after: list[Txn] = None, **kwargs) -> CallResult:
+        """after: transactions grouped right after the app call (e.g. the NFT transfer of list_nft)"""
+        results = self.ledger.submit(self.build_call(method, sender, **kwargs) + list(after or []))
+        result = self._call_result(method, results)
+        self.calls.append(result)
+        return result
+
+    def _call_result(self, method: str, results: list[TxnResult]) -> CallResult:
+        app_result = next(r for r in reversed(results) if r.txn.type == "appl")
+        return_value = None
+        spec = self.methods.get(method)
+        if spec is not None and spec.returns.type != abi.Returns.VOID:
+            for log in reversed(app_result.logs):
+                if log.startswith(ABI_RETURN_PREFIX):
+                    return_value = spec.returns.type.decode(log[len(ABI_RETURN_PREFIX):])
+                    break
+        return CallResult(
+            method=method,
+            tx_id=app_result.txn.get_txid(),
+            cost=app_result.cost,
+            inner_txn_count=app_result.inner_txn_count,
+            return_value=return_value,
+            fee=sum(r.txn.fee for r in results),
+            results=results,
+        )
+
+    def global_state(self) -> dict[str, int | str]:
+        # same shape as beaker's ApplicationClient.get_application_state(): bytes keys and values are hex
+        # encoded unless they are valid utf-8
+        def str_or_hex(value: bytes) -> str:
+            try:
+                return value.decode("utf-8")
+            except UnicodeDecodeError:
+                return value.hex()
+
+        return {
+            str_or_hex(key): str_or_hex(value) if isinstance(value, bytes) else value
+            for key, value in self.ledger.global_state(self.app_id).items()
+        }
+
+
+def payment_txn(sender: str, receiver: str, amount: int, fee: int = MIN_TXN_FEE, note: bytes = b"") -> Txn:
+    return Txn(type="pay", sender=sender, receiver=receiver, amount=amount, fee=fee, note=note)
+
+
+def asset_transfer_txn(sender: str, receiver: str, asset_id: int, amount: int, fee: int = MIN_TXN_FEE,
+                       close_to: str = None) -> Txn:
+    return Txn(type="axfer", sender=sender, asset_receiver=receiver, xfer_asset=asset_id,
+               asset_amount=amount, fee=fee, asset_close_to=close_to)
+
+
+def create_nft_txn(sender: str, asset_name: str, unit_name: str, url: str, metadata_hash: bytes = b"") -> Txn:
+    return Txn(type="acfg", sender=sender, total=1, decimals=0, asset_name=asset_name.encode(),
+               unit_name=unit_name.encode(), url=url.encode(), metadata_hash=metadata_hash)
+
+
+# Replays the interact.demo scenarios against the simulator and prints the opcode cost of every call
+def demo(auction_duration=2, loan_duration=2):
+    from algosdk.constants import microalgos_to_algos_ratio as algo
+    milli_algo = algo // 1000
+
+    started = time.perf_counter()
+    ledger = Ledger()
+    _, owner = ledger.new_account(100 * algo)
+    _, borrower = ledger.new_account(100 * algo)
+    _, lender = ledger.new_account(100 * algo)
+    sim = SimulatedApp(ledger)
+
+    def show(result: CallResult):
+        print(f"\t{result.method}: cost={result.cost} inner_txns={result.inner_txn_count} fee={result.fee}")
+
+    def list_nft(asset_id):
+        show(sim.call("provide_access_to_nft", borrower, fee=3000, nft=asset_id,
+                      payment=payment_txn(borrower, sim.app_addr, 100 * milli_algo)))
+        show(sim.call("set_offer", borrower, foreign_assets=[asset_id],
+                      asset_xfer=asset_transfer_txn(borrower, sim.app_addr, asset_id, 1),
+                      auction_base=100, auction_period=auction_duration, payback_deadline=loan_duration))
+        return ledger.round + auction_duration
+
+    print(">>> SCENARIO 0: App setup <<<")
+    sim.create(owner)
+    ledger.submit([payment_txn(owner, sim.app_addr, 100 * milli_algo)])
+    asset_id = ledger.submit([create_nft_txn(borrower, "G3 NFT@arc3", "G3", "")])[0].created_asset_id
+
+    print(">>> SCENARIO 1: Loan complete flow <<<")
+    ending_auction_round = list_nft(asset_id)
+    show(sim.call("place_bid", lender, fee=3000, payment=payment_txn(lender, sim.app_addr, 200 * milli_algo)))
+    ledger.advance(max(0, ending_auction_round - ledger.round))
+    show(sim.call("accept_bid", borrower, fee=2000))
+    show(sim.call("pay_back", borrower, fee=5000, foreign_assets=[asset_id], accounts=[lender],
+                  payment=payment_txn(borrower, sim.app_addr, 200 * milli_algo)))
+
+    print(">>> SCENARIO 2: Lender calls timeout as borrower is not accepting any offer <<<")
+    ending_auction_round = list_nft(asset_id)
+    show(sim.call("place_bid", lender, fee=3000, payment=payment_txn(lender, sim.app_addr, 2 * milli_algo)))
+    ledger.advance(max(0, ending_auction_round + 2 - ledger.round))
+    show(sim.call("timeout", lender, fee=3000, foreign_assets=[asset_id], accounts=[borrower]))
+
+    print(">>> SCENARIO 3: Borrower cancel offer before auction finishes <<<")
+    list_nft(asset_id)
+    show(sim.call("cancel_offer", borrower, fee=3000, foreign_assets=[asset_id]))
+
+    print(">>> SCENARIO 4: Lender claim NFT after incomplete payback <<<")
+    ending_auction_round = list_nft(asset_id)
+    show(sim.call("place_bid", lender, fee=3000, payment=payment_txn(lender, sim.app_addr, 200 * milli_algo)))
+    ledger.advance(max(0, ending_auction_round - ledger.round))
+    show(sim.call("accept_bid", borrower, fee=2000))
+    show(sim.call("pay_back", borrower, fee=5000, foreign_assets=[asset_id], accounts=[lender],
+                  payment=payment_txn(borrower, sim.app_addr, 100 * milli_algo)))
+    ledger.advance(loan_duration + 1)
+    ledger.submit([asset_transfer_txn(lender, lender, asset_id, 0)])
+    show(sim.call("loan_expired", lender, fee=2000, foreign_assets=[asset_id]))
+    print(f"\tLender holds {ledger.asset_balance(lender, asset_id)} unit(s) of asset {asset_id}")
+
+    print(">>> SCENARIO 5: Owner call pay me to recollect every Algo on the contract <<<")
+    show(sim.call("pay_me", owner, fee=2000))
+    show(sim.delete(owner, fee=2000))
+
+    elapsed = time.perf_counter() - started
+    print(f"### END: {len(sim.calls)} application calls in {elapsed * 1000:.1f} ms, "
+          f"total opcode cost {sum(c.cost for c in sim.calls)} ###")
+
+
+# Several concurrent loans served by one BorrowMyNFTs app (src/multi_contract.py)
+def demo_multi(n_loans=3, auction_duration=10, loan_duration=2):
+    from algosdk.constants import microalgos_to_algos_ratio as algo
+    from src import loan_record
+    milli_algo = algo // 1000
+
+    started = time.perf_counter()
+    ledger = Ledger()
+    _, owner = ledger.new_account(100 * algo)
+    _, borrower = ledger.new_account(100 * algo)
+    _, lender = ledger.new_account(100 * algo)
+    sim = SimulatedApp(ledger, MULTI_APPROVAL_PATH, MULTI_CLEAR_PATH, MULTI_CONTRACT_PATH)
+
+    def show(result: CallResult):
+        print(f"\t{result.method}: cost={result.cost} inner_txns={result.inner_txn_count} fee={result.fee}")
+
+    sim.create(owner)
+    ledger.submit([payment_txn(owner, sim.app_addr, 100 * milli_algo)])
+    assets = [ledger.submit([create_nft_txn(borrower, f"G3 NFT {i}@arc3", "G3", "")])[0].created_asset_id
+              for i in range(n_loans)]
+
+    box = lambda asset_id: loan_record.loan_box(asset_id)
+
+    print(f">>> {n_loans} NFTs listed and funded at the same time, one loan box each <<<")
+    # the first NFT goes through provide_access_to_nft + set_offer, the others through list_nft
+    show(sim.call("provide_access_to_nft", borrower, fee=3000, nft=assets[0], boxes=box(assets[0]),
+                  payment=payment_txn(borrower, sim.app_addr, 100 * milli_algo)))
+    show(sim.call("set_offer", borrower, foreign_assets=[assets[0]], boxes=box(assets[0]),
+                  payment=payment_txn(borrower, sim.app_addr, loan_record.BOX_MIN_BALANCE),
+                  asset_xfer=asset_transfer_txn(borrower, sim.app_addr, assets[0], 1),
+                  auction_base=100, auction_period=auction_duration, payback_deadline=loan_duration))
+    for asset_id in assets[1:]:
+        show(sim.call("list_nft", borrower, fee=2000, nft=asset_id, boxes=box(asset_id),
+                      payment=payment_txn(borrower, sim.app_addr, 100 * milli_algo + loan_record.BOX_MIN_BALANCE),
+                      auction_base=100, auction_period=auction_duration, payback_deadline=loan_duration,
+                      after=[asset_transfer_txn(borrower, sim.app_addr, asset_id, 1)]))
+    for asset_id in assets:
+        show(sim.call("place_bid", lender, fee=3000, nft=asset_id, boxes=box(asset_id),
+                      payment=payment_txn(lender, sim.app_addr, 200 * milli_algo)))
+    ledger.advance(auction_duration)
+    for asset_id in assets[:-1]:
+        show(sim.call("accept_bid", borrower, fee=2000, nft=asset_id, boxes=box(asset_id)))
+    print(f"\tloans: {sim.global_state()['loan_count']}, boxes: {len(ledger.boxes(sim.app_id))}, "
+          f"escrowed bids: {sim.global_state()['escrowed_bids']}")
+
+    print(">>> Each loan is closed through a different path <<<")
+    show(sim.call("timeout", lender, fee=3000, nft=assets[-1], accounts=[borrower, lender], boxes=box(assets[-1])))
+    show(sim.call("pay_back", borrower, fee=5000, nft=assets[0], accounts=[lender], boxes=box(assets[0]),
+                  payment=payment_txn(borrower, sim.app_addr, 250 * milli_algo)))
+    for asset_id in assets[1:-1]:
+        ledger.advance(loan_duration + 1)
+        ledger.submit([asset_transfer_txn(lender, lender, asset_id, 0)])
+        show(sim.call("loan_expired", lender, fee=2000, nft=asset_id, boxes=box(asset_id)))
+    assert not ledger.boxes(sim.app_id)
+
+    show(sim.call("pay_me", owner, fee=2000))
+    show(sim.delete(owner, fee=2000))
+    elapsed = time.perf_counter() - started
+    print(f"### END: {len(sim.calls)} application calls in {elapsed * 1000:.1f} ms, "
+          f"total opcode cost {sum(c.cost for c in sim.calls)} ###")
+
+
+if __name__ == "__main__":
+    import sys
+
+    demo_multi() if "--multi" in sys.argv else demo()
@@ -1,17 +1,23 @@
 # Helper function to wait for a specific round
+import functools
 import json
 import os
+from concurrent.futures import ThreadPoolExecutor
 from hashlib import sha256
 
 from algosdk.atomic_transaction_composer import AccountTransactionSigner, TransactionWithSigner
 from algosdk.future import transaction
-from algosdk.future.transaction import AssetTransferTxn, AssetConfigTxn, wait_for_confirmation
+from algosdk.future.transaction import AssetConfigTxn, wait_for_confirmation
 from algosdk.v2client import algod
 from algosdk.v2client.models import Account
 from algosdk import account, mnemonic
 from beaker import sandbox
 from beaker.sandbox import SandboxAccount
 
+from src import groups, holdings, rounds
+from src.algod_pool import PooledAlgodClient
+from src.params import SuggestedParamsProvider
+
 
 # Predefined accounts funded on Testnet
 mnemonics = [
@@ -23,50 +29,33 @@ mnemonics = [
 
 nft_metadata_github_url = "https://raw.githubusercontent.com/dariocast/algorand-nft-loan/main/assets/nft_metadata.json"
 
-def wait_for_round(client, round_to_wait_for):
-    last_round = client.status().get('last-round')
+def wait_for_round(client, round_to_wait_for, nudge=None):
+    # Served by the shared round watcher of the client: one long-poll stream for all waiters
     print(f"Waiting for round {round_to_wait_for}")
-    while last_round < round_to_wait_for:
-        last_round += 1
-        client.status_after_block(last_round)
-        print(f"Round {last_round}")
+    last_round = rounds.watcher_for(client, nudge).wait_for(round_to_wait_for)
+    print(f"Round {last_round}")
+
+
+# Submits a 0 Algo self payment: in sandbox dev mode every transaction produces a new block
+def nudge_dev_block(client, sender_account):
+    txn = transaction.PaymentTxn(
+        sender=sender_account.address,
+        sp=client.suggested_params(),
+        receiver=sender_account.address,
+        amt=0,
+        note=os.urandom(8),
+    )
+    client.send_transaction(txn.sign(sender_account.private_key))
 
 
 def opt_in_to_asset(client: algod.AlgodClient, account: SandboxAccount | Account, asset_id: int):
     # OPT-IN
-    # Check if asset_id is in account's asset holdings prior to opt-in
-    params = client.suggested_params()
-    account_info = client.account_info(account.address)
-    holding = None
-    idx = 0
-    for my_account_info in account_info['assets']:
-        scrutinized_asset = account_info['assets'][idx]
-        idx = idx + 1
-        if scrutinized_asset['asset-id'] == asset_id:
-            holding = True
-            break
-    if not holding:
-        # Use the AssetTransferTxn class to transfer assets and opt-in
-        txn = AssetTransferTxn(
-            sender=account.address,
-            sp=params,
-            receiver=account.address,
-            amt=0,
-            index=asset_id)
-        stxn = txn.sign(account.private_key)
-        # Send the transaction to the network and retrieve the txid.
-        try:
-            txid = client.send_transaction(stxn)
-            # print("Signed transaction with txID: {}".format(txid))
-            # Wait for the transaction to be confirmed
-            confirmed_txn = transaction.wait_for_confirmation(client, txid, 4)
-            # print("TXID: ", txid)
-            # print("Result confirmed in round: {}".format(confirmed_txn['confirmed-round']))
-        except Exception as err:
-            print(err)
-        # Now check the asset holding for that account.
-        # This should now show a holding with a balance of 0.
-        # print_asset_holding(client, account.address, asset_id)
+    # The asset holding is checked through the shared holding cache (per-asset lookup, no full
+    # account_info) and the opt-in is skipped if the account already holds it
+    try:
+        holdings.opt_in_to_assets(client, AccountTransactionSigner(account.private_key), account.address, [asset_id])
+    except Exception as err:
+        print(err)
 
 
 #   Utility function used to print asset holding for account and assetid
@@ -74,15 +63,15 @@ def print_asset_holding(algodclient, account, assetid=None):
     # note: if you have an indexer instance available it is easier to just use this
     # response = myindexer.accounts(asset_id = assetid)
     # then loop thru the accounts returned and match the account you are looking for
-    account_info = algodclient.account_info(account)
-    idx = 0
-    for my_account_info in account_info['assets']:
-        scrutinized_asset = account_info['assets'][idx]
-        idx = idx + 1
-        if not assetid or scrutinized_asset['asset-id'] == assetid:
-            print("Asset ID: {}".format(scrutinized_asset['asset-id']))
-            print(json.dumps(scrutinized_asset, indent=4))
-            break
+    # holdings moved by the contract are not tracked by the cache: always read them again
+    cache = holdings.cache_for(algodclient)
+    if assetid:
+        scrutinized_asset = cache.holding(account, assetid, refresh=True)
+    else:
+        scrutinized_asset = next(iter(cache.holdings(account, refresh=True).values()), None)
+    if scrutinized_asset is not None:
+        print("Asset ID: {}".format(scrutinized_asset['asset-id']))
+        print(json.dumps(scrutinized_asset, indent=4))
 
 
 # helper method to generate new algorand keypair
@@ -112,22 +101,32 @@ def get_testnet_account():
 def put_testnet_account_into_sandbox_and_fund():
     sandbox_account = sandbox.get_accounts()[0]
     client = sandbox.get_algod_client()
+    receivers = []
     for mn in mnemonics:
         sk = get_private_key_from_mnemonic(mn)
         sandbox.add_account(private_key=sk)
-        txn = TransactionWithSigner(
-            txn = transaction.PaymentTxn(
-                sender=sandbox_account.address,
-                sp=client.suggested_params(),
-                receiver=account.address_from_private_key(sk),
-                amt=100000000,
-            ),
-            signer=sandbox_account.signer,
-        )
-        client.send_transaction(txn)
-    for acct in sandbox.get_accounts():
-        print(acct.address)
-        check_balance(client, acct.address)
+        receivers.append(account.address_from_private_key(sk))
+    fund_accounts(client, sandbox_account.signer, sandbox_account.address, receivers, 100000000)
+    balances = get_balances(client, [acct.address for acct in sandbox.get_accounts()])
+    for address, balance in balances.items():
+        print(address)
+        print("Account balance: {} microAlgos".format(balance) + "\n")
+
+
+# Pays `amount` microAlgos to every receiver: 16 payments per atomic group, groups sent concurrently and
+# confirmed in one pass. Returns the balances of the receivers afterwards
+def fund_accounts(client, signer, sender, receivers, amount, params: SuggestedParamsProvider = None):
+    sp = (params or SuggestedParamsProvider(client)).get()
+    txns = [transaction.PaymentTxn(sender=sender, sp=sp, receiver=receiver, amt=amount) for receiver in receivers]
+    groups.send_and_confirm(client, groups.sign_in_groups(txns, signer))
+    return get_balances(client, receivers)
+
+
+# Balances of many accounts, fetched concurrently without their assets and apps
+def get_balances(client, addresses, max_workers=groups.MAX_IN_FLIGHT):
+    with ThreadPoolExecutor(max_workers) as executor:
+        infos = executor.map(lambda address: client.account_info(address, exclude="all"), addresses)
+        return {address: info.get("amount") for address, info in zip(addresses, infos)}
 
 def check_balance(algod_client, my_address):
     account_info = algod_client.account_info(my_address)
@@ -148,28 +147,34 @@ def get_address_from_private_key(sk):
 
 
 def get_algod_client():
-    # set the address and token from the environment variables, otherwise use the sandbox values
+    # set the address and token from the environment variables, otherwise use the sandbox values.
+    # ALGOD_ADDRESS may list several nodes separated by commas: reads are balanced across them and
+    # requests fail over to the next node (see src/algod_pool.py)
     algod_address = os.environ.get("ALGOD_ADDRESS","http://localhost:4001")
     algod_token = os.environ.get("ALGOD_TOKEN","aaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa")
     headers = {
         "X-API-Key": algod_token,
     }
-    algod_client = algod.AlgodClient(algod_token, algod_address, headers)
+    algod_client = PooledAlgodClient(algod_token, algod_address, headers)
     return algod_client
 
 
+# sha256 of the default NFT metadata, read and hashed once per process
+@functools.lru_cache(maxsize=None)
+def nft_metadata_hash() -> bytes:
+    dir_path = os.path.dirname(__file__)
+    file_path = os.path.join(dir_path, '../assets/nft_metadata.json')
+    with open(file_path) as f:
+        json_metadata = json.load(f)
+    return sha256(json.dumps(json_metadata).encode('utf-8')).digest()
+
+
 def create_default_nft(client, private_key, address, asset_name, asset_unit_name, asset_url):
     # create a new asset
     # note that the manager, reserve, freeze, and clawback
     # are all empty for the nft as specified in documentation
     # https://developer.algorand.org/docs/get-started/tokenization/nft/
-    dir_path = os.path.dirname(__file__)
-    file_path = os.path.join(dir_path, '../assets/nft_metadata.json')
-    f = open(file_path)
-    json_metadata = json.load(f)
-    f.close()
-
-    asset_metadata_hash = sha256(json.dumps(json_metadata).encode('utf-8')).digest()
+    asset_metadata_hash = nft_metadata_hash()
 
     print("Creating transaction...")
     txn = AssetConfigTxn(